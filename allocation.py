@@ -0,0 +1,271 @@
+import heapq
+import os
+import threading
+import time
+
+from blood_groups import BLOOD_GROUPS, COMPATIBLE_DONORS
+from blood_units import issue_units
+from db import db_connection
+from rollups import record_today
+
+# ✅ Allocation settings (all overridable from the environment)
+ALLOCATION_AUTO = os.getenv("ALLOCATION_AUTO", "0") == "1"        # allocate on donations / new requests
+ALLOCATION_INTERVAL = float(os.getenv("ALLOCATION_INTERVAL", 60))  # background run period when auto is on
+ALLOCATION_RELOAD = float(os.getenv("ALLOCATION_RELOAD", 60))      # re-read pending requests after this many seconds
+
+URGENCIES = ("routine", "urgent", "critical")
+URGENCY_RANK = {urgency: rank for rank, urgency in enumerate(URGENCIES)}
+
+# Donor group -> recipient groups that can use it (inverse of COMPATIBLE_DONORS)
+RECIPIENTS = {
+    donor: tuple(r for r in BLOOD_GROUPS if donor in COMPATIBLE_DONORS[r]) for donor in BLOOD_GROUPS
+}
+
+# Cluster-wide: only one process applies an allocation at a time
+LOCK_NAME = "bloodbank-allocation"
+
+# Everything the in-memory queues are rebuilt from
+PENDING_QUEUE = """
+    SELECT id, blood_group, quantity, urgency, UNIX_TIMESTAMP(created_at)
+    FROM requests WHERE status = 'pending'
+"""
+
+
+# Queue entries are flat tuples that sort by priority: most urgent first, then
+# oldest, then smallest (serves more hospitals), then id. Ids are unique, so the
+# trailing group is never compared.
+def make_entry(rid, blood_group, quantity, urgency, created_at):
+    return (-URGENCY_RANK.get(urgency, 0), created_at, quantity, rid, blood_group)
+
+
+# ✅ Pure planner: walk pending requests in priority order across all groups and
+# give each the best compatible group that can cover it whole (first fit: a
+# request that does not fit is skipped, it does not block smaller ones behind it).
+# `queues` maps recipient group -> heap of entries; with `live` (rid -> entry)
+# given, entries no longer live are ignored. Returns (allocations, remaining
+# stock) with allocations as (rid, recipient group, donor group, quantity).
+def plan(inventory, queues, live=None):
+    stock = {group: units for group, units in inventory.items() if units > 0}
+    entries = []
+    for group, heap in queues.items():
+        # Groups nothing compatible is in stock for are not even sorted
+        if any(stock.get(donor) for donor in COMPATIBLE_DONORS[group]):
+            entries.extend(heap if live is None else (e for e in heap if live.get(e[3]) is e))
+    entries.sort()
+
+    allocations = []
+    for _, _, quantity, rid, group in entries:
+        if not stock:
+            break
+        for donor in COMPATIBLE_DONORS[group]:
+            units = stock.get(donor, 0)
+            if units >= quantity:
+                allocations.append((rid, group, donor, quantity))
+                if units == quantity:
+                    del stock[donor]
+                else:
+                    stock[donor] = units - quantity
+                break
+    return allocations, stock
+
+
+class AllocationEngine:
+    """Priority queues of pending requests (one heap per recipient group) plus
+    the code that turns a plan into guarded UPDATEs.
+
+    The queues are kept current by the write routes (add / discard) and reloaded
+    from MySQL when marked stale or older than ALLOCATION_RELOAD, since other
+    server processes write too. Every applied allocation is re-checked by its
+    UPDATE, so a stale queue can only cost a skipped allocation, never stock."""
+
+    def __init__(self, on_applied=None):
+        self.on_applied = on_applied
+        self._queues = {group: [] for group in BLOOD_GROUPS}
+        self._live = {}                 # rid -> its current heap entry
+        self._loaded_at = None
+        self._lock = threading.Lock()   # guards the queues
+        self._run_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pending_groups = set()
+        self._thread = None
+        self._thread_pid = None
+
+    # ✅ Queue maintenance
+    def add(self, rid, blood_group, quantity, urgency, created_at):
+        try:
+            quantity = int(quantity)
+        except (TypeError, ValueError):
+            return
+        if blood_group not in self._queues or quantity <= 0:
+            return
+        entry = make_entry(rid, blood_group, quantity, urgency, created_at)
+        with self._lock:
+            self._live[rid] = entry
+            heapq.heappush(self._queues[blood_group], entry)
+
+    def discard(self, rid):
+        # Lazy delete: the heap entry is skipped once it is no longer live
+        with self._lock:
+            self._live.pop(rid, None)
+
+    def mark_stale(self):
+        self._loaded_at = None
+
+    def reload(self):
+        with db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(PENDING_QUEUE)
+            rows = cur.fetchall()
+
+        queues = {group: [] for group in BLOOD_GROUPS}
+        live = {}
+        for rid, blood_group, quantity, urgency, created_at in rows:
+            if blood_group in queues and quantity:
+                entry = make_entry(rid, blood_group, quantity, urgency, float(created_at))
+                queues[blood_group].append(entry)
+                live[rid] = entry
+        for heap in queues.values():
+            heapq.heapify(heap)
+
+        with self._lock:
+            self._queues, self._live = queues, live
+            self._loaded_at = time.monotonic()
+        return len(rows)
+
+    def _compact(self):
+        # Drop dead heap entries once they outnumber the live ones
+        with self._lock:
+            total = sum(len(heap) for heap in self._queues.values())
+            if total > 2 * len(self._live) + 1000:
+                for group, heap in self._queues.items():
+                    live = [e for e in heap if self._live.get(e[3]) is e]
+                    heapq.heapify(live)
+                    self._queues[group] = live
+
+    def queue_sizes(self):
+        with self._lock:
+            return {
+                group: sum(1 for e in heap if self._live.get(e[3]) is e)
+                for group, heap in self._queues.items()
+            }
+
+    # ✅ Plan (and unless dry_run, apply) an allocation round.
+    # `groups` limits it to those recipient groups, e.g. the ones a donation can serve.
+    def run(self, dry_run=False, groups=None, reload=False):
+        with self._run_lock:
+            if reload or self._loaded_at is None or time.monotonic() - self._loaded_at > ALLOCATION_RELOAD:
+                self.reload()
+            else:
+                self._compact()
+
+            with db_connection() as conn:
+                cur = conn.cursor()
+                cur.execute("SELECT blood_group, units FROM inventory")
+                inventory = {group: int(units) for group, units in cur.fetchall()}
+
+                started = time.perf_counter()
+                with self._lock:
+                    queues = {g: list(h) for g, h in self._queues.items() if groups is None or g in groups}
+                    live = dict(self._live)
+                allocations, remaining = plan(inventory, queues, live)
+                plan_ms = (time.perf_counter() - started) * 1000
+
+                summary = {
+                    "dry_run": dry_run,
+                    "pending": len(live),
+                    "planned": len(allocations),
+                    "units": sum(a[3] for a in allocations),
+                    "plan_ms": round(plan_ms, 2),
+                }
+                if dry_run:
+                    summary["allocations"] = [self._describe(a) for a in allocations]
+                    summary["inventory_after"] = {g: remaining.get(g, 0) for g in inventory}
+                    return summary
+
+                applied, skipped = self._apply(conn, cur, allocations)
+
+            summary["applied"] = applied
+            summary["skipped"] = skipped
+            if applied and self.on_applied:
+                self.on_applied(applied)
+            return summary
+
+    @staticmethod
+    def _describe(allocation):
+        rid, group, donor, quantity = allocation
+        return {"id": rid, "blood_group": group, "fulfilled_group": donor, "quantity": quantity}
+
+    def _apply(self, conn, cur, allocations):
+        if not allocations:
+            return [], []
+        cur.execute("SELECT GET_LOCK(%s, 0)", (LOCK_NAME,))
+        if cur.fetchone()[0] != 1:
+            # Another process is allocating right now; its run covers these requests
+            return [], [{"id": a[0], "error": "allocation already running"} for a in allocations]
+
+        applied, skipped = [], []
+        try:
+            for allocation in allocations:
+                rid, group, donor, quantity = allocation
+                # Same guard as a manual approval: still pending, stock still there.
+                # Units come from the donor group, earliest expiry first.
+                conn.start_transaction()
+                cur.execute("""
+                    UPDATE requests r
+                    JOIN inventory i ON i.blood_group = %s
+                    SET i.units = i.units - r.quantity,
+                        r.status = 'approved',
+                        r.fulfilled_group = %s
+                    WHERE r.id = %s
+                      AND r.status = 'pending'
+                      AND r.quantity = %s
+                      AND i.units >= r.quantity
+                """, (donor, donor, rid, quantity))
+                ok = cur.rowcount > 0
+                if ok:
+                    issue_units(cur, rid, donor, quantity)
+                    record_today(cur, "issued", {donor: quantity})
+                conn.commit()
+                self.discard(rid)
+                if ok:
+                    applied.append(self._describe(allocation))
+                else:
+                    skipped.append({"id": rid, "error": "request or stock changed"})
+            if skipped:
+                self.mark_stale()
+        finally:
+            cur.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+            cur.fetchall()
+        return applied, skipped
+
+    # ✅ Background mode: notify() after stock or queue changes; a worker thread
+    # (one per process, started lazily so it survives pre-fork servers) runs the
+    # affected groups, and every ALLOCATION_INTERVAL seconds a full round.
+    def notify(self, groups=None):
+        if not ALLOCATION_AUTO:
+            return
+        with self._lock:
+            self._pending_groups.update(groups or BLOOD_GROUPS)
+        self._ensure_thread()
+        self._wake.set()
+
+    def notify_donation(self, donor_groups):
+        self.notify({r for donor in donor_groups for r in RECIPIENTS.get(donor, ())})
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread_pid == os.getpid() and self._thread.is_alive():
+            return
+        self._thread_pid = os.getpid()
+        self._thread = threading.Thread(target=self._loop, name="allocation", daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while True:
+            woken = self._wake.wait(ALLOCATION_INTERVAL)
+            self._wake.clear()
+            with self._lock:
+                groups, self._pending_groups = self._pending_groups, set()
+            try:
+                self.run(groups=groups if woken else None)
+            except Exception as e:
+                print("Error in background allocation:", e)
@@ -1,23 +1,83 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 import mysql.connector
+import atexit
 import os
+import time
+from datetime import date, timedelta
+
+from allocation import URGENCIES, AllocationEngine
+from blood_groups import BLOOD_GROUPS, COMPATIBLE_DONORS
+from blood_units import COMPONENTS, DEFAULT_COMPONENT, add_donation_units, expire_units, sweep_if_due
+from cache import TTLCache
+from db import db_connection, pool, replicas
+from donations import MAX_BATCH, MAX_UNITS_PER_DONATION, ingest_batch, resolve_donors, validate_rows
+import entities
+from entities import USER_BY_EMAIL, get_donor_owner, get_person, invalidate_donor, invalidate_people
+from events import SubscriptionDenied, TooManySubscribers, broker, sse_stream, subscription_topics
+from events import publish_inventory, publish_request
+from export import export_stream
+from fastjson import FastJSONProvider, raw_response
+import geo
+from inventory import ApprovalError, approve_request, bulk_update_status, set_request_status
+from listing import DONATION_LIST, DONOR_LIST, REQUEST_LIST, UNIT_LIST, ListError, fetch_list
+from listing import DASHBOARD_STATS, HOSPITAL_LIST, REQUEST_DETAIL
+from matching import DEFERRAL_DAYS, MAX_MATCHES, URGENCY_LIMITS, match_donors
+from metrics import install as install_metrics
+from passwords import PasswordPoolBusy, hash_password, verify_password
+import rollups
+import routing
+from sessions import current_principal, invalidate_principal, issue_token, login_required, principal_cache, resolve_token
+import versions
+from versions import conditional
+from writebehind import WRITE_BEHIND, InventoryBuffer, merge_pending, read_consistent
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 CORS(app)
 
-# ✅ Database config
-DB_CONFIG = {
-    "host": os.getenv("DB_HOST", "localhost"),
-    "user": os.getenv("DB_USER", "root"),
-    "password": os.getenv("DB_PASS", "Sathyam#17"),  # 🔒 change to your MySQL password
-    "database": os.getenv("DB_NAME", "bloodbank"),
-    "autocommit": True
-}
+# ✅ Dashboard aggregates are cached briefly and dropped on every relevant write
+stats_cache = TTLCache(maxsize=1, ttl=float(os.getenv("STATS_CACHE_TTL", 5)))
+
+
+# ✅ Auto-allocation: same bookkeeping as a manual approval, for every request it approved
+def after_allocation(applied):
+    stats_cache.invalidate()
+    versions.bump("requests", "inventory", "blood_units")
+    if not broker.has_subscribers():
+        return
+    with db_connection() as conn:
+        cur = conn.cursor()
+        ids = [a["id"] for a in applied]
+        cur.execute(
+            f"SELECT id, hospital_id FROM requests WHERE id IN ({', '.join(['%s'] * len(ids))})", ids
+        )
+        hospitals = dict(cur.fetchall())
+    deltas = {}
+    for allocation in applied:
+        publish_request({**allocation, "hospital_id": hospitals.get(allocation["id"]), "status": "approved"})
+        group = allocation["fulfilled_group"]
+        deltas[group] = deltas.get(group, 0) - allocation["quantity"]
+    publish_inventory(deltas)
+
+
+# ✅ Expired units leave the inventory aggregate: same bookkeeping as a stock change
+def after_expiry(expired):
+    if not expired:
+        return
+    stats_cache.invalidate()
+    versions.bump("inventory", "blood_units")
+    publish_inventory({group: -units for group, units in expired.items()})
+
 
-# ✅ Correct connection function
-def get_db_connection():
-    return mysql.connector.connect(**DB_CONFIG)
+allocator = AllocationEngine(on_applied=after_allocation)
+
+# ✅ Optional write-behind inventory (INVENTORY_WRITE_BEHIND=1): donations add to
+# a journaled in-memory counter that is flushed as one upsert per group.
+# Units become approvable once flushed, so allocation is nudged then.
+inventory_buffer = InventoryBuffer(on_flush=allocator.notify_donation)
+if WRITE_BEHIND:
+    atexit.register(inventory_buffer.close)
 
 # ✅ LOGIN - Include all user details
 @app.route('/api/login', methods=['POST'])
@@ -27,22 +87,36 @@ def login():
     password = data.get('password')
 
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        cursor.execute(
-            "SELECT * FROM users WHERE email=%s AND password=%s",
-            (email, password)
-        )
-        user = cursor.fetchone()
-        cursor.close()
-        conn.close()
-
-        if not user:
+        with db_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(USER_BY_EMAIL, (email,))
+            user = cursor.fetchone()
+            cursor.close()
+
+        # Hash check runs in the password pool, without holding a DB connection
+        ok, needs_rehash = verify_password(password, user["password"] if user else None)
+        if not ok:
             return jsonify({"error": "❌ Invalid email or password"}), 401
 
+        # Transparent upgrade of plaintext / old-cost hashes on successful login
+        if needs_rehash:
+            new_hash = hash_password(password)
+            with db_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "UPDATE users SET password=%s WHERE id=%s AND password=%s",
+                    (new_hash, user["id"], user["password"])
+                )
+            versions.bump("users")
+
+        # Prime the session cache so the first authenticated call skips MySQL
+        principal_cache.put(user["id"], {
+            key: user.get(key) for key in ("id", "name", "email", "role", "blood_group", "location")
+        })
+
         return jsonify({
             "message": "Login successful",
+            "token": issue_token(user["id"]),
             "id": user["id"],
             "name": user["name"],
             "email": user["email"],
@@ -51,6 +125,8 @@ def login():
             "location": user.get("location")
         }), 200
 
+    except PasswordPoolBusy as e:
+        return jsonify({"error": f"❌ {e}"}), 503
     except Exception as e:
         print("Error in /api/login:", e)
         return jsonify({"error": f"Server error: {e}"}), 500
@@ -67,32 +143,42 @@ def register():
     blood_group = data.get('blood_group')
     location = data.get('location')
 
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+    if not password:
+        return jsonify({"error": "❌ Password is required"}), 400
 
-        cursor.execute("""
-            INSERT INTO users (name, email, password, role, blood_group, location)
-            VALUES (%s, %s, %s, %s, %s, %s)
-        """, (name, email, password, role, blood_group, location))
+    try:
+        password_hash = hash_password(password)
+        lat, lon, geohash = geo.point(location)
 
-        user_id = cursor.lastrowid
+        with db_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
 
-        # NEW: if donor, create a donors row immediately
-        if role == 'donor':
             cursor.execute("""
-                INSERT INTO donors (user_id, blood_group, location, last_donation_date)
-                VALUES (%s, %s, %s, NULL)
-            """, (user_id, blood_group, location))
+                INSERT INTO users (name, email, password, role, blood_group, location, lat, lon, geohash)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """, (name, email, password_hash, role, blood_group, location, lat, lon, geohash))
+
+            user_id = cursor.lastrowid
 
-        conn.commit()
-        cursor.close()
-        conn.close()
+            # NEW: if donor, create a donors row immediately
+            if role == 'donor':
+                cursor.execute("""
+                    INSERT INTO donors (user_id, blood_group, location, last_donation_date, lat, lon, geohash)
+                    VALUES (%s, %s, %s, NULL, %s, %s, %s)
+                """, (user_id, blood_group, location, lat, lon, geohash))
 
-        return jsonify({"message": "✅ Registered successfully!"}), 201
+            conn.commit()
+            cursor.close()
+            stats_cache.invalidate()
+            invalidate_people(user_id)
+            versions.bump("users", "donors")
+
+            return jsonify({"message": "✅ Registered successfully!"}), 201
 
     except mysql.connector.IntegrityError:
         return jsonify({"error": "❌ Email already exists."}), 400
+    except PasswordPoolBusy as e:
+        return jsonify({"error": f"❌ {e}"}), 503
     except Exception as e:
         print("Error in /api/register:", e)
         return jsonify({"error": f"Server error: {e}"}), 500
@@ -101,23 +187,50 @@ def register():
 # ✅ BLOOD REQUEST
 @app.route('/api/request', methods=['POST'])
 def create_request():
-    data = request.json
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "❌ Request body must be a JSON object"}), 400
+    urgency = data.get('urgency') or 'routine'
+    if urgency not in URGENCIES:
+        return jsonify({"error": f"❌ Invalid urgency. Must be one of: {', '.join(URGENCIES)}"}), 400
+    if data.get('blood_group') not in BLOOD_GROUPS:
+        return jsonify({"error": f"❌ 'blood_group' must be one of {', '.join(BLOOD_GROUPS)}"}), 400
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO requests (hospital_id, blood_group, quantity, status)
-            VALUES (%s, %s, %s, 'pending')
-        """, (data.get('hospital_id'), data.get('blood_group'), data.get('quantity')))
-        conn.commit()
-        conn.close()
-        return jsonify({'message': 'Request submitted successfully'}), 201
+        quantity = int(data.get('quantity'))
+    except (TypeError, ValueError):
+        return jsonify({"error": "❌ 'quantity' must be a whole number of units"}), 400
+    if quantity <= 0:
+        return jsonify({"error": "❌ 'quantity' must be at least 1 unit"}), 400
+    try:
+        with db_connection() as conn:
+            cur = conn.cursor()
+            conn.start_transaction()
+            cur.execute("""
+                INSERT INTO requests (hospital_id, blood_group, quantity, urgency, status)
+                VALUES (%s, %s, %s, %s, 'pending')
+            """, (data.get('hospital_id'), data.get('blood_group'), quantity, urgency))
+            request_id = cur.lastrowid
+            rollups.record_today(cur, "requested", {data.get('blood_group'): quantity})
+            conn.commit()
+            stats_cache.invalidate()
+            versions.bump("requests")
+            allocator.add(request_id, data.get('blood_group'), quantity, urgency, time.time())
+            allocator.notify([data.get('blood_group')])
+            publish_request({
+                "id": request_id,
+                "hospital_id": data.get('hospital_id'),
+                "blood_group": data.get('blood_group'),
+                "quantity": quantity,
+                "urgency": urgency,
+                "status": "pending"
+            })
+            return jsonify({'message': 'Request submitted successfully'}), 201
     except Exception as e:
         print("Error in /api/request:", e)
         return jsonify({"error": f"Server error: {e}"}), 500
 
 
-# ✅ UPDATE REQUEST - Decrease inventory when approved
+# ✅ UPDATE REQUEST - Decrease inventory atomically when approved
 @app.route('/api/request/<int:rid>', methods=['PUT'])
 def update_request(rid):
     data = request.json
@@ -134,56 +247,44 @@ def update_request(rid):
         return jsonify({"error": "❌ Invalid status. Must be 'approved', 'rejected', or 'pending'"}), 400
     
     try:
-        conn = get_db_connection()
-        cur = conn.cursor(dictionary=True)
-        
-        # Get request details first
-        cur.execute("SELECT * FROM requests WHERE id=%s", (rid,))
-        request_data = cur.fetchone()
-        
-        if not request_data:
-            conn.close()
-            return jsonify({"error": "❌ Request not found"}), 404
-        
-        # If approving, check inventory and decrease it
-        if new_status == "approved":
-            # Check current inventory
-            cur.execute(
-                "SELECT units FROM inventory WHERE blood_group=%s",
-                (request_data['blood_group'],)
-            )
-            inventory = cur.fetchone()
-            
-            if not inventory:
-                conn.close()
-                return jsonify({
-                    "error": f"❌ No inventory available for blood group {request_data['blood_group']}"
-                }), 400
-            
-            if inventory['units'] < request_data['quantity']:
-                conn.close()
-                return jsonify({
-                    "error": f"❌ Insufficient inventory. Available: {inventory['units']} units, Requested: {request_data['quantity']} units"
-                }), 400
-            
-            # Decrease inventory
-            cur.execute("""
-                UPDATE inventory 
-                SET units = units - %s 
-                WHERE blood_group = %s
-            """, (request_data['quantity'], request_data['blood_group']))
-        
-        # Update request status
-        cur.execute("UPDATE requests SET status=%s WHERE id=%s", (new_status, rid))
-        
-        conn.commit()
-        conn.close()
-        
-        return jsonify({
-            'message': f'Request {new_status} successfully',
-            'status': new_status
-        }), 200
-        
+        with db_connection() as conn:
+            cur = conn.cursor()
+
+            # Approval is a single guarded UPDATE (no read-then-write race),
+            # committed together with the units it issues
+            if new_status == "approved":
+                after_expiry(sweep_if_due(conn))
+                conn.start_transaction()
+                approve_request(cur, rid)
+                conn.commit()
+            else:
+                set_request_status(cur, rid, new_status)
+            stats_cache.invalidate()
+            versions.bump("requests", "inventory", "blood_units")
+            if new_status == "pending":
+                allocator.mark_stale()
+            else:
+                allocator.discard(rid)
+
+            # Push the change to live dashboards (skip the lookup when nobody listens)
+            if broker.has_subscribers():
+                cur = conn.cursor(dictionary=True)
+                cur.execute(
+                    "SELECT id, hospital_id, blood_group, quantity, status FROM requests WHERE id=%s",
+                    (rid,)
+                )
+                changed = cur.fetchone()
+                publish_request(changed)
+                if new_status == "approved":
+                    publish_inventory({changed["blood_group"]: -changed["quantity"]})
+
+            return jsonify({
+                'message': f'Request {new_status} successfully',
+                'status': new_status
+            }), 200
+
+    except ApprovalError as e:
+        return jsonify({"error": e.message}), e.status_code
     except Exception as e:
         print("Error in /api/request update:", e)
         import traceback
@@ -191,48 +292,128 @@ def update_request(rid):
         return jsonify({"error": f"Server error: {e}"}), 500
 
 
+# ✅ BULK UPDATE REQUESTS - approve/reject many requests in a handful of round trips
+@app.route('/api/request/bulk-status', methods=['POST'])
+def bulk_update_requests():
+    data = request.get_json(silent=True) or {}
+    items = data.get('updates')
+
+    # Shorthand: {"ids": [...], "status": "approved"}
+    if items is None and 'ids' in data:
+        items = [{"id": rid, "status": data.get('status')} for rid in data['ids']]
+
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "❌ 'updates' must be a non-empty list of {id, status}"}), 400
+
+    updates = {}
+    for item in items:
+        rid = item.get('id') if isinstance(item, dict) else None
+        status = item.get('status') if isinstance(item, dict) else None
+        if not isinstance(rid, int) or status not in ['approved', 'rejected', 'pending']:
+            return jsonify({"error": f"❌ Invalid update: {item}"}), 400
+        if rid in updates:
+            return jsonify({"error": f"❌ Request {rid} appears more than once"}), 400
+        updates[rid] = status
+
+    try:
+        with db_connection() as conn:
+            if 'approved' in updates.values():
+                after_expiry(sweep_if_due(conn))
+            results = bulk_update_status(conn, updates)
+        stats_cache.invalidate()
+        versions.bump("requests", "inventory", "blood_units")
+        for result in results:
+            if result["ok"] and result["status"] == "pending":
+                allocator.mark_stale()
+            elif result["ok"]:
+                allocator.discard(result["id"])
+
+        deltas = {}
+        for result in results:
+            if result["ok"]:
+                publish_request({key: result[key] for key in ("id", "hospital_id", "blood_group", "status")})
+                if result["status"] == "approved":
+                    deltas[result["blood_group"]] = deltas.get(result["blood_group"], 0) - result["quantity"]
+        publish_inventory(deltas)
+
+        return jsonify({
+            "message": f"Processed {len(results)} request(s)",
+            "succeeded": sum(1 for r in results if r["ok"]),
+            "failed": sum(1 for r in results if not r["ok"]),
+            "results": results
+        }), 200
+
+    except Exception as e:
+        print("Error in /api/request/bulk-status:", e)
+        return jsonify({"error": f"Server error: {e}"}), 500
+
+
 # ✅ INVENTORY
 @app.route('/api/inventory', methods=['GET'])
+@conditional("inventory")
 def get_inventory():
+    def load():
+        # Unflushed write-behind deltas only add up against the primary's rows
+        with db_connection(replica=False if WRITE_BEHIND else None) as conn:
+            cur = conn.cursor(dictionary=True)
+            cur.execute("SELECT * FROM inventory")
+            return cur.fetchall()
+
     try:
-        conn = get_db_connection()
-        cur = conn.cursor(dictionary=True)
-        cur.execute("SELECT * FROM inventory")
-        rows = cur.fetchall()
-        conn.close()
-        return jsonify(rows)
+        # Includes donations not yet flushed by write-behind mode
+        rows, pending = read_consistent(load)
+        return jsonify(merge_pending(rows, pending))
     except Exception as e:
         print("Error in /api/inventory:", e)
         return jsonify({"error": f"Server error: {e}"}), 500
 
 
+# ✅ BLOOD UNITS - individual bags behind the inventory counts
+# Filters: blood_group, status, component, request_id, expires_before (YYYY-MM-DD)
+# Paging: limit + cursor (keyset on expires_on, id, soonest first), count=0 skips the total
+@app.route('/api/units', methods=['GET'])
+@conditional("blood_units")
+def get_units():
+    try:
+        with db_connection() as conn:
+            return raw_response(fetch_list(conn, UNIT_LIST, request.args))
+    except ListError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print("Error in GET /api/units:", e)
+        return jsonify({"error": f"Server error: {e}"}), 500
+
+
+# ✅ EXPIRE UNITS - mark units past their expiry date and drop them from inventory (admin)
+# Runs by itself before the first approval of each day; this forces a sweep now.
+@app.route('/api/units/expire', methods=['POST'])
+@login_required('admin')
+def expire_blood_units():
+    try:
+        with db_connection() as conn:
+            expired = expire_units(conn)
+        after_expiry(expired)
+        return jsonify({
+            "message": f"✅ Expired {sum(expired.values())} unit(s)",
+            "expired": expired
+        }), 200
+    except Exception as e:
+        print("Error in /api/units/expire:", e)
+        return jsonify({"error": f"Server error: {e}"}), 500
+
+
 # ✅ GET ALL REQUESTS (for Admin and Hospital)
+# Filters: hospital_id, status, blood_group, location, from, to
+# Paging: limit + cursor (keyset on created_at, id), count=0 skips the total
+# Projection: fields=id,status,...
 @app.route('/api/request', methods=['GET'])
+@conditional("requests", "users")
 def get_requests():
-    hospital_id = request.args.get('hospital_id', type=int)
     try:
-        conn = get_db_connection()
-        cur = conn.cursor(dictionary=True)
-        if hospital_id:
-            # Filter by hospital_id if provided
-            cur.execute("""
-                SELECT r.*, u.name as hospital_name
-                FROM requests r
-                LEFT JOIN users u ON r.hospital_id = u.id
-                WHERE r.hospital_id = %s
-                ORDER BY r.created_at DESC
-            """, (hospital_id,))
-        else:
-            # Get all requests (for admin)
-            cur.execute("""
-                SELECT r.*, u.name as hospital_name
-                FROM requests r
-                LEFT JOIN users u ON r.hospital_id = u.id
-                ORDER BY r.created_at DESC
-            """)
-        rows = cur.fetchall()
-        conn.close()
-        return jsonify(rows)
+        with db_connection() as conn:
+            return raw_response(fetch_list(conn, REQUEST_LIST, request.args))
+    except ListError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         print("Error in /api/request GET:", e)
         return jsonify({"error": f"Server error: {e}"}), 500
@@ -240,26 +421,21 @@ def get_requests():
 
 # ✅ GET SINGLE REQUEST by ID
 @app.route('/api/request/<int:rid>', methods=['GET'])
+@conditional("requests", "users")
 def get_single_request(rid):
     try:
-        conn = get_db_connection()
-        cur = conn.cursor(dictionary=True)
-        
-        cur.execute("""
-            SELECT r.*, u.name as hospital_name
-            FROM requests r
-            LEFT JOIN users u ON r.hospital_id = u.id
-            WHERE r.id = %s
-        """, (rid,))
-        
-        request_data = cur.fetchone()
-        conn.close()
-        
-        if not request_data:
-            return jsonify({"error": "❌ Request not found"}), 404
-        
-        return jsonify(request_data), 200
-        
+        with db_connection() as conn:
+            cur = conn.cursor(dictionary=True)
+
+            cur.execute(REQUEST_DETAIL, (rid,))
+
+            request_data = cur.fetchone()
+
+            if not request_data:
+                return jsonify({"error": "❌ Request not found"}), 404
+
+            return jsonify(request_data), 200
+
     except Exception as e:
         print("Error in /api/request/<id> GET:", e)
         return jsonify({"error": f"Server error: {e}"}), 500
@@ -267,17 +443,14 @@ def get_single_request(rid):
 
 # ✅ GET ALL HOSPITALS (for Admin)
 @app.route('/api/hospitals', methods=['GET'])
+@conditional("users")
 def get_hospitals():
     try:
-        conn = get_db_connection()
-        cur = conn.cursor(dictionary=True)
-        cur.execute("""
-            SELECT id, name, email, location
-            FROM users WHERE role='hospital'
-        """)
-        rows = cur.fetchall()
-        conn.close()
-        return jsonify(rows)
+        with db_connection() as conn:
+            cur = conn.cursor(dictionary=True)
+            cur.execute(HOSPITAL_LIST)
+            rows = cur.fetchall()
+            return jsonify(rows)
     except Exception as e:
         print("Error in /api/hospitals:", e)
         return jsonify({"error": f"Server error: {e}"}), 500
@@ -294,106 +467,169 @@ def record_donation():
     
     if not donor_id or not blood_group:
         return jsonify({"error": "❌ Donor ID and blood group are required"}), 400
+
+    try:
+        quantity = int(quantity)
+    except (TypeError, ValueError):
+        return jsonify({"error": "❌ 'quantity' must be a whole number of units"}), 400
+    if not 0 < quantity <= MAX_UNITS_PER_DONATION:
+        return jsonify({"error": f"❌ 'quantity' must be between 1 and {MAX_UNITS_PER_DONATION} units"}), 400
+
+    component = data.get('component', DEFAULT_COMPONENT)
+    if component not in COMPONENTS:
+        return jsonify({"error": f"❌ 'component' must be one of {', '.join(COMPONENTS)}"}), 400
+
+    write_behind = WRITE_BEHIND and blood_group in BLOOD_GROUPS
     
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        # Get donor's blood group if not provided
-        if not blood_group:
-            cur.execute("SELECT blood_group FROM users WHERE id=%s AND role='donor'", (donor_id,))
-            donor = cur.fetchone()
-            if not donor:
-                conn.close()
-                return jsonify({"error": "❌ Donor not found"}), 404
-            blood_group = donor[0]
-        
-        # Update or insert into donors table (update last_donation_date)
-        from datetime import datetime
-        if not donation_date:
-            donation_date = datetime.now().strftime('%Y-%m-%d')
-        
-        # Check if donor record exists in donors table
-        cur.execute("SELECT id FROM donors WHERE user_id=%s", (donor_id,))
-        donor_record = cur.fetchone()
-        
-        if donor_record:
-            # Update existing record
+        with db_connection() as conn:
+            cur = conn.cursor()
+            conn.start_transaction()
+
+            # Get donor's blood group if not provided
+            if not blood_group:
+                cur.execute("SELECT blood_group FROM users WHERE id=%s AND role='donor'", (donor_id,))
+                donor = cur.fetchone()
+                if not donor:
+                    return jsonify({"error": "❌ Donor not found"}), 404
+                blood_group = donor[0]
+
+            # Update or insert into donors table (update last_donation_date)
+            from datetime import datetime
+            if not donation_date:
+                donation_date = datetime.now().strftime('%Y-%m-%d')
+
+            # Create or update the donor's row in one statement (donors.user_id is unique)
             cur.execute("""
-                UPDATE donors 
-                SET last_donation_date=%s, blood_group=%s 
-                WHERE user_id=%s
-            """, (donation_date, blood_group, donor_id))
-        else:
-            # Insert new record
-            cur.execute("SELECT location FROM users WHERE id=%s", (donor_id,))
-            location_result = cur.fetchone()
-            location = location_result[0] if location_result else None
-            
+                INSERT INTO donors (user_id, blood_group, location, last_donation_date, lat, lon, geohash)
+                SELECT u.id, %s, u.location, %s, u.lat, u.lon, u.geohash
+                FROM users u WHERE u.id = %s
+                ON DUPLICATE KEY UPDATE
+                    last_donation_date = VALUES(last_donation_date),
+                    blood_group = VALUES(blood_group)
+            """, (blood_group, donation_date, donor_id))
+
+            # Append to the donation ledger (write-behind: its units reach inventory on the next flush)
             cur.execute("""
-                INSERT INTO donors (user_id, blood_group, location, last_donation_date)
-                VALUES (%s, %s, %s, %s)
-            """, (donor_id, blood_group, location, donation_date))
-        
-        # Update inventory: Add units to the blood group
-        # Use INSERT ... ON DUPLICATE KEY UPDATE to handle both new and existing blood groups
-        cur.execute("""
-            INSERT INTO inventory (blood_group, units)
-            VALUES (%s, %s)
-            ON DUPLICATE KEY UPDATE units = units + %s
-        """, (blood_group, quantity, quantity))
-        
-        conn.commit()
-        conn.close()
-        
+                INSERT INTO donations (donor_id, blood_group, quantity, donation_date, in_inventory)
+                VALUES (%s, %s, %s, %s, %s)
+            """, (donor_id, blood_group, quantity, donation_date, 0 if write_behind else 1))
+            donation_id = cur.lastrowid
+
+            # One tracked unit per bag, expiring after the component's shelf life
+            add_donation_units(cur, "d.id = %s", (donation_id,), quantity, component)
+
+            # Update inventory: Add units to the blood group
+            # Use INSERT ... ON DUPLICATE KEY UPDATE to handle both new and existing blood groups.
+            # Rollups are locked after inventory, as on every other path; with write-behind
+            # both are updated by the journal flush instead of here
+            if not write_behind:
+                cur.execute("""
+                    INSERT INTO inventory (blood_group, units)
+                    VALUES (%s, %s)
+                    ON DUPLICATE KEY UPDATE units = units + %s
+                """, (blood_group, quantity, quantity))
+                rollups.record(cur, "donated", [(donation_date, blood_group, quantity)])
+
+            if write_behind:
+                # Journaled before the commit, keyed by the donation: a crash right after
+                # the commit is replayed from the journal, and a failed commit is skipped
+                inventory_buffer.add(donation_id, blood_group, quantity)
+                try:
+                    conn.commit()
+                except Exception:
+                    inventory_buffer.discard(donation_id)
+                    raise
+            else:
+                conn.commit()
+                allocator.notify_donation([blood_group])
+            stats_cache.invalidate()
+            invalidate_people(donor_id)
+            versions.bump("donations", "donors", "inventory", "blood_units")
+            publish_inventory({blood_group: quantity})
+
+            return jsonify({
+                "message": f"✅ Donation recorded successfully! Added {quantity} unit(s) of {blood_group} to inventory."
+            }), 201
+
+    except Exception as e:
+        print("Error in /api/donation:", e)
+        return jsonify({"error": f"Server error: {e}"}), 500
+
+
+# ✅ BULK DONATIONS - end-of-day upload from blood drives
+# Body: {"donations": [{donor_id, blood_group?, quantity?, donation_date?}, ...], "partial": false}
+# The whole batch is validated first; by default any bad row rejects the batch,
+# with "partial": true the valid rows are recorded and the bad ones reported.
+@app.route('/api/donation/bulk', methods=['POST'])
+def record_donations_bulk():
+    data = request.get_json(silent=True) or {}
+    rows = data.get('donations')
+    partial = bool(data.get('partial', False))
+
+    if not isinstance(rows, list) or not rows:
+        return jsonify({"error": "❌ 'donations' must be a non-empty list"}), 400
+    if len(rows) > MAX_BATCH:
+        return jsonify({"error": f"❌ At most {MAX_BATCH} donations per batch"}), 400
+
+    clean, errors = validate_rows(rows)
+
+    try:
+        with db_connection() as conn:
+            cur = conn.cursor()
+            resolve_donors(cur, clean, errors)
+
+            row_errors = [{"index": i, "error": errors[i]} for i in sorted(errors)]
+            if errors and not partial:
+                return jsonify({
+                    "error": f"❌ {len(errors)} invalid donation(s); nothing was recorded",
+                    "errors": row_errors
+                }), 400
+            if not clean:
+                return jsonify({"error": "❌ No valid donations to record", "errors": row_errors}), 400
+
+            batch_id, deltas = ingest_batch(conn, list(clean.values()))
+        stats_cache.invalidate()
+        invalidate_people(*{row["donor_id"] for row in clean.values()})
+        versions.bump("donations", "donors", "inventory", "blood_units")
+        publish_inventory(deltas)
+        allocator.notify_donation(deltas)
+
         return jsonify({
-            "message": f"✅ Donation recorded successfully! Added {quantity} unit(s) of {blood_group} to inventory."
+            "message": f"✅ Recorded {len(clean)} donation(s)",
+            "batch_id": batch_id,
+            "recorded": len(clean),
+            "units_added": deltas,
+            "errors": row_errors
         }), 201
-        
+
     except Exception as e:
-        print("Error in /api/donation:", e)
+        print("Error in /api/donation/bulk:", e)
         return jsonify({"error": f"Server error: {e}"}), 500
 
 
 # ✅ GET USER PROFILE
 @app.route('/api/user/<int:user_id>', methods=['GET'])
+@conditional("users", "donors")
 def get_user_profile(user_id):
     try:
-        conn = get_db_connection()
-        cur = conn.cursor(dictionary=True)
-        
-        # Get user info
-        cur.execute("SELECT * FROM users WHERE id=%s", (user_id,))
-        user = cur.fetchone()
-        
-        if not user:
-            conn.close()
+        # Read-through entity cache: repeat reads never reach MySQL
+        person = get_person(user_id)
+        if not person:
             return jsonify({"error": "❌ User not found"}), 404
-        
-        # Get donation info if donor
-        donation_info = None
-        if user['role'] == 'donor':
-            cur.execute("""
-                SELECT last_donation_date 
-                FROM donors 
-                WHERE user_id=%s
-            """, (user_id,))
-            donation_info = cur.fetchone()
-        
-        conn.close()
-        
+
         profile = {
-            "id": user["id"],
-            "name": user["name"],
-            "email": user["email"],
-            "role": user["role"],
-            "blood_group": user.get("blood_group"),
-            "location": user.get("location"),
-            "last_donation_date": donation_info["last_donation_date"] if donation_info else None
+            "id": person["id"],
+            "name": person["name"],
+            "email": person["email"],
+            "role": person["role"],
+            "blood_group": person["blood_group"],
+            "location": person["location"],
+            "last_donation_date": person["last_donation_date"] if person["role"] == 'donor' else None
         }
-        
+
         return jsonify(profile), 200
-        
+
     except Exception as e:
         print("Error in /api/user GET:", e)
         return jsonify({"error": f"Server error: {e}"}), 500
@@ -405,71 +641,80 @@ def update_user_profile(user_id):
     data = request.get_json()
     
     try:
-        conn = get_db_connection()
-        cur = conn.cursor(dictionary=True)
-        
-        # Check if user exists
-        cur.execute("SELECT * FROM users WHERE id=%s", (user_id,))
-        user = cur.fetchone()
-        
+        # Hash outside the DB connection; bcrypt takes tens of milliseconds
+        password_hash = hash_password(data['password']) if data.get('password') else None
+
+        # Check if user exists (cached)
+        user = get_person(user_id)
         if not user:
-            conn.close()
             return jsonify({"error": "❌ User not found"}), 404
-        
-        # Build update query dynamically
-        updates = []
-        values = []
-        
-        if 'name' in data:
-            updates.append("name = %s")
-            values.append(data['name'])
-        
-        if 'email' in data:
-            # Check if email already exists for another user
-            cur.execute("SELECT id FROM users WHERE email=%s AND id != %s", (data['email'], user_id))
-            if cur.fetchone():
-                conn.close()
-                return jsonify({"error": "❌ Email already exists"}), 400
-            updates.append("email = %s")
-            values.append(data['email'])
-        
-        if 'blood_group' in data:
-            updates.append("blood_group = %s")
-            values.append(data['blood_group'])
-        
-        if 'location' in data:
-            updates.append("location = %s")
-            values.append(data['location'])
-        
-        if 'password' in data and data['password']:
-            updates.append("password = %s")
-            values.append(data['password'])
-        
-        if not updates:
-            conn.close()
-            return jsonify({"error": "❌ No fields to update"}), 400
-        
-        # Update user
-        values.append(user_id)
-        query = f"UPDATE users SET {', '.join(updates)} WHERE id = %s"
-        cur.execute(query, values)
-        
-        # If donor and blood_group changed, update donors table too
-        if 'blood_group' in data and user['role'] == 'donor':
-            cur.execute("""
-                UPDATE donors 
-                SET blood_group = %s 
-                WHERE user_id = %s
-            """, (data['blood_group'], user_id))
-        
-        conn.commit()
-        conn.close()
-        
-        return jsonify({
-            "message": "✅ Profile updated successfully",
-            "user_id": user_id
-        }), 200
-        
+
+        with db_connection() as conn:
+            cur = conn.cursor(dictionary=True)
+
+            # Build update query dynamically
+            updates = []
+            values = []
+
+            if 'name' in data:
+                updates.append("name = %s")
+                values.append(data['name'])
+
+            if 'email' in data:
+                # Check if email already exists for another user
+                cur.execute("SELECT id FROM users WHERE email=%s AND id != %s", (data['email'], user_id))
+                if cur.fetchone():
+                    return jsonify({"error": "❌ Email already exists"}), 400
+                updates.append("email = %s")
+                values.append(data['email'])
+
+            if 'blood_group' in data:
+                updates.append("blood_group = %s")
+                values.append(data['blood_group'])
+
+            if 'location' in data:
+                updates.append("location = %s, lat = %s, lon = %s, geohash = %s")
+                values.extend([data['location'], *geo.point(data['location'])])
+
+            if password_hash:
+                updates.append("password = %s")
+                values.append(password_hash)
+
+            if not updates:
+                return jsonify({"error": "❌ No fields to update"}), 400
+
+            # Update user
+            values.append(user_id)
+            query = f"UPDATE users SET {', '.join(updates)} WHERE id = %s"
+            cur.execute(query, values)
+
+            # If donor and blood_group changed, update donors table too
+            if 'blood_group' in data and user['role'] == 'donor':
+                cur.execute("""
+                    UPDATE donors 
+                    SET blood_group = %s 
+                    WHERE user_id = %s
+                """, (data['blood_group'], user_id))
+
+            # Donors without a location of their own are placed at the user's
+            if 'location' in data and user['role'] == 'donor':
+                cur.execute("""
+                    UPDATE donors SET lat = %s, lon = %s, geohash = %s
+                    WHERE user_id = %s AND location IS NULL
+                """, (*geo.point(data['location']), user_id))
+
+            conn.commit()
+            invalidate_principal(user_id)
+            invalidate_people(user_id)
+            versions.bump("users", "donors")
+
+            return jsonify({
+                "message": "✅ Profile updated successfully",
+                "user_id": user_id
+            }), 200
+
+    except PasswordPoolBusy as e:
+        return jsonify({"error": f"❌ {e}"}), 503
     except Exception as e:
         print("Error in /api/user PUT:", e)
         return jsonify({"error": f"Server error: {e}"}), 500
@@ -492,63 +737,56 @@ def create_donor():
         return jsonify({"error": "❌ user_id is required"}), 400
 
     try:
-        conn = get_db_connection()
-        cur = conn.cursor(dictionary=True)
+        # Check if user exists, is a donor and has no donor record yet (cached)
+        user = get_person(user_id)
 
-        # Check if user exists and is a donor
-        cur.execute("SELECT id, role FROM users WHERE id = %s", (user_id,))
-        user = cur.fetchone()
-        
         if not user:
-            conn.close()
             return jsonify({"error": "❌ User not found"}), 404
-        
+
         if user['role'] != 'donor':
-            conn.close()
             return jsonify({"error": "❌ User is not a donor"}), 400
 
-        # Check if donor record already exists
-        cur.execute("SELECT id FROM donors WHERE user_id = %s", (user_id,))
-        existing = cur.fetchone()
-        
-        if existing:
-            conn.close()
+        if user['donor_id']:
             return jsonify({"error": "❌ Donor record already exists for this user"}), 400
 
-        # Create donor record
-        cur.execute("""
-            INSERT INTO donors (user_id, blood_group, location, last_donation_date)
-            VALUES (%s, %s, %s, %s)
-        """, (user_id, blood_group, location, last_donation_date))
-        
-        donor_id = cur.lastrowid
+        with db_connection() as conn:
+            cur = conn.cursor(dictionary=True)
+
+            # Create donor record (placed at the user's location when it has none)
+            cur.execute("""
+                INSERT INTO donors (user_id, blood_group, location, last_donation_date, lat, lon, geohash)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+            """, (user_id, blood_group, location, last_donation_date, *geo.point(location or user['location'])))
+
+            donor_id = cur.lastrowid
+
+            # Sync with users table if blood_group or location provided
+            if blood_group or location:
+                updates = []
+                values = []
+
+                if blood_group:
+                    updates.append("blood_group = %s")
+                    values.append(blood_group)
+
+                if location:
+                    updates.append("location = %s, lat = %s, lon = %s, geohash = %s")
+                    values.extend([location, *geo.point(location)])
+
+                if updates:
+                    values.append(user_id)
+                    cur.execute(f"UPDATE users SET {', '.join(updates)} WHERE id = %s", values)
+
+            conn.commit()
+            invalidate_people(user_id)
+            versions.bump("donors", "users")
+
+            return jsonify({
+                "message": "✅ Donor created successfully!",
+                "donor_id": donor_id,
+                "user_id": user_id
+            }), 201
 
-        # Sync with users table if blood_group or location provided
-        if blood_group or location:
-            updates = []
-            values = []
-            
-            if blood_group:
-                updates.append("blood_group = %s")
-                values.append(blood_group)
-            
-            if location:
-                updates.append("location = %s")
-                values.append(location)
-            
-            if updates:
-                values.append(user_id)
-                cur.execute(f"UPDATE users SET {', '.join(updates)} WHERE id = %s", values)
-
-        conn.commit()
-        conn.close()
-        
-        return jsonify({
-            "message": "✅ Donor created successfully!",
-            "donor_id": donor_id,
-            "user_id": user_id
-        }), 201
-        
     except mysql.connector.IntegrityError as e:
         return jsonify({"error": f"❌ Database error: {str(e)}"}), 400
     except Exception as e:
@@ -557,54 +795,81 @@ def create_donor():
 
 
 # ✅ READ - Get all donors
+# Filters: blood_group, location, from, to (last donation date)
+# Paging: limit + cursor (keyset on name, user_id), count=0 skips the total
+# Projection: fields=user_id,name,...
 @app.route('/api/donors', methods=['GET'])
+@conditional("donors", "users")
 def get_donors():
     try:
-        conn = get_db_connection()
-        cur = conn.cursor(dictionary=True)
-        cur.execute("""
-            SELECT u.id AS user_id, u.name, u.email,
-                   COALESCE(d.blood_group, u.blood_group) AS blood_group,
-                   COALESCE(d.location, u.location) AS location,
-                   d.id AS donor_id, d.last_donation_date
-            FROM users u
-            LEFT JOIN donors d ON u.id = d.user_id
-            WHERE u.role = 'donor'
-            ORDER BY u.name
-        """)
-        rows = cur.fetchall()
-        conn.close()
-        return jsonify(rows), 200
+        with db_connection() as conn:
+            return raw_response(fetch_list(conn, DONOR_LIST, request.args))
+    except ListError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         print("Error in GET /api/donors:", e)
         return jsonify({"error": f"Server error: {e}"}), 500
 
 
+# ✅ MATCH - Eligible, compatible donors for a recipient (hospital search)
+# Query: blood_group (recipient, required), location, urgency=routine|urgent|critical,
+# limit (1..MAX_MATCHES, default depends on urgency)
+@app.route('/api/donors/match', methods=['GET'])
+def match_donors_for_recipient():
+    blood_group = request.args.get('blood_group')
+    location = request.args.get('location') or None
+    urgency = request.args.get('urgency', 'routine')
+
+    if blood_group not in COMPATIBLE_DONORS:
+        return jsonify({"error": f"❌ 'blood_group' must be one of {', '.join(COMPATIBLE_DONORS)}"}), 400
+    if urgency not in URGENCY_LIMITS:
+        return jsonify({"error": f"❌ 'urgency' must be one of {', '.join(URGENCY_LIMITS)}"}), 400
+    try:
+        limit = int(request.args['limit']) if 'limit' in request.args else None
+    except ValueError:
+        return jsonify({"error": "❌ 'limit' must be a whole number"}), 400
+    if limit is not None and not 1 <= limit <= MAX_MATCHES:
+        return jsonify({"error": f"❌ 'limit' must be between 1 and {MAX_MATCHES}"}), 400
+
+    try:
+        with db_connection() as conn:
+            cur = conn.cursor(dictionary=True)
+            matches = match_donors(cur, blood_group, location, urgency, limit)
+
+        return jsonify({
+            "recipient_blood_group": blood_group,
+            "compatible_groups": COMPATIBLE_DONORS[blood_group],
+            "deferral_days": DEFERRAL_DAYS,
+            "count": len(matches),
+            "donors": matches
+        }), 200
+
+    except Exception as e:
+        print("Error in GET /api/donors/match:", e)
+        return jsonify({"error": f"Server error: {e}"}), 500
+
+
 # ✅ READ - Get single donor by user_id
 @app.route('/api/donors/user/<int:user_id>', methods=['GET'])
+@conditional("donors", "users")
 def get_donor_by_user_id(user_id):
     try:
-        conn = get_db_connection()
-        cur = conn.cursor(dictionary=True)
-        
-        cur.execute("""
-            SELECT u.id AS user_id, u.name, u.email, u.role,
-                   COALESCE(d.blood_group, u.blood_group) AS blood_group,
-                   COALESCE(d.location, u.location) AS location,
-                   d.id AS donor_id, d.last_donation_date
-            FROM users u
-            LEFT JOIN donors d ON u.id = d.user_id
-            WHERE u.id = %s AND u.role = 'donor'
-        """, (user_id,))
-        
-        donor = cur.fetchone()
-        conn.close()
-        
-        if not donor:
+        person = get_person(user_id)
+
+        if not person or person["role"] != 'donor':
             return jsonify({"error": "❌ Donor not found"}), 404
-        
-        return jsonify(donor), 200
-        
+
+        return jsonify({
+            "user_id": person["id"],
+            "name": person["name"],
+            "email": person["email"],
+            "role": person["role"],
+            "blood_group": person["donor_blood_group"] or person["blood_group"],
+            "location": person["donor_location"] or person["location"],
+            "donor_id": person["donor_id"],
+            "last_donation_date": person["last_donation_date"]
+        }), 200
+
     except Exception as e:
         print("Error in GET /api/donors/user/<id>:", e)
         return jsonify({"error": f"Server error: {e}"}), 500
@@ -612,28 +877,44 @@ def get_donor_by_user_id(user_id):
 
 # ✅ READ - Get single donor by donor_id (donors table id)
 @app.route('/api/donors/<int:donor_id>', methods=['GET'])
+@conditional("donors", "users")
 def get_donor_by_id(donor_id):
     try:
-        conn = get_db_connection()
-        cur = conn.cursor(dictionary=True)
-        
-        cur.execute("""
-            SELECT d.id AS donor_id, d.user_id, 
-                   d.blood_group, d.location, d.last_donation_date,
-                   u.id AS user_id, u.name, u.email, u.role
-            FROM donors d
-            LEFT JOIN users u ON d.user_id = u.id
-            WHERE d.id = %s
-        """, (donor_id,))
-        
-        donor = cur.fetchone()
-        conn.close()
-        
-        if not donor:
-            return jsonify({"error": "❌ Donor record not found"}), 404
-        
-        return jsonify(donor), 200
-        
+        # Cached: donor id -> user id -> person (donor fields included)
+        user_id = get_donor_owner(donor_id)
+        person = get_person(user_id) if user_id else None
+        if person and person["donor_id"] == donor_id:
+            return jsonify({
+                "donor_id": donor_id,
+                "user_id": person["id"],
+                "blood_group": person["donor_blood_group"],
+                "location": person["donor_location"],
+                "last_donation_date": person["last_donation_date"],
+                "name": person["name"],
+                "email": person["email"],
+                "role": person["role"]
+            }), 200
+
+        # Not found, or a donor row whose user is gone: straight from MySQL
+        with db_connection() as conn:
+            cur = conn.cursor(dictionary=True)
+
+            cur.execute("""
+                SELECT d.id AS donor_id, d.user_id, 
+                       d.blood_group, d.location, d.last_donation_date,
+                       u.id AS user_id, u.name, u.email, u.role
+                FROM donors d
+                LEFT JOIN users u ON d.user_id = u.id
+                WHERE d.id = %s
+            """, (donor_id,))
+
+            donor = cur.fetchone()
+
+            if not donor:
+                return jsonify({"error": "❌ Donor record not found"}), 404
+
+            return jsonify(donor), 200
+
     except Exception as e:
         print("Error in GET /api/donors/<id>:", e)
         return jsonify({"error": f"Server error: {e}"}), 500
@@ -648,68 +929,69 @@ def update_donor_record(donor_id):
         return jsonify({"error": "❌ Request body is required"}), 400
     
     try:
-        conn = get_db_connection()
-        cur = conn.cursor(dictionary=True)
-
-        # Get the donor record and user_id
-        cur.execute("SELECT user_id FROM donors WHERE id = %s", (donor_id,))
-        donor_record = cur.fetchone()
-        
-        if not donor_record:
-            conn.close()
-            return jsonify({"error": "❌ Donor record not found"}), 404
-        
-        user_id = donor_record['user_id']
-
-        # Build update query for donors table
-        updates = []
-        values = []
-        
-        if 'blood_group' in data:
-            updates.append("blood_group = %s")
-            values.append(data['blood_group'])
-        
-        if 'location' in data:
-            updates.append("location = %s")
-            values.append(data['location'])
-        
-        if 'last_donation_date' in data:
-            updates.append("last_donation_date = %s")
-            values.append(data['last_donation_date'])
-
-        if not updates:
-            conn.close()
-            return jsonify({"error": "❌ No fields to update"}), 400
-
-        # Update donors table
-        values.append(donor_id)
-        cur.execute(f"UPDATE donors SET {', '.join(updates)} WHERE id = %s", values)
-
-        # Sync with users table if blood_group or location changed
-        user_updates = []
-        user_values = []
-        
-        if 'blood_group' in data:
-            user_updates.append("blood_group = %s")
-            user_values.append(data['blood_group'])
-        
-        if 'location' in data:
-            user_updates.append("location = %s")
-            user_values.append(data['location'])
-        
-        if user_updates:
-            user_values.append(user_id)
-            cur.execute(f"UPDATE users SET {', '.join(user_updates)} WHERE id = %s", user_values)
-
-        conn.commit()
-        conn.close()
-        
-        return jsonify({
-            "message": "✅ Donor updated successfully!",
-            "donor_id": donor_id,
-            "user_id": user_id
-        }), 200
-        
+        with db_connection() as conn:
+            cur = conn.cursor(dictionary=True)
+
+            # Get the donor record's user_id (cached; orphaned rows are looked up)
+            user_id = get_donor_owner(donor_id)
+            if user_id is None:
+                cur.execute("SELECT user_id FROM donors WHERE id = %s", (donor_id,))
+                donor_record = cur.fetchone()
+
+                if not donor_record:
+                    return jsonify({"error": "❌ Donor record not found"}), 404
+
+                user_id = donor_record['user_id']
+
+            # Build update query for donors table
+            updates = []
+            values = []
+
+            if 'blood_group' in data:
+                updates.append("blood_group = %s")
+                values.append(data['blood_group'])
+
+            if 'location' in data:
+                updates.append("location = %s, lat = %s, lon = %s, geohash = %s")
+                values.extend([data['location'], *geo.point(data['location'])])
+
+            if 'last_donation_date' in data:
+                updates.append("last_donation_date = %s")
+                values.append(data['last_donation_date'])
+
+            if not updates:
+                return jsonify({"error": "❌ No fields to update"}), 400
+
+            # Update donors table
+            values.append(donor_id)
+            cur.execute(f"UPDATE donors SET {', '.join(updates)} WHERE id = %s", values)
+
+            # Sync with users table if blood_group or location changed
+            user_updates = []
+            user_values = []
+
+            if 'blood_group' in data:
+                user_updates.append("blood_group = %s")
+                user_values.append(data['blood_group'])
+
+            if 'location' in data:
+                user_updates.append("location = %s, lat = %s, lon = %s, geohash = %s")
+                user_values.extend([data['location'], *geo.point(data['location'])])
+
+            if user_updates:
+                user_values.append(user_id)
+                cur.execute(f"UPDATE users SET {', '.join(user_updates)} WHERE id = %s", user_values)
+
+            conn.commit()
+            invalidate_people(user_id)
+            versions.bump("donors", "users")
+
+            return jsonify({
+                "message": "✅ Donor updated successfully!",
+                "donor_id": donor_id,
+                "user_id": user_id
+            }), 200
+
     except Exception as e:
         print("Error in PUT /api/donors/<donor_id>:", e)
         return jsonify({"error": f"Server error: {e}"}), 500
@@ -719,38 +1001,294 @@ def update_donor_record(donor_id):
 @app.route('/api/donors/<int:donor_id>', methods=['DELETE'])
 def delete_donor_record(donor_id):
     try:
-        conn = get_db_connection()
-        cur = conn.cursor(dictionary=True)
+        with db_connection() as conn:
+            cur = conn.cursor(dictionary=True)
 
-        # Get donor info before deletion
-        cur.execute("SELECT user_id FROM donors WHERE id = %s", (donor_id,))
-        donor = cur.fetchone()
-        
-        if not donor:
-            conn.close()
-            return jsonify({"error": "❌ Donor record not found"}), 404
+            # Get donor info before deletion
+            cur.execute("SELECT user_id FROM donors WHERE id = %s", (donor_id,))
+            donor = cur.fetchone()
+
+            if not donor:
+                return jsonify({"error": "❌ Donor record not found"}), 404
+
+            # Delete donor record
+            cur.execute("DELETE FROM donors WHERE id = %s", (donor_id,))
+
+            conn.commit()
+            invalidate_principal(donor['user_id'])
+            invalidate_donor(donor_id, donor['user_id'])
+            versions.bump("donors")
+
+            return jsonify({
+                "message": "✅ Donor record deleted successfully!",
+                "deleted_donor_id": donor_id,
+                "user_id": donor['user_id']
+            }), 200
+
+    except Exception as e:
+        print("Error in DELETE /api/donors/<donor_id>:", e)
+        return jsonify({"error": f"Server error: {e}"}), 500
+
+
+# ✅ STREAMING EXPORT - requests / donors / donations / units as NDJSON or CSV
+# Same filters as the list endpoints; format=ndjson|csv, gzip=1 to compress.
+# Rows are streamed in chunks so memory stays flat however big the export is.
+EXPORTS = {
+    "requests": REQUEST_LIST,
+    "donors": DONOR_LIST,
+    "donations": DONATION_LIST,
+    "units": UNIT_LIST,
+}
+
+
+@app.route('/api/export/<dataset>', methods=['GET'])
+def export_data(dataset):
+    spec = EXPORTS.get(dataset)
+    if not spec:
+        return jsonify({"error": f"❌ Unknown export '{dataset}'. Use one of: {', '.join(EXPORTS)}"}), 404
+
+    fmt = request.args.get('format', 'ndjson')
+    compress = request.args.get('gzip', '0') in ('1', 'true', 'yes')
+
+    try:
+        body, mimetype = export_stream(spec, request.args, fmt, compress)
+    except ListError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print("Error in /api/export:", e)
+        return jsonify({"error": f"Server error: {e}"}), 500
+
+    filename = f"{dataset}.{fmt}" + (".gz" if compress else "")
+    return Response(body, mimetype=mimetype, headers={
+        "Content-Disposition": f"attachment; filename={filename}"
+    })
+
+
+# ✅ LIVE EVENTS (Server-Sent Events) - inventory and request changes
+# Everyone gets inventory deltas; request changes need a session (see
+# events.subscription_topics). EventSource cannot send headers, so the session
+# token may also come as ?token=... Each stream served here holds a request
+# thread, so only SSE_THREAD_STREAMS are accepted per process; asgi.py serves
+# them as coroutines without that limit.
+@app.route('/api/events', methods=['GET'])
+def stream_events():
+    token = request.args.get('token')
+    principal = resolve_token(token) if token else current_principal()
+    if not principal and (token or request.headers.get('Authorization')):
+        return jsonify({"error": "❌ Invalid or expired session"}), 401
+
+    try:
+        topics = subscription_topics(principal, request.args.get('hospital_id', type=int))
+    except SubscriptionDenied as e:
+        return jsonify({"error": f"❌ {e}"}), e.status
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+
+    try:
+        subscription = broker.subscribe(topics, last_event_id, holds_thread=True)
+    except TooManySubscribers as e:
+        return jsonify({"error": f"❌ {e}"}), 503
+
+    response = Response(sse_stream(subscription), mimetype='text/event-stream', headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+    response.call_on_close(lambda: broker.unsubscribe(subscription))
+    return response
+
+
+# ✅ AUTO-ALLOCATION - hand stock to pending requests by priority (admin)
+# Body: {"dry_run": true} to only see the plan; {"reload": true} re-reads the pending queue first
+@app.route('/api/allocation/run', methods=['POST'])
+@login_required('admin')
+def run_allocation():
+    data = request.get_json(silent=True) or {}
+    try:
+        summary = allocator.run(dry_run=bool(data.get('dry_run', False)), reload=bool(data.get('reload', False)))
+        summary["queues"] = allocator.queue_sizes()
+        return jsonify(summary), 200
+    except Exception as e:
+        print("Error in /api/allocation/run:", e)
+        return jsonify({"error": f"Server error: {e}"}), 500
 
-        # Delete donor record
-        cur.execute("DELETE FROM donors WHERE id = %s", (donor_id,))
 
-        conn.commit()
-        conn.close()
-        
+# ✅ CURRENT SESSION - who does this token belong to (no DB hit when cached)
+@app.route('/api/session', methods=['GET'])
+@login_required()
+def get_session():
+    return jsonify(current_principal()), 200
+
+
+# ✅ DASHBOARD STATS - all admin counters in one query (briefly cached)
+@app.route('/api/stats', methods=['GET'])
+@conditional("users", "donors", "inventory", "requests")
+def get_stats():
+    def query():
+        # Fills the shared stats cache, so it reads the primary
+        with db_connection(replica=False) as conn:
+            cur = conn.cursor(dictionary=True)
+            cur.execute(DASHBOARD_STATS)
+            return cur.fetchone()
+
+    def load():
+        row, pending = read_consistent(query)
+        stats = {key: int(value) for key, value in row.items()}
+        stats["total_units"] += sum(pending.values())
+        return stats
+
+    try:
+        return jsonify(stats_cache.get_or_load("stats", load)), 200
+    except Exception as e:
+        print("Error in /api/stats:", e)
+        return jsonify({"error": f"Server error: {e}"}), 500
+
+
+# ✅ FORECAST - days to stockout per blood group, from the daily rollups
+# Query: days (history looked at), window (moving average), alpha (smoothing),
+# history=1 adds the daily series themselves
+@app.route('/api/forecast', methods=['GET'])
+def get_forecast():
+    try:
+        days = int(request.args.get('days', rollups.FORECAST_DAYS))
+        window = int(request.args.get('window', rollups.FORECAST_WINDOW))
+        alpha = float(request.args.get('alpha', rollups.FORECAST_ALPHA))
+    except ValueError:
+        return jsonify({"error": "❌ 'days' and 'window' must be whole numbers, 'alpha' a number"}), 400
+    if not 1 <= days <= rollups.MAX_FORECAST_DAYS:
+        return jsonify({"error": f"❌ 'days' must be between 1 and {rollups.MAX_FORECAST_DAYS}"}), 400
+    if not 1 <= window <= days:
+        return jsonify({"error": "❌ 'window' must be between 1 and 'days'"}), 400
+    if not 0 < alpha <= 1:
+        return jsonify({"error": "❌ 'alpha' must be above 0 and at most 1"}), 400
+
+    today = date.today()
+
+    def load():
+        with db_connection(replica=False if WRITE_BEHIND else None) as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT blood_group, units FROM inventory")
+            stock = dict(cur.fetchall())
+            return stock, rollups.load_history(cur, days, today)
+
+    try:
+        # Stock includes donations not yet flushed by write-behind mode
+        (stock, series), pending = read_consistent(load)
+        for blood_group, delta in pending.items():
+            stock[blood_group] = stock.get(blood_group, 0) + delta
+
+        result = {
+            "as_of": today.isoformat(),
+            "days": days,
+            "window": window,
+            "alpha": alpha,
+            "groups": rollups.forecast(stock, series, today, alpha, window)
+        }
+        if request.args.get('history') in ('1', 'true', 'yes'):
+            start = today - timedelta(days=days)
+            result["history"] = {
+                "days": [(start + timedelta(days=i)).isoformat() for i in range(days)],
+                **{column: dict(zip(BLOOD_GROUPS, series[column])) for column in rollups.COLUMNS}
+            }
+        return jsonify(result), 200
+    except Exception as e:
+        print("Error in /api/forecast:", e)
+        return jsonify({"error": f"Server error: {e}"}), 500
+
+
+# ✅ NEARBY - donors or hospitals within radius_km of a point, nearest first
+# Query: type=donors|hospitals; the centre is lat+lon, a gazetteer location or a
+# user_id (that user's stored coordinates); radius_km, limit, blood_group (donors)
+@app.route('/api/nearby', methods=['GET'])
+def get_nearby():
+    kind = request.args.get('type', 'donors')
+    if kind not in geo.NEARBY:
+        return jsonify({"error": f"❌ 'type' must be one of {', '.join(geo.NEARBY)}"}), 400
+    blood_group = request.args.get('blood_group') or None
+    if blood_group and blood_group not in BLOOD_GROUPS:
+        return jsonify({"error": f"❌ 'blood_group' must be one of {', '.join(BLOOD_GROUPS)}"}), 400
+    # Parsed one by one so a malformed value is reported, never read as absent
+    numbers = {}
+    for name, parse, default in (("radius_km", float, 20), ("limit", int, 50), ("lat", float, None),
+                                 ("lon", float, None), ("user_id", int, None)):
+        raw = request.args.get(name)
+        try:
+            numbers[name] = default if raw is None else parse(raw)
+        except ValueError:
+            expected = "a number" if parse is float else "a whole number"
+            return jsonify({"error": f"❌ '{name}' must be {expected}, got '{raw}'"}), 400
+    radius_km, limit, lat, lon, user_id = numbers.values()
+    if not 0 < radius_km <= geo.MAX_RADIUS_KM:
+        return jsonify({"error": f"❌ 'radius_km' must be above 0 and at most {geo.MAX_RADIUS_KM}"}), 400
+    if not 1 <= limit <= 500:
+        return jsonify({"error": "❌ 'limit' must be between 1 and 500"}), 400
+
+    location = request.args.get('location')
+    if (lat is None) != (lon is None):
+        return jsonify({"error": "❌ 'lat' and 'lon' must be given together"}), 400
+    if lat is not None:
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            return jsonify({"error": "❌ 'lat' / 'lon' out of range"}), 400
+    elif location:
+        coordinates = geo.geocode(location)
+        if coordinates is None:
+            return jsonify({"error": f"❌ Unknown location '{location}'"}), 400
+        lat, lon = coordinates
+    elif user_id is None:
+        return jsonify({"error": "❌ Give 'lat' and 'lon', 'location' or 'user_id'"}), 400
+
+    try:
+        with db_connection() as conn:
+            cur = conn.cursor(dictionary=True)
+            if lat is None or lon is None:
+                cur.execute("SELECT lat, lon FROM users WHERE id = %s", (user_id,))
+                user = cur.fetchone()
+                if not user:
+                    return jsonify({"error": "❌ User not found"}), 404
+                if user['lat'] is None:
+                    return jsonify({"error": "❌ User's location could not be geocoded"}), 404
+                lat, lon = user['lat'], user['lon']
+            results = geo.find_nearby(cur, kind, lat, lon, radius_km, limit, blood_group)
+
         return jsonify({
-            "message": "✅ Donor record deleted successfully!",
-            "deleted_donor_id": donor_id,
-            "user_id": donor['user_id']
+            "type": kind,
+            "center": {"lat": lat, "lon": lon},
+            "radius_km": radius_km,
+            "count": len(results),
+            "results": results
         }), 200
-        
+
     except Exception as e:
-        print("Error in DELETE /api/donors/<donor_id>:", e)
+        print("Error in /api/nearby:", e)
         return jsonify({"error": f"Server error: {e}"}), 500
 
 
+# ✅ CONNECTION POOL STATS (for scraping)
+@app.route('/api/pool/stats', methods=['GET'])
+def get_pool_stats():
+    return jsonify({**pool.stats(), "read_routing": replicas.stats()}), 200
+
+
+# ✅ CACHE STATS - hit/miss ratios of the in-process and entity caches
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    return jsonify({
+        "sessions": principal_cache.stats(),
+        "stats": stats_cache.stats(),
+        **entities.stats()
+    }), 200
+
+
 @app.route('/')
 def home():
     return "Blood Bank API is running ✅"
 
 
+# ✅ METRICS - per-route latency histograms and MySQL timing on GET /metrics
+# (registered last so every route above is instrumented)
+install_metrics(app)
+routing.install(app)
+
+
+# Development server only; use `python serve.py` in production
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=int(os.getenv('FLASK_RUN_PORT', 5000)), debug=True)
+    app.run(host='0.0.0.0', port=int(os.getenv('FLASK_RUN_PORT', 5000)),
+            debug=os.getenv('FLASK_DEBUG', '0') == '1', threaded=True)
@@ -0,0 +1,433 @@
+"""ASGI entry point: the same API, with the hot routes served by async handlers.
+
+The routes dashboards poll (inventory, request/donor lists, hospitals, stats),
+request submission and the live event stream run as coroutines on an aiomysql
+pool, so a request waiting on MySQL holds no thread. Every other route is
+handed to the Flask app in app.py unchanged, through a WSGI bridge with its own
+small thread pool. Responses use Flask's JSON encoder, so both servers produce
+identical payloads, ETags and error messages.
+
+    pip install -r requirements-asgi.txt
+    python serve.py     # gunicorn with preloaded uvicorn workers, see serve.py
+    gunicorn asgi:app -k uvicorn.workers.UvicornWorker --preload -w 4 -b 0.0.0.0:8000
+
+Load the app once and fork (--preload) when running several workers: live
+events, ETag versions and read-your-writes tracking live in shared memory set
+up at import. `uvicorn --workers` starts each worker from scratch, so those
+would stay per process; use it with a single worker only.
+"""
+import asyncio
+import os
+import signal
+import threading
+import time
+from contextlib import asynccontextmanager
+from datetime import date
+from functools import wraps
+
+import aiomysql
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Mount, Route
+from werkzeug.http import parse_etags
+
+import rollups
+import versions
+from allocation import URGENCIES
+from blood_groups import BLOOD_GROUPS
+from app import allocator, app as flask_app, stats_cache
+from db import (
+    DB_CONFIG, POOL_RECYCLE, READ_YOUR_WRITES, end_route, note_replica_read, replica_config, replica_reads, replica_served,
+    replicas, route_reads
+)
+from events import (
+    SSE_KEEPALIVE, SubscriptionDenied, TooManySubscribers, broker, close_streams_on, format_event, publish_request,
+    subscription_topics
+)
+from listing import (
+    DASHBOARD_STATS, DONOR_LIST, HOSPITAL_LIST, REQUEST_DETAIL, REQUEST_LIST, ListError, plan_list, render_list,
+)
+from routing import READ_METHODS, note_write, wrote_recently
+from sessions import resolve_token
+from writebehind import WRITE_BEHIND, merge_pending, pending_deltas, read_marker, read_settled
+
+# ✅ Async pool settings (all overridable from the environment)
+ASYNC_POOL_MIN = int(os.getenv("ASYNC_POOL_MIN", 1))
+ASYNC_POOL_SIZE = int(os.getenv("ASYNC_POOL_SIZE", 20))
+WSGI_THREADS = int(os.getenv("ASGI_WSGI_THREADS", 10))   # threads for the routes still served by Flask
+
+db_pool = None
+replica_pools = {}      # replica name -> aiomysql pool; health comes from db.replicas
+
+
+def create_pool(config, minsize):
+    return aiomysql.create_pool(
+        host=config["host"],
+        port=config["port"],
+        user=config["user"],
+        password=config["password"],
+        db=config["database"],
+        connect_timeout=config.get("connection_timeout", 60),
+        autocommit=True,
+        minsize=minsize,
+        maxsize=ASYNC_POOL_SIZE,
+        pool_recycle=int(POOL_RECYCLE),
+    )
+
+
+@asynccontextmanager
+async def lifespan(_app):
+    global db_pool
+    db_pool = await create_pool(DB_CONFIG, ASYNC_POOL_MIN)
+    # Replicas connect on first use, so one that is down does not stop startup
+    for replica in replicas.replicas:
+        replica_pools[replica.name] = await create_pool(replica_config(replica.name), 0)
+    # uvicorn has installed its shutdown handlers by now; end open streams first
+    if threading.current_thread() is threading.main_thread():
+        close_streams_on(signal.SIGINT, signal.SIGTERM)
+    try:
+        yield
+    finally:
+        for pool in [db_pool, *replica_pools.values()]:
+            pool.close()
+            await pool.wait_closed()
+
+
+# ✅ Read routing, as routing.py does for the Flask routes: GET / HEAD read a
+# healthy replica unless the client wrote within the last READ_YOUR_WRITES seconds
+class ReadRouting:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in READ_METHODS or not replicas:
+            await self.app(scope, receive, send)
+            return
+        client = scope.get("client")
+        fresh = wrote_recently(client[0] if client else None, Headers(scope=scope).get("authorization"))
+        token = route_reads(not fresh)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            end_route(token)
+
+
+# Async twin of db.db_connection: replica=None follows the request's routing
+# (the least busy healthy replica for reads), False always uses the primary.
+# A replica that fails to connect is marked down until its next check.
+@asynccontextmanager
+async def read_connection(replica=None):
+    if replica is None:
+        replica = replica_reads()
+    pool, conn = db_pool, None
+    if replica and replica_pools:
+        healthy = [(replica_pools[r.name], r) for r in replicas.healthy()]
+        for candidate_pool, candidate in sorted(healthy, key=lambda item: item[0].size - item[0].freesize):
+            try:
+                conn = await candidate_pool.acquire()
+            except Exception as e:
+                candidate.mark(None, f"unreachable: {e}")
+                continue
+            pool = candidate_pool
+            candidate.reads += 1
+            note_replica_read()
+            break
+        else:
+            replicas.primary_reads += 1
+    if conn is None:
+        conn = await db_pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+
+async def fetch_all(sql, params=(), replica=None):
+    async with read_connection(replica) as conn:
+        async with conn.cursor(aiomysql.DictCursor) as cur:
+            await cur.execute(sql, params)
+            return await cur.fetchall()
+
+
+async def fetch_rows(sql, params=(), replica=None):
+    async with read_connection(replica) as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(sql, params)
+            return await cur.fetchall()
+
+
+async def fetch_one(sql, params=(), replica=None):
+    rows = await fetch_all(sql, params, replica)
+    return rows[0] if rows else None
+
+
+# Async form of writebehind.read_consistent: MySQL rows + unflushed deltas
+async def fetch_consistent(fetch, sql, attempts=20, replica=None):
+    for _ in range(attempts):
+        marker = read_marker()
+        result = await fetch(sql, replica=replica)
+        pending = pending_deltas()
+        if read_settled(marker):
+            break
+        await asyncio.sleep(0.001)
+    return result, pending
+
+
+# ✅ Same body as flask.jsonify (encoder, key order, trailing newline)
+def json_response(data, status_code=200):
+    body = flask_app.json.response(data).get_data()
+    return Response(body, status_code=status_code, media_type="application/json")
+
+
+def raw_json_response(body):
+    return Response(body + b"\n", media_type="application/json")
+
+
+def error_response(message, status_code):
+    return json_response({"error": message}, status_code)
+
+
+# ✅ Async twin of versions.conditional: 304 before any query when the tag matches
+def conditional(*tables):
+    def decorator(handler):
+        @wraps(handler)
+        async def wrapped(request):
+            etag = versions.etag_for(tables, f"{request.url.path}?{request.url.query}")
+            quoted = f'"{etag}"'
+            if parse_etags(request.headers.get("if-none-match")).contains(etag):
+                response = Response(status_code=304)
+            else:
+                response = await handler(request)
+                if response.status_code != 200:
+                    return response
+            # As in versions.conditional: a replica's body is only tagged once the
+            # writes behind it are older than the lag a replica is allowed
+            if response.status_code == 304 or not replica_served() or versions.settled(tables, READ_YOUR_WRITES):
+                response.headers["ETag"] = quoted
+            response.headers["Cache-Control"] = "no-cache"
+            return response
+        return wrapped
+    return decorator
+
+
+# ✅ INVENTORY
+@conditional("inventory")
+async def get_inventory(request):
+    try:
+        # Unflushed write-behind units are only consistent with the primary
+        rows, pending = await fetch_consistent(
+            fetch_all, "SELECT * FROM inventory", replica=False if WRITE_BEHIND else None
+        )
+        return json_response(merge_pending(rows, pending))
+    except Exception as e:
+        print("Error in /api/inventory:", e)
+        return error_response(f"Server error: {e}", 500)
+
+
+async def fetch_list_async(spec, args):
+    plan = plan_list(spec, args)
+    rows = await fetch_rows(*plan.select)
+    total = None
+    if plan.count is not None:
+        total = (await fetch_rows(*plan.count))[0][0]
+    return render_list(spec, plan, rows, total)
+
+
+# ✅ GET ALL REQUESTS (same filters, paging and fields= as the Flask route)
+@conditional("requests", "users")
+async def get_requests(request):
+    try:
+        return raw_json_response(await fetch_list_async(REQUEST_LIST, request.query_params))
+    except ListError as e:
+        return error_response(str(e), 400)
+    except Exception as e:
+        print("Error in /api/request GET:", e)
+        return error_response(f"Server error: {e}", 500)
+
+
+# ✅ SUBMIT REQUEST
+async def create_request(request):
+    try:
+        data = await request.json()
+    except ValueError:
+        return error_response("❌ Request body must be a JSON object", 400)
+    if not isinstance(data, dict):
+        return error_response("❌ Request body must be a JSON object", 400)
+    urgency = data.get('urgency') or 'routine'
+    if urgency not in URGENCIES:
+        return error_response(f"❌ Invalid urgency. Must be one of: {', '.join(URGENCIES)}", 400)
+    if data.get('blood_group') not in BLOOD_GROUPS:
+        return error_response(f"❌ 'blood_group' must be one of {', '.join(BLOOD_GROUPS)}", 400)
+    try:
+        quantity = int(data.get('quantity'))
+    except (TypeError, ValueError):
+        return error_response("❌ 'quantity' must be a whole number of units", 400)
+    if quantity <= 0:
+        return error_response("❌ 'quantity' must be at least 1 unit", 400)
+    try:
+        async with db_pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await conn.begin()
+                await cur.execute("""
+                    INSERT INTO requests (hospital_id, blood_group, quantity, urgency, status)
+                    VALUES (%s, %s, %s, %s, 'pending')
+                """, (data.get('hospital_id'), data.get('blood_group'), quantity, urgency))
+                request_id = cur.lastrowid
+                rollup = rollups.upsert("requested", [(date.today(), data.get('blood_group'), quantity)])
+                if rollup:
+                    await cur.executemany(*rollup)
+                await conn.commit()
+        # The Flask-served GET routes may read replicas: keep this client on the primary
+        note_write(request.client.host if request.client else None, request.headers.get("authorization"))
+        stats_cache.invalidate()
+        versions.bump("requests")
+        allocator.add(request_id, data.get('blood_group'), quantity, urgency, time.time())
+        allocator.notify([data.get('blood_group')])
+        publish_request({
+            "id": request_id,
+            "hospital_id": data.get('hospital_id'),
+            "blood_group": data.get('blood_group'),
+            "quantity": quantity,
+            "urgency": urgency,
+            "status": "pending"
+        })
+        return json_response({'message': 'Request submitted successfully'}, 201)
+    except Exception as e:
+        print("Error in /api/request:", e)
+        return error_response(f"Server error: {e}", 500)
+
+
+# ✅ GET SINGLE REQUEST by ID
+@conditional("requests", "users")
+async def get_single_request(request):
+    try:
+        request_data = await fetch_one(REQUEST_DETAIL, (request.path_params["rid"],))
+        if not request_data:
+            return error_response("❌ Request not found", 404)
+        return json_response(request_data)
+    except Exception as e:
+        print("Error in /api/request/<id> GET:", e)
+        return error_response(f"Server error: {e}", 500)
+
+
+# ✅ GET ALL HOSPITALS
+@conditional("users")
+async def get_hospitals(request):
+    try:
+        return json_response(await fetch_all(HOSPITAL_LIST))
+    except Exception as e:
+        print("Error in /api/hospitals:", e)
+        return error_response(f"Server error: {e}", 500)
+
+
+# ✅ GET ALL DONORS
+@conditional("donors", "users")
+async def get_donors(request):
+    try:
+        return raw_json_response(await fetch_list_async(DONOR_LIST, request.query_params))
+    except ListError as e:
+        return error_response(str(e), 400)
+    except Exception as e:
+        print("Error in GET /api/donors:", e)
+        return error_response(f"Server error: {e}", 500)
+
+
+# ✅ DASHBOARD STATS (shares the Flask app's cache and its invalidations)
+@conditional("users", "donors", "inventory", "requests")
+async def get_stats(request):
+    async def load():
+        # Fills the shared stats cache, so it reads the primary
+        row, pending = await fetch_consistent(fetch_one, DASHBOARD_STATS, replica=False)
+        stats = {key: int(value) for key, value in row.items()}
+        stats["total_units"] += sum(pending.values())
+        return stats
+
+    try:
+        return json_response(await stats_cache.get_or_load_async("stats", load))
+    except Exception as e:
+        print("Error in /api/stats:", e)
+        return error_response(f"Server error: {e}", 500)
+
+
+# ✅ LIVE EVENTS - one coroutine per open stream instead of one thread
+async def sse_stream_async(subscription):
+    loop = asyncio.get_running_loop()
+    ready = asyncio.Event()
+    # Publishers may run on Flask's threads; hop onto the event loop to wake us
+    subscription.add_listener(lambda: loop.call_soon_threadsafe(ready.set))
+    try:
+        yield "retry: 3000\n\n"
+        while not subscription.closed:
+            if not subscription.events:
+                try:
+                    await asyncio.wait_for(ready.wait(), SSE_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+            ready.clear()
+            events = subscription.drain()
+            if events:
+                yield "".join(format_event(e) for e in events)
+    finally:
+        broker.unsubscribe(subscription)
+
+
+async def stream_events(request):
+    # EventSource cannot send headers, so the token may come as ?token=...
+    token = request.query_params.get("token")
+    header = request.headers.get("authorization", "")
+    if not token and header.startswith("Bearer "):
+        token = header[7:]
+    principal = None
+    if token:
+        # Cached after the first call; a miss reads MySQL, so keep it off the loop
+        principal = await run_in_threadpool(resolve_token, token)
+        if not principal:
+            return error_response("❌ Invalid or expired session", 401)
+
+    hospital_id = request.query_params.get("hospital_id")
+    hospital_id = int(hospital_id) if hospital_id and hospital_id.isdigit() else None
+    try:
+        topics = subscription_topics(principal, hospital_id)
+    except SubscriptionDenied as e:
+        return error_response(f"❌ {e}", e.status)
+    last_event_id = request.headers.get("last-event-id")
+    last_event_id = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+
+    try:
+        subscription = broker.subscribe(topics, last_event_id)
+    except TooManySubscribers as e:
+        return error_response(f"❌ {e}", 503)
+
+    return StreamingResponse(sse_stream_async(subscription), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+
+routes = [
+    Route("/api/inventory", get_inventory, methods=["GET"]),
+    Route("/api/request", get_requests, methods=["GET"]),
+    Route("/api/request", create_request, methods=["POST"]),
+    Route("/api/request/{rid:int}", get_single_request, methods=["GET"]),
+    Route("/api/hospitals", get_hospitals, methods=["GET"]),
+    Route("/api/donors", get_donors, methods=["GET"]),
+    Route("/api/stats", get_stats, methods=["GET"]),
+    Route("/api/events", stream_events, methods=["GET"]),
+    # Everything else (login, approvals, donations, profiles, exports...) is the Flask app
+    Mount("/", app=WSGIMiddleware(flask_app, workers=WSGI_THREADS)),
+]
+
+app = Starlette(
+    routes=routes,
+    lifespan=lifespan,
+    middleware=[
+        Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"]),
+        Middleware(ReadRouting),
+    ],
+)
@@ -0,0 +1,63 @@
+"""Re-planning benchmark for the auto-allocation engine.
+
+Builds a synthetic backlog of pending requests in memory (no database needed)
+and times allocation.plan over it, for a scarce and a plentiful stock level.
+The target is a full re-plan of 100k pending requests in well under a second.
+
+    python bench/allocation_bench.py --requests 100000 --repeat 5
+"""
+import argparse
+import heapq
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from allocation import URGENCIES, make_entry, plan  # noqa: E402
+from blood_groups import BLOOD_GROUPS  # noqa: E402
+
+# Rough population frequencies so the queues are skewed like real data
+GROUP_WEIGHTS = [30, 6, 9, 2, 4, 1, 39, 9]
+URGENCY_WEIGHTS = [80, 15, 5]
+
+
+def backlog(n_requests):
+    rng = random.Random(42)
+    now = time.time()
+    queues = {group: [] for group in BLOOD_GROUPS}
+    live = {}
+    for rid in range(1, n_requests + 1):
+        group = rng.choices(BLOOD_GROUPS, GROUP_WEIGHTS)[0]
+        urgency = rng.choices(URGENCIES, URGENCY_WEIGHTS)[0]
+        entry = make_entry(rid, group, rng.randint(1, 6), urgency, now - rng.random() * 30 * 86400)
+        queues[group].append(entry)
+        live[rid] = entry
+    for heap in queues.values():
+        heapq.heapify(heap)
+    return queues, live
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    queues, live = backlog(args.requests)
+    print(f"pending requests: {args.requests:,}")
+    print(f"{'stock/group':>12}{'allocated':>11}{'median ms':>11}{'max ms':>9}")
+    for units in (50, 5_000, 100_000):
+        inventory = {group: units for group in BLOOD_GROUPS}
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            allocations, _ = plan(inventory, queues, live)
+            timings.append((time.perf_counter() - started) * 1000)
+        print(f"{units:>12,}{len(allocations):>11,}{statistics.median(timings):>11.1f}{max(timings):>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,544 @@
+"""Load test for the whole API: seeded data, mixed read/write traffic.
+
+Seeds a synthetic dataset (donors, hospitals, pending requests, stock; every
+row tagged with a bench-api- email prefix or belonging to such a user), then
+drives a weighted mix of the API from N concurrent clients: login, register,
+profile and donor record CRUD, single and bulk donations, request create /
+approve / bulk status, the list and detail endpoints, matching, exports,
+stats, units, expiry and allocation. Prints throughput plus p50/p95/p99
+latency per route and overall, so a regression shows up as a number before
+deploy. The live event stream (/api/events) is left out: it never completes,
+so it has no latency to report.
+
+Runs against the MySQL configured by the usual DB_* variables; use a scratch
+database. Seeding snapshots inventory and daily_rollups, and --cleanup deletes
+the bench rows and puts both tables back. Units past their expiry date are
+expired for real by the expiry route:
+
+    DB_NAME=bloodbank_bench python bench/api_bench.py --donors 20000 --requests 50000
+    DB_NAME=bloodbank_bench python bench/api_bench.py --skip-seed --concurrency 8 32 --seconds 20
+    python bench/api_bench.py --skip-seed --url http://127.0.0.1:5000 --mix read
+    DB_NAME=bloodbank_bench python bench/api_bench.py --cleanup
+
+Without --url the app is driven in-process through Flask's test client (no
+server, no sockets): handy for comparing commits. With --url the traffic goes
+over keep-alive HTTP to a running server (python serve.py, uvicorn asgi:app).
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+import uuid
+from datetime import date, timedelta
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from blood_groups import BLOOD_GROUPS, COMPATIBLE_DONORS  # noqa: E402
+
+EMAIL_PREFIX = "bench-api-"
+PASSWORD = "bench-password"
+LOCATIONS = [f"City{i:03d}" for i in range(50)]
+GROUP_WEIGHTS = [30, 6, 9, 2, 4, 1, 39, 9]
+URGENCY_WEIGHTS = {"routine": 80, "urgent": 15, "critical": 5}
+BATCH = 5000
+
+# route name -> (weight, read-only?)
+MIX = {
+    "login": (4, False),
+    "register": (2, False),
+    "donation": (8, False),
+    "request_create": (8, False),
+    "request_approve": (5, False),
+    "inventory": (15, True),
+    "request_list": (12, True),
+    "request_get": (5, True),
+    "hospitals": (4, True),
+    "donor_list": (8, True),
+    "donor_match": (5, True),
+    "user_profile": (5, True),
+    "stats": (10, True),
+    "units": (4, True),
+    "allocation_dry_run": (1, True),
+    "user_update": (2, False),
+    "donor_get": (3, True),
+    "donor_by_user": (3, True),
+    "donor_update": (2, False),
+    "donor_delete": (1, False),
+    "donor_create": (1, False),
+    "request_bulk_status": (2, False),
+    "donation_bulk": (2, False),
+    "export": (1, True),
+    "units_expire": (1, False),
+}
+SNAPSHOTS = {"inventory": "bench_api_inventory", "daily_rollups": "bench_api_rollups"}
+
+
+# ✅ Seeding
+def seed(n_donors, n_hospitals, n_requests, stock):
+    from db import db_connection
+    from passwords import hash_password
+
+    rng = random.Random(42)
+    today = date.today()
+    password_hash = hash_password(PASSWORD)  # one bcrypt hash shared by every bench user
+
+    with db_connection() as conn:
+        cur = conn.cursor()
+        # State before the first seed, put back by cleanup (a re-seed keeps the first snapshot)
+        for table, snapshot in SNAPSHOTS.items():
+            cur.execute(f"CREATE TABLE IF NOT EXISTS {snapshot} AS SELECT * FROM {table}")
+        cur.execute("SELECT COALESCE(MAX(id), 0) FROM users")
+        next_id = cur.fetchone()[0] + 1
+
+        users = [(next_id, "Bench Admin", f"{EMAIL_PREFIX}admin@example.invalid",
+                  password_hash, "admin", None, None)]
+        donors, hospitals = [], []
+        for i in range(n_hospitals):
+            user_id = next_id + 1 + i
+            users.append((user_id, f"Bench Hospital {i}", f"{EMAIL_PREFIX}hospital-{i}@example.invalid",
+                          password_hash, "hospital", None, rng.choice(LOCATIONS)))
+            hospitals.append(user_id)
+        for i in range(n_donors):
+            user_id = next_id + 1 + n_hospitals + i
+            group = rng.choices(BLOOD_GROUPS, GROUP_WEIGHTS)[0]
+            location = rng.choice(LOCATIONS)
+            last = None if rng.random() < 0.2 else today - timedelta(days=rng.randint(0, 730))
+            users.append((user_id, f"Bench Donor {i}", f"{EMAIL_PREFIX}donor-{i}@example.invalid",
+                          password_hash, "donor", group, location))
+            donors.append((user_id, group, location, last))
+
+        for start in range(0, len(users), BATCH):
+            conn.start_transaction()
+            cur.executemany(
+                "INSERT INTO users (id, name, email, password, role, blood_group, location) "
+                "VALUES (%s, %s, %s, %s, %s, %s, %s)", users[start:start + BATCH])
+            cur.executemany(
+                "INSERT INTO donors (user_id, blood_group, location, last_donation_date) "
+                "VALUES (%s, %s, %s, %s)", donors[start:start + BATCH])
+            conn.commit()
+        print(f"seeded {len(users):,} users ({n_donors:,} donors, {n_hospitals:,} hospitals)")
+
+        urgencies, weights = zip(*URGENCY_WEIGHTS.items())
+        for start in range(0, n_requests, BATCH):
+            rows = [
+                (rng.choice(hospitals), rng.choices(BLOOD_GROUPS, GROUP_WEIGHTS)[0], rng.randint(1, 4),
+                 rng.choices(urgencies, weights)[0])
+                for _ in range(start, min(start + BATCH, n_requests))
+            ]
+            cur.executemany(
+                "INSERT INTO requests (hospital_id, blood_group, quantity, urgency, status) "
+                "VALUES (%s, %s, %s, %s, 'pending')", rows)
+            print(f"\rseeded {min(start + BATCH, n_requests):,}/{n_requests:,} requests", end="", flush=True)
+        print()
+
+        cur.executemany(
+            "INSERT INTO inventory (blood_group, units) VALUES (%s, %s) "
+            "ON DUPLICATE KEY UPDATE units = units + VALUES(units)",
+            [(group, stock) for group in BLOOD_GROUPS])
+        cur.execute("ANALYZE TABLE users, donors, requests")
+        cur.fetchall()
+
+
+def cleanup():
+    from db import db_connection
+
+    with db_connection() as conn:
+        cur = conn.cursor()
+        bench_users = f"SELECT id FROM users WHERE email LIKE '{EMAIL_PREFIX}%'"
+        cur.execute(f"DELETE FROM requests WHERE hospital_id IN ({bench_users})")
+        cur.execute(f"DELETE FROM donations WHERE donor_id IN ({bench_users})")
+        cur.execute(f"DELETE d FROM donors d JOIN users u ON u.id = d.user_id "
+                    f"WHERE u.email LIKE '{EMAIL_PREFIX}%'")
+        cur.execute(f"DELETE FROM users WHERE email LIKE '{EMAIL_PREFIX}%'")
+
+        # Stock and rollups the mix moved: back to the seed-time snapshot
+        cur.execute("SHOW TABLES LIKE 'bench_api_%'")
+        if {row[0] for row in cur.fetchall()} >= set(SNAPSHOTS.values()):
+            conn.start_transaction()
+            cur.execute(f"""
+                UPDATE inventory i LEFT JOIN {SNAPSHOTS['inventory']} s ON s.blood_group = i.blood_group
+                SET i.units = COALESCE(s.units, 0)
+            """)
+            cur.execute("DELETE FROM daily_rollups")
+            cur.execute(f"INSERT INTO daily_rollups SELECT * FROM {SNAPSHOTS['daily_rollups']}")
+            conn.commit()
+            cur.execute(f"DROP TABLE {', '.join(SNAPSHOTS.values())}")
+        else:
+            print("No seed snapshot found: inventory and daily_rollups left as they are")
+
+
+# ✅ What the clients pick from: seeded ids, read once before the run
+class Dataset:
+    def __init__(self):
+        from db import db_connection
+
+        with db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(f"SELECT id, email, role, blood_group FROM users WHERE email LIKE '{EMAIL_PREFIX}%'")
+            users = cur.fetchall()
+            self.donors = [(uid, email, group) for uid, email, role, group in users if role == "donor"]
+            self.hospitals = [(uid, email) for uid, email, role, _ in users if role == "hospital"]
+            self.admin_email = next((email for _, email, role, _ in users if role == "admin"), None)
+            if not self.donors or not self.hospitals:
+                sys.exit("No bench users found: run without --skip-seed first")
+            cur.execute(
+                f"SELECT id FROM requests WHERE status = 'pending' AND hospital_id IN "
+                f"(SELECT id FROM users WHERE email LIKE '{EMAIL_PREFIX}%')")
+            self.requests = [row[0] for row in cur.fetchall()]
+            cur.execute(
+                f"SELECT d.id, d.user_id, d.blood_group FROM donors d JOIN users u ON u.id = d.user_id "
+                f"WHERE u.email LIKE '{EMAIL_PREFIX}%'")
+            self.donor_records = cur.fetchall()
+        self.pending = list(self.requests)
+        random.Random(1).shuffle(self.pending)
+        self.deletable = list(self.donor_records)
+        random.Random(2).shuffle(self.deletable)
+        self.detached = []   # (user id, group) of donors whose record the run deleted
+        self._lock = threading.Lock()
+
+    def next_pending(self):
+        # Each seeded request is approved at most once per run
+        with self._lock:
+            return self.pending.pop() if self.pending else None
+
+    # Donor records are deleted at most once and recreated for the same user
+    def next_deletable(self):
+        with self._lock:
+            return self.deletable.pop() if self.deletable else None
+
+    def detach(self, user_id, group):
+        with self._lock:
+            self.detached.append((user_id, group))
+
+    def next_detached(self):
+        with self._lock:
+            return self.detached.pop() if self.detached else None
+
+
+# ✅ Transports: (status, parsed JSON or None) for one call
+class InProcess:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def call(self, method, path, body=None, headers=None):
+        response = self.client.open(path, method=method, json=body, headers=headers or {})
+        response.get_data()  # streamed bodies (exports) are timed to the last byte
+        return response.status_code, response.get_json(silent=True)
+
+    def close(self):
+        pass
+
+
+class OverHttp:
+    def __init__(self, base):
+        self.parts = urlsplit(base)
+        self.conn = None
+
+    def call(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers["Content-Type"] = "application/json"
+        try:
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.parts.hostname, self.parts.port or 80, timeout=30)
+            self.conn.request(method, path, body=payload, headers=headers)
+            response = self.conn.getresponse()
+            raw = response.read()
+            if response.will_close:
+                self.close()
+        except (OSError, http.client.HTTPException):
+            self.close()
+            raise
+        try:
+            return response.status, json.loads(raw) if raw else None
+        except ValueError:
+            return response.status, None
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+# ✅ One call per route; each returns the HTTP status
+class Routes:
+    def __init__(self, transport, data, rng):
+        self.t = transport
+        self.data = data
+        self.rng = rng
+        self.admin_token = None
+
+    def login(self):
+        if self.rng.random() < 0.7:
+            _, email, _ = self.rng.choice(self.data.donors)
+        else:
+            _, email = self.rng.choice(self.data.hospitals)
+        return self.t.call("POST", "/api/login", {"email": email, "password": PASSWORD})[0]
+
+    def register(self):
+        email = f"{EMAIL_PREFIX}reg-{uuid.uuid4().hex}@example.invalid"
+        return self.t.call("POST", "/api/register", {
+            "name": "Bench Registrant", "email": email, "password": PASSWORD, "role": "donor",
+            "blood_group": self.rng.choices(BLOOD_GROUPS, GROUP_WEIGHTS)[0],
+            "location": self.rng.choice(LOCATIONS),
+        })[0]
+
+    def donation(self):
+        donor_id, _, group = self.rng.choice(self.data.donors)
+        return self.t.call("POST", "/api/donation", {
+            "donor_id": donor_id, "blood_group": group, "quantity": self.rng.randint(1, 2)
+        })[0]
+
+    def request_create(self):
+        hospital_id, _ = self.rng.choice(self.data.hospitals)
+        urgencies, weights = zip(*URGENCY_WEIGHTS.items())
+        return self.t.call("POST", "/api/request", {
+            "hospital_id": hospital_id,
+            "blood_group": self.rng.choices(BLOOD_GROUPS, GROUP_WEIGHTS)[0],
+            "quantity": self.rng.randint(1, 4),
+            "urgency": self.rng.choices(urgencies, weights)[0],
+        })[0]
+
+    def request_approve(self):
+        rid = self.data.next_pending()
+        if rid is None:
+            return self.request_create()
+        return self.t.call("PUT", f"/api/request/{rid}", {"status": "approved"})[0]
+
+    def inventory(self):
+        return self.t.call("GET", "/api/inventory")[0]
+
+    def request_list(self):
+        status = self.rng.choice(["pending", "approved", ""])
+        hospital_id, _ = self.rng.choice(self.data.hospitals)
+        path = "/api/request?limit=50&count=0" + (f"&status={status}" if status else "")
+        if self.rng.random() < 0.5:
+            path += f"&hospital_id={hospital_id}"
+        return self.t.call("GET", path)[0]
+
+    def request_get(self):
+        rid = self.rng.choice(self.data.requests) if self.data.requests else 1
+        return self.t.call("GET", f"/api/request/{rid}")[0]
+
+    def hospitals(self):
+        return self.t.call("GET", "/api/hospitals")[0]
+
+    def donor_list(self):
+        path = f"/api/donors?limit=50&count=0&location={self.rng.choice(LOCATIONS)}"
+        return self.t.call("GET", path)[0]
+
+    def donor_match(self):
+        group = self.rng.choice(list(COMPATIBLE_DONORS)).replace("+", "%2B")
+        urgency = self.rng.choices(["routine", "urgent", "critical"], [70, 20, 10])[0]
+        path = f"/api/donors/match?blood_group={group}&location={self.rng.choice(LOCATIONS)}&urgency={urgency}"
+        return self.t.call("GET", path)[0]
+
+    def user_profile(self):
+        donor_id, _, _ = self.rng.choice(self.data.donors)
+        return self.t.call("GET", f"/api/user/{donor_id}")[0]
+
+    def stats(self):
+        return self.t.call("GET", "/api/stats")[0]
+
+    def units(self):
+        group = self.rng.choice(BLOOD_GROUPS).replace("+", "%2B")
+        return self.t.call("GET", f"/api/units?status=available&blood_group={group}&limit=50&count=0")[0]
+
+    def as_admin(self, method, path, body=None):
+        if self.admin_token is None and self.data.admin_email:
+            status, reply = self.t.call("POST", "/api/login", {"email": self.data.admin_email, "password": PASSWORD})
+            if status != 200:
+                return status
+            self.admin_token = reply["token"]
+        return self.t.call(method, path, body, {"Authorization": f"Bearer {self.admin_token}"})[0]
+
+    def allocation_dry_run(self):
+        return self.as_admin("POST", "/api/allocation/run", {"dry_run": True})
+
+    def user_update(self):
+        donor_id, _, _ = self.rng.choice(self.data.donors)
+        return self.t.call("PUT", f"/api/user/{donor_id}", {"location": self.rng.choice(LOCATIONS)})[0]
+
+    def donor_get(self):
+        donor_record, _, _ = self.rng.choice(self.data.donor_records)
+        return self.t.call("GET", f"/api/donors/{donor_record}")[0]
+
+    def donor_by_user(self):
+        donor_id, _, _ = self.rng.choice(self.data.donors)
+        return self.t.call("GET", f"/api/donors/user/{donor_id}")[0]
+
+    def donor_update(self):
+        donor_record, _, _ = self.rng.choice(self.data.donor_records)
+        last = date.today() - timedelta(days=self.rng.randint(0, 730))
+        return self.t.call("PUT", f"/api/donors/{donor_record}", {"last_donation_date": last.isoformat()})[0]
+
+    def donor_delete(self):
+        record = self.data.next_deletable()
+        if record is None:
+            return self.donor_get()
+        donor_record, user_id, group = record
+        status = self.t.call("DELETE", f"/api/donors/{donor_record}")[0]
+        if status == 200:
+            self.data.detach(user_id, group)
+        return status
+
+    def donor_create(self):
+        detached = self.data.next_detached()
+        if detached is None:
+            return self.donor_by_user()
+        user_id, group = detached
+        return self.t.call("POST", "/api/donors", {
+            "user_id": user_id, "blood_group": group, "location": self.rng.choice(LOCATIONS)
+        })[0]
+
+    def request_bulk_status(self):
+        rids = [rid for rid in (self.data.next_pending() for _ in range(5)) if rid is not None]
+        if not rids:
+            return self.request_create()
+        return self.t.call("POST", "/api/request/bulk-status", {"ids": rids, "status": "approved"})[0]
+
+    def donation_bulk(self):
+        return self.t.call("POST", "/api/donation/bulk", {"donations": [
+            {"donor_id": donor_id, "blood_group": group, "quantity": self.rng.randint(1, 2)}
+            for donor_id, _, group in self.rng.sample(self.data.donors, min(20, len(self.data.donors)))
+        ]})[0]
+
+    def export(self):
+        hospital_id, _ = self.rng.choice(self.data.hospitals)
+        return self.t.call("GET", f"/api/export/requests?hospital_id={hospital_id}")[0]
+
+    def units_expire(self):
+        return self.as_admin("POST", "/api/units/expire")
+
+
+# 4xx answers that are a normal outcome of the workload, not failures
+EXPECTED = {
+    "request_approve": {400, 409},   # insufficient stock / raced with auto-allocation
+    "donor_get": {404},              # the record was deleted by donor_delete
+    "donor_update": {404},
+    "donor_by_user": {404},
+    "login": {503},                  # password pool shedding load
+    "register": {503},
+}
+
+
+def client(make_transport, data, names, weights, deadline, seed, results):
+    transport = make_transport()
+    routes = Routes(transport, data, random.Random(seed))
+    rng = random.Random(seed + 1)
+    timings = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, weights)[0]
+        started = time.perf_counter()
+        try:
+            status = getattr(routes, name)()
+        except Exception:
+            status = None
+        elapsed = (time.perf_counter() - started) * 1000
+        if status is not None and (status < 400 or status in EXPECTED.get(name, ())):
+            timings[name].append(elapsed)
+        else:
+            errors[name] += 1
+    transport.close()
+    results.append((timings, errors))
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def report(concurrency, timings, errors, elapsed):
+    def line(name, values, failed):
+        if not values:
+            return f"{name:<20}{0:>8}{'-':>10}{'-':>9}{'-':>9}{'-':>9}{failed:>8}"
+        return (f"{name:<20}{len(values):>8}{len(values) / elapsed:>10.1f}{statistics.median(values):>9.1f}"
+                f"{percentile(values, 95):>9.1f}{percentile(values, 99):>9.1f}{failed:>8}")
+
+    print(f"\n{concurrency} clients, {elapsed:.1f}s")
+    print(f"{'route':<20}{'calls':>8}{'req/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}")
+    for name in timings:
+        print(line(name, timings[name], errors[name]))
+    everything = [v for values in timings.values() for v in values]
+    print(line("TOTAL", everything, sum(errors.values())))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--donors", type=int, default=10_000)
+    parser.add_argument("--hospitals", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=20_000, help="seeded pending requests")
+    parser.add_argument("--stock", type=int, default=5_000, help="units added per blood group when seeding")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--mix", choices=["mixed", "read", "write"], default="mixed")
+    parser.add_argument("--routes", nargs="+", choices=list(MIX), help="only these routes")
+    parser.add_argument("--url", help="base URL of a running server (default: in-process)")
+    parser.add_argument("--skip-seed", action="store_true", help="reuse previously seeded data")
+    parser.add_argument("--cleanup", action="store_true", help="delete the bench rows, restore stock and rollups, and exit")
+    args = parser.parse_args()
+
+    # One pooled connection per client thread (must be set before the app is imported)
+    os.environ.setdefault("DB_POOL_SIZE", str(max(args.concurrency) + 4))
+
+    if args.cleanup:
+        cleanup()
+        return
+    if not args.skip_seed:
+        seed(args.donors, args.hospitals, args.requests, args.stock)
+
+    names = [
+        name for name, (_, read_only) in MIX.items()
+        if (args.routes is None or name in args.routes)
+        and (args.mix == "mixed" or read_only == (args.mix == "read"))
+    ]
+    weights = [MIX[name][0] for name in names]
+
+    if args.url:
+        def make_transport():
+            return OverHttp(args.url.rstrip("/"))
+    else:
+        from app import app
+
+        def make_transport():
+            return InProcess(app)
+
+    data = Dataset()
+    print(f"{len(data.donors):,} donors, {len(data.hospitals):,} hospitals, "
+          f"{len(data.pending):,} pending requests; mix={args.mix}")
+
+    for concurrency in args.concurrency:
+        results = []
+        deadline = time.perf_counter() + args.seconds
+        threads = [
+            threading.Thread(target=client, args=(make_transport, data, names, weights, deadline, i, results),
+                             daemon=True)
+            for i in range(concurrency)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        timings = {name: [] for name in names}
+        errors = {name: 0 for name in names}
+        for client_timings, client_errors in results:
+            for name in names:
+                timings[name].extend(client_timings[name])
+                errors[name] += client_errors[name]
+        report(concurrency, timings, errors, elapsed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Concurrency stress check for request approval.
+
+Seeds scratch blood groups (T1, T2, ...) with a fixed number of units, creates more
+pending requests than there are units, fires every approval at once from a thread
+pool and checks that no group was oversold and that the final counts add up.
+
+Runs against the MySQL database configured by the usual DB_* environment variables:
+
+    python bench/approval_stress.py --groups 8 --units 500 --requests 4000 --threads 64
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+def seed(db_connection, groups, units, n_requests):
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM requests WHERE blood_group LIKE 'T%'")
+        cur.execute("DELETE FROM inventory WHERE blood_group LIKE 'T%'")
+        cur.execute("DELETE FROM daily_rollups WHERE blood_group LIKE 'T%'")  # 'issued' by the approvals
+        cur.executemany(
+            "INSERT INTO inventory (blood_group, units) VALUES (%s, %s)",
+            [(g, units) for g in groups],
+        )
+        cur.executemany(
+            "INSERT INTO requests (hospital_id, blood_group, quantity, status) VALUES (NULL, %s, 1, 'pending')",
+            [(groups[i % len(groups)],) for i in range(n_requests)],
+        )
+        cur.execute("SELECT id FROM requests WHERE blood_group LIKE 'T%'")
+        return [row[0] for row in cur.fetchall()]
+
+
+def cleanup(db_connection):
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM requests WHERE blood_group LIKE 'T%'")
+        cur.execute("DELETE FROM inventory WHERE blood_group LIKE 'T%'")
+        cur.execute("DELETE FROM daily_rollups WHERE blood_group LIKE 'T%'")  # 'issued' by the approvals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--groups", type=int, default=8)
+    parser.add_argument("--units", type=int, default=500, help="starting units per group")
+    parser.add_argument("--requests", type=int, default=4000, help="pending requests (1 unit each)")
+    parser.add_argument("--threads", type=int, default=64)
+    parser.add_argument("--repeat", type=int, default=2, help="times each request is approved")
+    parser.add_argument("--keep", action="store_true", help="leave the scratch rows in place")
+    args = parser.parse_args()
+
+    # One pooled connection per client thread (must be set before the app is imported)
+    os.environ["DB_POOL_SIZE"] = str(args.threads + 2)
+    from app import app
+    from db import db_connection
+
+    groups = [f"T{i + 1}" for i in range(args.groups)]
+    ids = seed(db_connection, groups, args.units, args.requests)
+    client = app.test_client()
+
+    def approve(rid):
+        return client.put(f"/api/request/{rid}", json={"status": "approved"}).status_code
+
+    # Fire duplicate approvals too: each request must still be approved only once
+    attempts = ids * args.repeat
+    random.shuffle(attempts)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        codes = list(executor.map(approve, attempts))
+    elapsed = time.perf_counter() - started
+
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT blood_group, units FROM inventory WHERE blood_group LIKE 'T%'")
+        units_left = dict(cur.fetchall())
+        cur.execute("""
+            SELECT blood_group, COUNT(*) FROM requests
+            WHERE blood_group LIKE 'T%' AND status = 'approved'
+            GROUP BY blood_group
+        """)
+        approved = dict(cur.fetchall())
+
+    failures = []
+    per_group = args.requests // args.groups
+    for g in groups:
+        expected = min(args.units, per_group + (1 if groups.index(g) < args.requests % args.groups else 0))
+        got = approved.get(g, 0)
+        if units_left[g] < 0:
+            failures.append(f"{g}: inventory went negative ({units_left[g]})")
+        if got != expected or got + units_left[g] != args.units:
+            failures.append(f"{g}: approved={got} left={units_left[g]} expected approved={expected}")
+    if codes.count(200) != sum(approved.values()):
+        failures.append(f"HTTP 200s ({codes.count(200)}) != approved rows ({sum(approved.values())})")
+    if any(code not in (200, 400, 409) for code in codes):
+        failures.append(f"unexpected status codes: {sorted(set(codes))}")
+
+    print(f"{len(attempts)} approvals across {args.groups} groups with {args.threads} threads "
+          f"in {elapsed:.2f}s ({len(attempts) / elapsed:.0f}/s)")
+    print(f"approved={codes.count(200)} insufficient={codes.count(400)} "
+          f"already_approved={codes.count(409)}")
+
+    if not args.keep:
+        cleanup(db_connection)
+    if failures:
+        print("FAILED:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+    print("OK: no oversell, counts consistent")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Load-test comparison of the threaded Flask server and the ASGI server.
+
+Start the servers you want to compare against the same database, then point
+the script at them. Each run drives the dashboard read mix (inventory, request
+and donor pages, hospitals, stats) from N concurrent keep-alive clients and
+reports throughput, latency percentiles and errors per server and concurrency.
+
+    WEB_SERVER=wsgi python serve.py                    # gunicorn + threaded Flask on :5000
+    gunicorn asgi:app -k uvicorn.workers.UvicornWorker --preload -w 4 -b 127.0.0.1:8000
+    python bench/compare_servers.py --target flask=http://127.0.0.1:5000 \\
+        --target asgi=http://127.0.0.1:8000 --concurrency 50 200 500 --seconds 20
+
+ETags are ignored by default so every request reaches MySQL; pass --revalidate
+to replay If-None-Match like a polling browser does.
+"""
+import argparse
+import http.client
+import random
+import statistics
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+MIX = [
+    ("/api/inventory", 30),
+    ("/api/request?limit=50&count=0", 25),
+    ("/api/stats", 20),
+    ("/api/hospitals", 15),
+    ("/api/donors?limit=50&count=0", 10),
+]
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def client(base, deadline, revalidate, seed, timings, errors):
+    parts = urlsplit(base)
+    rng = random.Random(seed)
+    paths, weights = zip(*MIX)
+    etags = {}
+    conn = None
+    while time.perf_counter() < deadline:
+        path = rng.choices(paths, weights)[0]
+        headers = {"If-None-Match": etags[path]} if revalidate and path in etags else {}
+        started = time.perf_counter()
+        try:
+            if conn is None:
+                conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+            conn.request("GET", path, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            if response.status not in (200, 304):
+                errors.append(response.status)
+            elif response.getheader("ETag"):
+                etags[path] = response.getheader("ETag")
+            if response.will_close:
+                conn.close()
+                conn = None
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(type(e).__name__)
+            if conn is not None:
+                conn.close()
+            conn = None
+            continue
+        timings.append((time.perf_counter() - started) * 1000)
+    if conn is not None:
+        conn.close()
+
+
+def run(base, concurrency, seconds, revalidate):
+    timings, errors = [], []
+    deadline = time.perf_counter() + seconds
+    threads = [
+        threading.Thread(target=client, args=(base, deadline, revalidate, i, timings, errors), daemon=True)
+        for i in range(concurrency)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return timings, errors, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--target", action="append", required=True,
+                        help="name=base_url, repeat for each server")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--revalidate", action="store_true", help="send If-None-Match like a browser")
+    args = parser.parse_args()
+
+    targets = [t.split("=", 1) for t in args.target]
+    if any(len(t) != 2 for t in targets):
+        sys.exit("--target must look like name=http://host:port")
+
+    print(f"{'server':<10}{'clients':>8}{'req/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}")
+    for concurrency in args.concurrency:
+        for name, base in targets:
+            timings, errors, elapsed = run(base.rstrip("/"), concurrency, args.seconds, args.revalidate)
+            if not timings:
+                print(f"{name:<10}{concurrency:>8}{'-':>10}{'-':>9}{'-':>9}{'-':>9}{len(errors):>8}")
+                continue
+            print(f"{name:<10}{concurrency:>8}{len(timings) / elapsed:>10.1f}{statistics.median(timings):>9.1f}"
+                  f"{percentile(timings, 95):>9.1f}{percentile(timings, 99):>9.1f}{len(errors):>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Login throughput benchmark for bcrypt password checks.
+
+Measures how many password verifications per second the verification pool
+sustains at a given cost factor, for 1..N concurrent callers, and reports the
+per-core figure. No database is needed: it exercises passwords.verify_password
+exactly as /api/login does.
+
+    python bench/login_bench.py --rounds 10 12 --seconds 3
+    PASSWORD_WORKERS=4 python bench/login_bench.py --callers 1 4 16 64
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import passwords  # noqa: E402
+
+
+def measure(stored, callers, seconds):
+    deadline = time.perf_counter() + seconds
+
+    def worker():
+        done = 0
+        while time.perf_counter() < deadline:
+            ok, _ = passwords.verify_password("correct horse battery staple", stored)
+            assert ok
+            done += 1
+        return done
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=callers) as executor:
+        total = sum(executor.map(lambda _: worker(), range(callers)))
+    return total / (time.perf_counter() - started)
+
+
+def main():
+    cores = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, nargs="+", default=[passwords.BCRYPT_ROUNDS])
+    parser.add_argument("--callers", type=int, nargs="+", default=sorted({1, cores, cores * 4}),
+                        help="concurrent request threads calling verify")
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args()
+
+    print(f"cores={cores} PASSWORD_WORKERS={passwords.PASSWORD_WORKERS}")
+    print(f"{'cost':>4}{'callers':>9}{'logins/s':>12}{'per core':>11}{'avg ms':>11}")
+    for rounds in args.rounds:
+        stored = passwords.hash_password("correct horse battery staple", rounds=rounds)
+        passwords.BCRYPT_ROUNDS = rounds  # keep verify from flagging a rehash
+        for callers in args.callers:
+            rate = measure(stored, callers, args.seconds)
+            used_cores = min(cores, passwords.PASSWORD_WORKERS, callers)
+            print(f"{rounds:>4}{callers:>9}{rate:>12.1f}{rate / used_cores:>11.1f}{callers / rate * 1000:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
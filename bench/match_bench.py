@@ -0,0 +1,133 @@
+"""Benchmark for GET /api/donors/match at large donor counts.
+
+Seeds synthetic donors (users + donors rows tagged with a bench- email prefix),
+then times matching queries for random recipient groups, locations and urgencies
+and prints latency percentiles plus the EXPLAIN plan of one query so you can see
+which index MySQL picked.
+
+Use a scratch database; seeding a million donors takes a few minutes:
+
+    DB_NAME=bloodbank_bench python bench/match_bench.py --donors 1000000 --queries 2000
+    DB_NAME=bloodbank_bench python bench/match_bench.py --skip-seed --queries 2000
+    DB_NAME=bloodbank_bench python bench/match_bench.py --cleanup
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from blood_groups import BLOOD_GROUPS, COMPATIBLE_DONORS  # noqa: E402
+from db import db_connection  # noqa: E402
+from matching import URGENCY_LIMITS, match_donors  # noqa: E402
+
+EMAIL_PREFIX = "bench-match-"
+LOCATIONS = [f"City{i:03d}" for i in range(200)]
+# Rough population frequencies so the groups are skewed like real data
+GROUP_WEIGHTS = [30, 6, 9, 2, 4, 1, 39, 9]
+BATCH = 5000
+
+
+def seed(n_donors):
+    rng = random.Random(42)
+    today = date.today()
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT COALESCE(MAX(id), 0) FROM users")
+        next_id = cur.fetchone()[0] + 1
+
+        for start in range(0, n_donors, BATCH):
+            users, donors = [], []
+            for i in range(start, min(start + BATCH, n_donors)):
+                user_id = next_id + i
+                group = rng.choices(BLOOD_GROUPS, GROUP_WEIGHTS)[0]
+                location = rng.choice(LOCATIONS)
+                # ~15% never donated, the rest within the last two years
+                last = None if rng.random() < 0.15 else today - timedelta(days=rng.randint(0, 730))
+                users.append((user_id, f"Donor {i}", f"{EMAIL_PREFIX}{i}@example.invalid",
+                              "x", "donor", group, location))
+                donors.append((user_id, group, location, last))
+            conn.start_transaction()
+            cur.executemany(
+                "INSERT INTO users (id, name, email, password, role, blood_group, location) "
+                "VALUES (%s, %s, %s, %s, %s, %s, %s)", users)
+            cur.executemany(
+                "INSERT INTO donors (user_id, blood_group, location, last_donation_date) "
+                "VALUES (%s, %s, %s, %s)", donors)
+            conn.commit()
+            print(f"\rseeded {min(start + BATCH, n_donors):,}/{n_donors:,}", end="", flush=True)
+        print()
+        cur.execute("ANALYZE TABLE donors, users")
+        cur.fetchall()
+
+
+def cleanup():
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(f"DELETE d FROM donors d JOIN users u ON u.id = d.user_id "
+                    f"WHERE u.email LIKE '{EMAIL_PREFIX}%'")
+        cur.execute(f"DELETE FROM users WHERE email LIKE '{EMAIL_PREFIX}%'")
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def run(n_queries):
+    rng = random.Random(7)
+    timings = {urgency: [] for urgency in URGENCY_LIMITS}
+    with db_connection() as conn:
+        cur = conn.cursor(dictionary=True)
+        cur.execute("SELECT COUNT(*) AS n FROM donors")
+        print(f"donors in table: {cur.fetchone()['n']:,}")
+
+        for _ in range(n_queries):
+            urgency = rng.choice(list(URGENCY_LIMITS))
+            group = rng.choice(list(COMPATIBLE_DONORS))
+            location = rng.choice(LOCATIONS)
+            started = time.perf_counter()
+            match_donors(cur, group, location, urgency)
+            timings[urgency].append((time.perf_counter() - started) * 1000)
+
+        # Show the plan for one representative query
+        cur.execute("""
+            EXPLAIN SELECT d.id FROM donors d JOIN users u ON u.id = d.user_id
+            WHERE d.blood_group = 'A+' AND d.location = %s
+              AND (d.last_donation_date IS NULL OR d.last_donation_date <= %s)
+            ORDER BY d.last_donation_date LIMIT 25
+        """, (LOCATIONS[0], date.today() - timedelta(days=56)))
+        plan = cur.fetchall()
+
+    print(f"{'urgency':<10}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for urgency, values in timings.items():
+        if values:
+            print(f"{urgency:<10}{len(values):>6}{statistics.median(values):>10.2f}"
+                  f"{percentile(values, 95):>10.2f}{percentile(values, 99):>10.2f}{max(values):>10.2f}")
+    print("\nEXPLAIN (A+ recipient, one location):")
+    for row in plan:
+        print(f"  table={row['table']} type={row['type']} key={row['key']} rows={row['rows']} extra={row['Extra']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--donors", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--skip-seed", action="store_true", help="reuse previously seeded donors")
+    parser.add_argument("--cleanup", action="store_true", help="delete the seeded donors and exit")
+    args = parser.parse_args()
+
+    if args.cleanup:
+        cleanup()
+        return
+    if not args.skip_seed:
+        seed(args.donors)
+    run(args.queries)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""Microbenchmark for the list response path of /api/request and /api/donors.
+
+Compares, on N synthetic rows shaped like each endpoint's result:
+  legacy  dict rows (cursor(dictionary=True)), one more dict per row, Flask's default jsonify
+  lean    tuple rows, listing.render_list -> fastjson (orjson when installed)
+and reports serialization time and the peak memory of rows + body. No database
+is needed; with --db the fetch itself (dict cursor vs prepared conn.query) is
+timed too, against whatever the configured database holds.
+
+    python bench/serialize_bench.py --rows 100000
+    python bench/serialize_bench.py --rows 100000 --paged      # ?limit=...&count=0 first pages
+    DB_NAME=bloodbank_bench python bench/serialize_bench.py --db
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from flask import Flask  # noqa: E402
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+
+import fastjson  # noqa: E402
+from listing import DONOR_LIST, REQUEST_LIST, plan_list, render_list, select_columns  # noqa: E402
+
+GROUPS = ["A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-"]
+
+
+def request_row(i, rng):
+    return {
+        "id": i,
+        "hospital_id": rng.randint(1, 500),
+        "blood_group": rng.choice(GROUPS),
+        "quantity": rng.randint(1, 6),
+        "status": rng.choice(["pending", "approved", "rejected"]),
+        "urgency": rng.choice(["routine", "urgent", "critical"]),
+        "fulfilled_group": rng.choice([None, "O-"]),
+        "created_at": datetime(2024, 1, 1) + timedelta(seconds=rng.randint(0, 3e7)),
+        "hospital_name": f"Hospital {rng.randint(1, 500)}",
+    }
+
+
+def donor_row(i, rng):
+    return {
+        "user_id": i,
+        "name": f"Donor {i}",
+        "email": f"donor{i}@example.com",
+        "blood_group": rng.choice(GROUPS),
+        "location": rng.choice(["Palghat", "Kochi", "Thrissur", "Calicut"]),
+        "donor_id": i,
+        "last_donation_date": rng.choice([None, date(2024, 1, 1) + timedelta(days=rng.randint(0, 700))]),
+    }
+
+
+SPECS = {"requests": (REQUEST_LIST, request_row), "donors": (DONOR_LIST, donor_row)}
+
+
+def make_rows(spec, make, n, args, as_tuples):
+    rng = random.Random(7)
+    columns = select_columns(spec, plan_list(spec, args).fields)
+    rows = (make(i, rng) for i in range(n, 0, -1))
+    if as_tuples:
+        return [tuple(row[c] for c in columns) for row in rows]
+    return [{c: row[c] for c in columns} for row in rows]
+
+
+# The response path before the lean layer (dict rows, one more dict per row, jsonify)
+def legacy_body(app, spec, plan, rows):
+    items = [{f: row[f] for f in plan.fields} for row in rows[:plan.limit]]
+    obj = items if plan.limit is None else {"items": items, "next_cursor": None}
+    with app.app_context():
+        return app.json.response(obj).get_data()
+
+
+def lean_body(spec, plan, rows):
+    return render_list(spec, plan, rows)
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        body = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, len(body)
+
+
+def peak_memory(build):
+    gc.collect()
+    tracemalloc.start()
+    build()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def fetch_times(spec, args, repeat):
+    from db import db_connection
+
+    plan = plan_list(spec, args)
+    with db_connection() as conn:
+        def dict_fetch():
+            cur = conn.cursor(dictionary=True)
+            cur.execute(*plan.select)
+            return cur.fetchall()
+
+        results = {}
+        for name, fetch in (("dict cursor", dict_fetch), ("conn.query", lambda: conn.query(*plan.select))):
+            best, rows = float("inf"), 0
+            for _ in range(repeat):
+                started = time.perf_counter()
+                rows = len(fetch())
+                best = min(best, time.perf_counter() - started)
+            results[name] = (best, rows)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--paged", action="store_true", help="first-page bodies (limit capped at MAX_LIMIT) instead of bare lists")
+    parser.add_argument("--db", action="store_true", help="also time fetching the full lists from MySQL")
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.json = DefaultJSONProvider(app)
+    query = {"limit": str(args.rows), "count": "0"} if args.paged else {}
+    print(f"rows={args.rows} encoder={'orjson' if fastjson.orjson else 'json (pip install orjson)'}")
+    print(f"{'list':<10}{'path':<8}{'ms':>10}{'MB body':>10}{'MB peak':>10}{'speedup':>9}{'memory':>8}")
+    for name, (spec, make) in SPECS.items():
+        plan = plan_list(spec, query)
+        dict_rows = make_rows(spec, make, args.rows, query, as_tuples=False)
+        tuple_rows = make_rows(spec, make, args.rows, query, as_tuples=True)
+        legacy_s, legacy_size = timed(lambda: legacy_body(app, spec, plan, dict_rows), args.repeat)
+        lean_s, lean_size = timed(lambda: lean_body(spec, plan, tuple_rows), args.repeat)
+        del dict_rows, tuple_rows
+
+        # Rows as the cursor hands them over, plus everything serializing them takes
+        legacy_peak = peak_memory(lambda: legacy_body(
+            app, spec, plan, make_rows(spec, make, args.rows, query, as_tuples=False)))
+        lean_peak = peak_memory(lambda: lean_body(
+            spec, plan, make_rows(spec, make, args.rows, query, as_tuples=True)))
+
+        print(f"{name:<10}{'legacy':<8}{legacy_s * 1000:>10.1f}{legacy_size / 1e6:>10.1f}{legacy_peak / 1e6:>10.1f}")
+        print(f"{'':<10}{'lean':<8}{lean_s * 1000:>10.1f}{lean_size / 1e6:>10.1f}{lean_peak / 1e6:>10.1f}"
+              f"{legacy_s / lean_s:>8.1f}x{lean_peak / legacy_peak:>8.0%}")
+
+    if args.db:
+        print(f"\n{'fetch':<10}{'cursor':<14}{'ms':>10}{'rows':>10}")
+        for name, (spec, _) in SPECS.items():
+            for cursor, (seconds, rows) in fetch_times(spec, query, args.repeat).items():
+                print(f"{name:<10}{cursor:<14}{seconds * 1000:>10.1f}{rows:>10}")
+
+
+if __name__ == "__main__":
+    main()
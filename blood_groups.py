@@ -0,0 +1,15 @@
+# ✅ The eight ABO/Rh blood groups the API accepts
+BLOOD_GROUPS = ("A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-")
+
+# ✅ Red-cell compatibility: recipient group -> donor groups it can receive,
+# best match first (identical group, then same Rh, then universal O-)
+COMPATIBLE_DONORS = {
+    "O-": ("O-",),
+    "O+": ("O+", "O-"),
+    "A-": ("A-", "O-"),
+    "A+": ("A+", "A-", "O+", "O-"),
+    "B-": ("B-", "O-"),
+    "B+": ("B+", "B-", "O+", "O-"),
+    "AB-": ("AB-", "A-", "B-", "O-"),
+    "AB+": ("AB+", "AB-", "A+", "A-", "B+", "B-", "O+", "O-"),
+}
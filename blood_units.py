@@ -0,0 +1,92 @@
+import os
+import threading
+from datetime import date
+
+from blood_groups import BLOOD_GROUPS
+from rollups import record_expiring
+
+# ✅ Shelf life in days per component (overridable, e.g. SHELF_LIFE_RED_CELLS=42)
+COMPONENTS = {
+    name: int(os.getenv(f"SHELF_LIFE_{name.upper()}", days))
+    for name, days in (("whole_blood", 35), ("red_cells", 42), ("plasma", 365), ("platelets", 5))
+}
+DEFAULT_COMPONENT = "whole_blood"
+
+
+def _numbers(n):
+    # Derived table 1..n, used to fan a donation of n units out into n unit rows
+    return " UNION ALL ".join(f"SELECT {i} AS n" for i in range(1, n + 1))
+
+
+# ✅ One blood_units row per donated unit, for the donations matching `where_sql`
+# (a condition on the donations alias d). Set-based: a single INSERT ... SELECT.
+def add_donation_units(cur, where_sql, params, max_quantity, component=DEFAULT_COMPONENT):
+    cur.execute(f"""
+        INSERT INTO blood_units (donation_id, blood_group, component, collected_on, expires_on)
+        SELECT d.id, d.blood_group, %s, d.donation_date, d.donation_date + INTERVAL %s DAY
+        FROM donations d
+        JOIN ({_numbers(max_quantity)}) k ON k.n <= d.quantity
+        WHERE {where_sql}
+    """, (component, COMPONENTS[component], *params))
+    return cur.rowcount
+
+
+ISSUE_UNITS = """
+    UPDATE blood_units
+    SET status = 'issued', request_id = %s
+    WHERE blood_group = %s AND status = 'available' AND expires_on >= %s
+    ORDER BY expires_on, id
+    LIMIT %s
+"""
+
+
+# ✅ Hand the earliest-expiring available units of a group to a request (FIFO by
+# expiry). Walks idx_units_fifo (blood_group, status, expires_on, id) and stops
+# after `quantity` rows. Returns how many tracked units were issued; stock that
+# predates unit tracking has no rows, so this can be less than `quantity`.
+def issue_units(cur, request_id, blood_group, quantity, today=None):
+    cur.execute(ISSUE_UNITS, (request_id, blood_group, today or date.today(), quantity))
+    return cur.rowcount
+
+
+# ✅ Mark expired units and take them out of the inventory aggregate, in one
+# transaction per call. Returns {blood_group: units expired}.
+def expire_units(conn, today=None):
+    today = today or date.today()
+    cur = conn.cursor()
+    expired = {}
+    conn.start_transaction()
+    record_expiring(cur, today)
+    for blood_group in BLOOD_GROUPS:
+        cur.execute("""
+            UPDATE blood_units SET status = 'expired'
+            WHERE blood_group = %s AND status = 'available' AND expires_on < %s
+        """, (blood_group, today))
+        if cur.rowcount > 0:
+            expired[blood_group] = cur.rowcount
+            cur.execute(
+                "UPDATE inventory SET units = GREATEST(units - %s, 0) WHERE blood_group = %s",
+                (cur.rowcount, blood_group)
+            )
+    conn.commit()
+    return expired
+
+
+_last_sweep = None
+_sweep_lock = threading.Lock()
+
+
+# Units expire at a date boundary, so one sweep per process per day is enough
+# to keep expired stock out of approvals; it runs before the first approval
+# of the day. Returns what it expired (empty when it was not due).
+def sweep_if_due(conn):
+    global _last_sweep
+    today = date.today()
+    if _last_sweep == today:
+        return {}
+    with _sweep_lock:
+        if _last_sweep == today:
+            return {}
+        expired = expire_units(conn, today)
+        _last_sweep = today
+        return expired
@@ -0,0 +1,473 @@
+import contextvars
+import itertools
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import mysql.connector
+
+from metrics import METRICS_ENABLED, TimedCursor, observe_db
+
+# ✅ Database config
+DB_CONFIG = {
+    "host": os.getenv("DB_HOST", "localhost"),
+    "port": int(os.getenv("DB_PORT", 3306)),
+    "user": os.getenv("DB_USER", "root"),
+    "password": os.getenv("DB_PASS", "Sathyam#17"),  # 🔒 change to your MySQL password
+    "database": os.getenv("DB_NAME", "bloodbank"),
+    "autocommit": True
+}
+
+# ✅ Pool settings (all overridable from the environment)
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 5))        # seconds to wait for a free connection
+POOL_RECYCLE = float(os.getenv("DB_POOL_RECYCLE", 1800))     # max connection age in seconds
+POOL_PING_AFTER = float(os.getenv("DB_POOL_PING_AFTER", 30))  # ping idle connections older than this
+PREPARED = os.getenv("DB_PREPARED", "1") == "1"               # server-side prepared statements for conn.query()
+STATEMENT_CACHE = int(os.getenv("DB_STATEMENT_CACHE", 32))    # prepared statements kept per connection
+
+# ✅ Read replicas (optional): DB_REPLICAS="host[:port],host[:port]", same user,
+# password and database as the primary unless DB_REPLICA_USER / DB_REPLICA_PASS are set
+DB_REPLICAS = [spec.strip() for spec in os.getenv("DB_REPLICAS", "").split(",") if spec.strip()]
+REPLICA_POOL_SIZE = int(os.getenv("DB_REPLICA_POOL_SIZE", POOL_SIZE))        # per replica
+REPLICA_MAX_LAG = float(os.getenv("DB_REPLICA_MAX_LAG", 5))                  # seconds; further behind gets no reads
+REPLICA_CHECK_INTERVAL = float(os.getenv("DB_REPLICA_CHECK_INTERVAL", 2))    # seconds between health checks
+REPLICA_CONNECT_TIMEOUT = int(os.getenv("DB_REPLICA_CONNECT_TIMEOUT", 2))
+# Clients read from the primary for this long after they write
+READ_YOUR_WRITES = float(os.getenv("DB_READ_YOUR_WRITES", REPLICA_MAX_LAG + REPLICA_CHECK_INTERVAL))
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes free within the acquire timeout."""
+
+
+class PooledConnection:
+    """Thin proxy around a MySQL connection; close() hands it back to the pool."""
+
+    def __init__(self, pool, raw, created_at, statements=None):
+        self._pool = pool
+        self._raw = raw
+        self.created_at = created_at
+        # sql -> (prepared cursor, the sql string it was prepared with); lives as long as `raw`
+        self.statements = OrderedDict() if statements is None else statements
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def cursor(self, *args, **kwargs):
+        cur = self._raw.cursor(*args, **kwargs)
+        return TimedCursor(cur) if METRICS_ENABLED else cur
+
+    # ✅ Plain tuple rows for a read. With PREPARED, each distinct statement is
+    # prepared once per connection and re-executed after that (binary protocol,
+    # no re-parsing); the least recently used beyond STATEMENT_CACHE are closed.
+    def query(self, sql, params=()):
+        if not PREPARED:
+            cur = self.cursor()
+            cur.execute(sql, params)
+            return cur.fetchall()
+
+        entry = self.statements.get(sql)
+        if entry is None:
+            entry = self.statements[sql] = (self.cursor(prepared=True), sql)
+            if len(self.statements) > STATEMENT_CACHE:
+                _, (oldest, _) = self.statements.popitem(last=False)
+                oldest.close()
+        else:
+            self.statements.move_to_end(sql)
+        cur, prepared_sql = entry
+        try:
+            # The connector only reuses a statement for the very same string object
+            cur.execute(prepared_sql, params)
+            return cur.fetchall()
+        except Exception:
+            # Not trusted again: re-prepared on the next call
+            self.statements.pop(sql, None)
+            try:
+                cur.close()
+            except Exception:
+                pass
+            raise
+
+    def close(self):
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            pool.release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ConnectionPool:
+    def __init__(self, config, size=POOL_SIZE, timeout=POOL_TIMEOUT,
+                 recycle=POOL_RECYCLE, ping_after=POOL_PING_AFTER):
+        self.config = dict(config)
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_after = ping_after
+
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._stats = {
+            "in_use": 0,
+            "created": 0,
+            "recycled": 0,
+            "broken": 0,
+            "acquired": 0,
+            "timeouts": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+        }
+
+    def _bump(self, key, amount=1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def _connect(self):
+        started = time.perf_counter()
+        raw = mysql.connector.connect(**self.config)
+        observe_db("connect", time.perf_counter() - started)
+        self._bump("created")
+        return raw
+
+    def _discard(self, raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def _healthy(self, raw, created_at, last_used):
+        now = time.monotonic()
+        if now - created_at > self.recycle:
+            self._bump("recycled")
+            return False
+        if now - last_used > self.ping_after:
+            try:
+                raw.ping(reconnect=False)
+            except Exception:
+                self._bump("broken")
+                return False
+        return True
+
+    def acquire(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=timeout):
+            self._bump("timeouts")
+            raise PoolTimeout(f"No database connection available after {timeout}s")
+        waited = time.monotonic() - started
+
+        try:
+            conn = None
+            while conn is None:
+                try:
+                    raw, created_at, last_used, statements = self._idle.get_nowait()
+                except queue.Empty:
+                    conn = PooledConnection(self, self._connect(), time.monotonic())
+                    break
+                if self._healthy(raw, created_at, last_used):
+                    conn = PooledConnection(self, raw, created_at, statements)
+                else:
+                    self._discard(raw)
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._stats["in_use"] += 1
+            self._stats["acquired"] += 1
+            self._stats["wait_time_total"] += waited
+            self._stats["wait_time_max"] = max(self._stats["wait_time_max"], waited)
+        return conn
+
+    def release(self, conn):
+        raw = conn._raw
+        try:
+            # Never hand unread rows or a half-finished transaction to the next caller.
+            # An abandoned streaming read may have millions of rows left, so the
+            # connection is dropped rather than drained.
+            if raw.unread_result:
+                self._discard(raw)
+                return
+            if raw.in_transaction:
+                raw.rollback()
+            self._idle.put((raw, conn.created_at, time.monotonic(), conn.statements))
+        except Exception:
+            self._bump("broken")
+            self._discard(raw)
+        finally:
+            self._bump("in_use", -1)
+            self._slots.release()
+
+    # ✅ For pre-fork servers: a forked worker must never reuse the parent's
+    # sockets, so inherited connections are forgotten (not closed, which would
+    # send a QUIT on the parent's session) and the pool starts empty.
+    def after_fork(self):
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        for key in self._stats:
+            self._stats[key] = 0.0 if key.startswith("wait_time") else 0
+
+    # Open up to `count` connections ahead of the first requests
+    def warm(self, count):
+        conns = []
+        try:
+            for _ in range(min(count, self.size)):
+                conns.append(self.acquire())
+        finally:
+            for conn in conns:
+                conn.close()
+        return len(conns)
+
+    def close_idle(self):
+        while True:
+            try:
+                raw, _, _, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._discard(raw)
+
+    @property
+    def in_use(self):
+        return self._stats["in_use"]
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["size"] = self.size
+        stats["idle"] = self._idle.qsize()
+        stats["wait_time_avg"] = (
+            stats["wait_time_total"] / stats["acquired"] if stats["acquired"] else 0.0
+        )
+        return stats
+
+
+def replica_config(spec):
+    host, _, port = spec.partition(":")
+    config = dict(DB_CONFIG, host=host, connection_timeout=REPLICA_CONNECT_TIMEOUT)
+    if port:
+        config["port"] = int(port)
+    config["user"] = os.getenv("DB_REPLICA_USER", config["user"])
+    config["password"] = os.getenv("DB_REPLICA_PASS", config["password"])
+    return config
+
+
+# Worst lag over the replication channels, or (None, reason) when not replicating.
+# Needs the REPLICATION CLIENT privilege.
+def _replication_lag(conn):
+    cur = conn.cursor(dictionary=True)
+    try:
+        cur.execute("SHOW REPLICA STATUS")
+    except mysql.connector.Error:
+        cur = conn.cursor(dictionary=True)
+        cur.execute("SHOW SLAVE STATUS")  # MySQL before 8.0.22, MariaDB
+    rows = cur.fetchall()
+    if not rows:
+        return None, "not a replica (SHOW REPLICA STATUS is empty)"
+    lags = []
+    for row in rows:
+        running = row.get("Replica_SQL_Running", row.get("Slave_SQL_Running"))
+        lag = row.get("Seconds_Behind_Source", row.get("Seconds_Behind_Master"))
+        if running != "Yes" or lag is None:
+            return None, "replication is stopped"
+        lags.append(lag)
+    return max(lags), None
+
+
+class Replica:
+    """One read replica: its own pool plus the verdict of the last health check."""
+
+    def __init__(self, name, config):
+        self.name = name
+        self.pool = ConnectionPool(config, size=REPLICA_POOL_SIZE)
+        self.healthy = False
+        self.lag = None
+        self.error = "not checked yet"
+        self.checked_at = None
+        self.reads = 0
+
+    def mark(self, lag, error=None):
+        if error is None and lag > REPLICA_MAX_LAG:
+            error = f"{lag}s behind (DB_REPLICA_MAX_LAG={REPLICA_MAX_LAG:g})"
+        self.lag, self.error = lag, error
+        self.healthy = error is None
+        self.checked_at = time.time()
+
+    def check(self):
+        try:
+            conn = self.pool.acquire(timeout=REPLICA_CHECK_INTERVAL)
+        except PoolTimeout:
+            return  # every connection is busy serving reads: keep the last verdict
+        except Exception as e:
+            self.mark(None, f"unreachable: {e}")
+            return
+        try:
+            lag, error = _replication_lag(conn)
+        except Exception as e:
+            lag, error = None, str(e)
+        finally:
+            conn.close()
+        self.mark(lag, error)
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "healthy": self.healthy,
+            "lag": self.lag,
+            "error": self.error,
+            "checked_at": self.checked_at,
+            "reads": self.reads,
+            "pool": self.pool.stats(),
+        }
+
+
+class ReplicaSet:
+    """The configured replicas. A background thread per process checks each one
+    every REPLICA_CHECK_INTERVAL seconds; reads go to the least busy healthy one.
+    Until the first check passes, and whenever none is healthy, reads stay on
+    the primary."""
+
+    def __init__(self, specs):
+        self.replicas = [Replica(spec, replica_config(spec)) for spec in specs]
+        self._pid = None
+        self._lock = threading.Lock()
+        self._turn = itertools.count()
+        self.primary_reads = 0
+
+    def __bool__(self):
+        return bool(self.replicas)
+
+    # Started lazily in each process (pre-fork servers fork before first use)
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._loop, name="replica-health", daemon=True).start()
+
+    def _loop(self):
+        while True:
+            for replica in self.replicas:
+                replica.check()
+            time.sleep(REPLICA_CHECK_INTERVAL)
+
+    # Replicas that passed their last check (asgi.py reads them through its own pools)
+    def healthy(self):
+        self._ensure_started()
+        return [replica for replica in self.replicas if replica.healthy]
+
+    # ✅ A connection to the least busy healthy replica, or None (use the primary).
+    # Ties rotate; a replica that fails to connect is marked down until its next check.
+    def acquire(self):
+        healthy = self.healthy()
+        if healthy:
+            start = next(self._turn) % len(healthy)
+            ordered = sorted(healthy[start:] + healthy[:start], key=lambda replica: replica.pool.in_use)
+            # Any free connection first; only then wait for the least busy replica
+            for replica, timeout in [(replica, 0) for replica in ordered] + [(ordered[0], None)]:
+                try:
+                    conn = replica.pool.acquire(timeout=timeout)
+                except PoolTimeout:
+                    continue
+                except Exception as e:
+                    replica.mark(None, f"unreachable: {e}")
+                    continue
+                replica.reads += 1
+                return conn
+        self.primary_reads += 1
+        return None
+
+    def after_fork(self):
+        self._pid = None
+        self._lock = threading.Lock()
+        for replica in self.replicas:
+            replica.pool.after_fork()
+
+    def close_idle(self):
+        for replica in self.replicas:
+            replica.pool.close_idle()
+
+    def stats(self):
+        return {
+            "primary_reads": self.primary_reads,
+            "max_lag": REPLICA_MAX_LAG,
+            "read_your_writes": READ_YOUR_WRITES,
+            "replicas": [replica.stats() for replica in self.replicas],
+        }
+
+
+pool = ConnectionPool(DB_CONFIG)
+replicas = ReplicaSet(DB_REPLICAS)
+
+
+# ✅ Read routing for the current request (set by routing.py): whether
+# db_connection() may use a replica, and whether it did
+class ReadRoute:
+    __slots__ = ("replicas", "used")
+
+    def __init__(self, replicas):
+        self.replicas = replicas
+        self.used = False
+
+
+_route = contextvars.ContextVar("db_read_route", default=None)
+
+
+def route_reads(use_replicas):
+    return _route.set(ReadRoute(use_replicas))
+
+
+def end_route(token):
+    _route.reset(token)
+
+
+def replica_reads():
+    route = _route.get()
+    return route is not None and route.replicas
+
+
+def replica_served():
+    route = _route.get()
+    return route is not None and route.used
+
+
+# For connections taken outside db_connection() (asgi.py's replica pools)
+def note_replica_read():
+    route = _route.get()
+    if route is not None:
+        route.used = True
+
+
+# ✅ Borrow a pooled connection (call conn.close() to give it back)
+def get_db_connection():
+    return pool.acquire()
+
+
+# ✅ Preferred form: the connection is returned even on early return / exception.
+# replica=None follows the request's routing (a replica for reads, when healthy
+# ones exist); False always uses the primary, e.g. to fill a shared cache.
+@contextmanager
+def db_connection(replica=None):
+    route = _route.get()
+    if replica is None:
+        replica = route is not None and route.replicas
+    conn = replicas.acquire() if replica and replicas else None
+    if conn is None:
+        conn = pool.acquire()
+    elif route is not None:
+        route.used = True
+    try:
+        yield conn
+    finally:
+        conn.close()
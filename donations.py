@@ -0,0 +1,133 @@
+import uuid
+from collections import defaultdict
+from datetime import date
+
+from blood_groups import BLOOD_GROUPS
+from blood_units import add_donation_units
+from rollups import record
+
+MAX_BATCH = 5000
+MAX_UNITS_PER_DONATION = 10
+
+
+# ✅ Check each row on its own (types, dates, quantities).
+# Returns (clean rows, {row index: error}).
+def validate_rows(rows):
+    clean, errors = {}, {}
+    today = date.today()
+    for index, row in enumerate(rows):
+        if not isinstance(row, dict):
+            errors[index] = "❌ Each donation must be an object"
+            continue
+
+        donor_id = row.get('donor_id')
+        if not isinstance(donor_id, int) or donor_id <= 0:
+            errors[index] = "❌ donor_id must be a positive integer"
+            continue
+
+        quantity = row.get('quantity', 1)
+        if not isinstance(quantity, int) or not 0 < quantity <= MAX_UNITS_PER_DONATION:
+            errors[index] = f"❌ quantity must be between 1 and {MAX_UNITS_PER_DONATION}"
+            continue
+
+        blood_group = row.get('blood_group')
+        if blood_group is not None and blood_group not in BLOOD_GROUPS:
+            errors[index] = f"❌ Invalid blood group '{blood_group}'"
+            continue
+
+        raw_date = row.get('donation_date')
+        try:
+            donation_date = date.fromisoformat(raw_date) if raw_date else today
+        except (TypeError, ValueError):
+            errors[index] = "❌ donation_date must be YYYY-MM-DD"
+            continue
+        if donation_date > today:
+            errors[index] = "❌ donation_date cannot be in the future"
+            continue
+
+        clean[index] = {
+            "donor_id": donor_id,
+            "blood_group": blood_group,
+            "quantity": quantity,
+            "donation_date": donation_date,
+        }
+    return clean, errors
+
+
+# ✅ Resolve donors in one query: unknown donors are errors, a missing blood group
+# falls back to the donor's registered one.
+def resolve_donors(cur, clean, errors):
+    donor_ids = sorted({row["donor_id"] for row in clean.values()})
+    if not donor_ids:
+        return
+    placeholders = ", ".join(["%s"] * len(donor_ids))
+    cur.execute(
+        f"SELECT id, blood_group FROM users WHERE role='donor' AND id IN ({placeholders})",
+        donor_ids
+    )
+    registered = dict(cur.fetchall())
+
+    for index in list(clean):
+        row = clean[index]
+        if row["donor_id"] not in registered:
+            errors[index] = "❌ Donor not found"
+            del clean[index]
+            continue
+        row["blood_group"] = row["blood_group"] or registered[row["donor_id"]]
+        if row["blood_group"] not in BLOOD_GROUPS:
+            errors[index] = "❌ Donor has no valid blood group on file"
+            del clean[index]
+
+
+# ✅ Write a validated batch in ONE transaction:
+#   1. ledger rows via executemany
+#   2. donors rows for first-time donors (one INSERT IGNORE ... SELECT; donors.user_id is unique)
+#   3. last_donation_date for every donor in the batch (one UPDATE ... JOIN)
+#   4. summed inventory deltas per blood group (one multi-row upsert)
+#   5. one blood_units row per unit (one INSERT ... SELECT over the batch)
+def ingest_batch(conn, rows):
+    cur = conn.cursor()
+    batch_id = uuid.uuid4().hex
+
+    conn.start_transaction()
+    cur.executemany("""
+        INSERT INTO donations (donor_id, blood_group, quantity, donation_date, batch_id)
+        VALUES (%s, %s, %s, %s, %s)
+    """, [(r["donor_id"], r["blood_group"], r["quantity"], r["donation_date"], batch_id) for r in rows])
+
+    donor_ids = sorted({r["donor_id"] for r in rows})
+    placeholders = ", ".join(["%s"] * len(donor_ids))
+    cur.execute(f"""
+        INSERT IGNORE INTO donors (user_id, blood_group, location, last_donation_date, lat, lon, geohash)
+        SELECT u.id, u.blood_group, u.location, NULL, u.lat, u.lon, u.geohash
+        FROM users u
+        LEFT JOIN donors d ON d.user_id = u.id
+        WHERE u.id IN ({placeholders}) AND d.id IS NULL
+    """, donor_ids)
+
+    cur.execute("""
+        UPDATE donors d
+        JOIN (
+            SELECT donor_id, MAX(donation_date) AS last_date
+            FROM donations
+            WHERE batch_id = %s
+            GROUP BY donor_id
+        ) b ON b.donor_id = d.user_id
+        SET d.last_donation_date = GREATEST(COALESCE(d.last_donation_date, b.last_date), b.last_date)
+    """, (batch_id,))
+
+    deltas = defaultdict(int)
+    for r in rows:
+        deltas[r["blood_group"]] += r["quantity"]
+    values = ", ".join(["(%s, %s)"] * len(deltas))
+    cur.execute(f"""
+        INSERT INTO inventory (blood_group, units)
+        VALUES {values}
+        ON DUPLICATE KEY UPDATE units = units + VALUES(units)
+    """, [v for item in sorted(deltas.items()) for v in item])
+
+    add_donation_units(cur, "d.batch_id = %s", (batch_id,), MAX_UNITS_PER_DONATION)
+    record(cur, "donated", ((r["donation_date"], r["blood_group"], r["quantity"]) for r in rows))
+
+    conn.commit()
+    return batch_id, dict(deltas)
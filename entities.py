@@ -0,0 +1,264 @@
+import json
+import multiprocessing
+import os
+import threading
+import zlib
+from datetime import date, datetime
+
+from cache import TTLCache
+from db import db_connection
+
+try:
+    import redis
+except ImportError:  # optional: only needed with REDIS_URL
+    redis = None
+
+# ✅ Entity cache settings (all overridable from the environment)
+ENTITY_CACHE_SIZE = int(os.getenv("ENTITY_CACHE_SIZE", 50000))   # entries per cache, per process
+ENTITY_CACHE_TTL = float(os.getenv("ENTITY_CACHE_TTL", 300))     # seconds
+REDIS_URL = os.getenv("REDIS_URL")                               # shared backend across hosts
+STAMP_SLOTS = 1 << 16
+
+_MISSING = object()
+
+# ✅ User row statements (also EXPLAINed by migrate.py check)
+USER_BY_EMAIL = "SELECT * FROM users WHERE email=%s"
+PERSON_QUERY = """
+    SELECT u.id, u.name, u.email, u.role, u.blood_group, u.location,
+           d.id AS donor_id, d.blood_group AS donor_blood_group,
+           d.location AS donor_location, d.last_donation_date
+    FROM users u
+    LEFT JOIN donors d ON d.user_id = u.id
+    WHERE u.id = %s
+"""
+DONOR_OWNER_QUERY = "SELECT user_id FROM donors WHERE id = %s"
+
+# Invalidation stamps in shared memory: every worker forked from the loaded app
+# sees a key's slot move when any of them writes, so its own copy is dropped on
+# the next read. Keys share a slot only by hash collision (an extra miss).
+_stamps = multiprocessing.RawArray("q", STAMP_SLOTS)
+_stamp_lock = multiprocessing.Lock()
+
+
+def _slot(name, key):
+    return zlib.crc32(f"{name}:{key}".encode()) % STAMP_SLOTS
+
+
+class LocalBackend:
+    """Per-process LRU/TTL cache, kept coherent across forked workers by the stamps."""
+
+    def __init__(self, name, maxsize, ttl):
+        self.name = name
+        self._data = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def stamp(self, key):
+        return _stamps[_slot(self.name, key)]
+
+    def get(self, key):
+        entry = self._data.get(key, _MISSING)
+        if entry is _MISSING or entry[0] != self.stamp(key):
+            return _MISSING
+        return entry[1]
+
+    # `stamp` was read before loading, so a write during the load leaves an
+    # entry that is already stale and never served
+    def set(self, key, value, stamp):
+        self._data.set(key, (stamp, value))
+
+    def delete(self, keys):
+        with _stamp_lock:
+            for key in keys:
+                _stamps[_slot(self.name, key)] += 1
+        for key in keys:
+            self._data.invalidate(key)
+
+    def size(self):
+        return self._data.stats()["size"]
+
+
+def _encode(value):
+    def default(v):
+        if isinstance(v, datetime):
+            return {"__datetime__": v.isoformat()}
+        if isinstance(v, date):
+            return {"__date__": v.isoformat()}
+        raise TypeError(f"Cannot cache {type(v).__name__}")
+    return json.dumps(value, default=default)
+
+
+def _decode(raw):
+    def hook(obj):
+        if "__datetime__" in obj:
+            return datetime.fromisoformat(obj["__datetime__"])
+        if "__date__" in obj:
+            return date.fromisoformat(obj["__date__"])
+        return obj
+    return json.loads(raw, object_hook=hook)
+
+
+class RedisBackend:
+    """Shared cache in Redis: one copy for every process and host, deleted on write.
+    Each key has a version counter bumped on invalidation; a loaded value is only
+    stored if the version is still the one read before loading. If Redis is
+    unreachable, reads fall through to MySQL."""
+
+    # SET data key only if the version key still holds the expected value
+    SET_IF_CURRENT = """
+        if (redis.call('GET', KEYS[2]) or '0') == ARGV[1] then
+            redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+            return 1
+        end
+        return 0
+    """
+
+    def __init__(self, name, client, ttl):
+        self.name = name
+        self.client = client
+        self.ttl = max(1, int(ttl))
+        self._set_if_current = client.register_script(self.SET_IF_CURRENT)
+        self.errors = 0
+
+    def _key(self, key):
+        return f"bloodbank:{self.name}:{key}"
+
+    def stamp(self, key):
+        try:
+            return (self.client.get(self._key(key) + ":v") or b"0").decode()
+        except redis.RedisError:
+            self.errors += 1
+            return None
+
+    def get(self, key):
+        try:
+            raw = self.client.get(self._key(key))
+        except redis.RedisError:
+            self.errors += 1
+            return _MISSING
+        return _MISSING if raw is None else _decode(raw)
+
+    def set(self, key, value, stamp):
+        if stamp is None:
+            return
+        data_key = self._key(key)
+        try:
+            self._set_if_current(keys=[data_key, data_key + ":v"], args=[stamp, _encode(value), self.ttl])
+        except redis.RedisError:
+            self.errors += 1
+
+    def delete(self, keys):
+        # Failing loudly here: a lost delete would leave a stale entry for ttl seconds
+        pipe = self.client.pipeline(transaction=False)
+        for key in keys:
+            data_key = self._key(key)
+            pipe.incr(data_key + ":v")
+            pipe.expire(data_key + ":v", self.ttl * 2)
+            pipe.delete(data_key)
+        pipe.execute()
+
+    def size(self):
+        return None
+
+
+_redis_client = None
+
+
+def _backend(name, maxsize, ttl):
+    global _redis_client
+    if REDIS_URL:
+        if redis is None:
+            raise RuntimeError("REDIS_URL is set but the redis package is not installed (pip install redis)")
+        if _redis_client is None:
+            _redis_client = redis.Redis.from_url(REDIS_URL, socket_timeout=0.5)
+        return RedisBackend(name, _redis_client, ttl)
+    return LocalBackend(name, maxsize, ttl)
+
+
+class EntityCache:
+    """Read-through cache of one kind of row, keyed by id. Misses (None) are not
+    cached, so a row created later is found straight away."""
+
+    def __init__(self, name, maxsize=ENTITY_CACHE_SIZE, ttl=ENTITY_CACHE_TTL):
+        self.name = name
+        self.backend = _backend(name, maxsize, ttl)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_load(self, key, loader):
+        value = self.backend.get(key)
+        if value is not _MISSING:
+            with self._lock:
+                self.hits += 1
+            return value
+        with self._lock:
+            self.misses += 1
+        stamp = self.backend.stamp(key)
+        value = loader()
+        if value is not None:
+            self.backend.set(key, value, stamp)
+        return value
+
+    # Store a row the caller has just read from the primary (e.g. at login)
+    def put(self, key, value):
+        self.backend.set(key, value, self.backend.stamp(key))
+
+    def invalidate(self, *keys):
+        keys = [key for key in keys if key is not None]
+        if keys:
+            self.backend.delete(keys)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": "redis" if isinstance(self.backend, RedisBackend) else "local",
+            "size": self.backend.size(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+# ✅ The cached entities.
+# person: user id -> the user row plus its donors row (one query, LEFT JOIN)
+# donor_owner: donors.id -> user id, to serve donor-id routes from `people`
+people = EntityCache("person")
+donor_owners = EntityCache("donor_owner")
+
+
+# Loaders fill the cache, so they always read the primary
+def _load_person(user_id):
+    with db_connection(replica=False) as conn:
+        cur = conn.cursor(dictionary=True)
+        cur.execute(PERSON_QUERY, (user_id,))
+        return cur.fetchone()
+
+
+def _load_donor_owner(donor_id):
+    with db_connection(replica=False) as conn:
+        cur = conn.cursor()
+        cur.execute(DONOR_OWNER_QUERY, (donor_id,))
+        row = cur.fetchone()
+    # A donor whose user was deleted has user_id NULL: not cached, served uncached
+    return row[0] if row else None
+
+
+def get_person(user_id):
+    return people.get_or_load(user_id, lambda: _load_person(user_id))
+
+
+def get_donor_owner(donor_id):
+    return donor_owners.get_or_load(donor_id, lambda: _load_donor_owner(donor_id))
+
+
+# ✅ Call after committing a write to users / donors rows
+def invalidate_people(*user_ids):
+    people.invalidate(*user_ids)
+
+
+def invalidate_donor(donor_id, user_id=None):
+    donor_owners.invalidate(donor_id)
+    people.invalidate(user_id)
+
+
+def stats():
+    return {"person": people.stats(), "donor_owner": donor_owners.stats()}
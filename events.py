@@ -0,0 +1,305 @@
+import json
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from collections import deque
+from datetime import date, datetime
+
+SSE_MAX_SUBSCRIBERS = int(os.getenv("SSE_MAX_SUBSCRIBERS", 5000))
+SSE_KEEPALIVE = float(os.getenv("SSE_KEEPALIVE", 15))    # seconds between keep-alive comments
+SSE_REPLAY = int(os.getenv("SSE_REPLAY", 1000))          # recent events kept for Last-Event-ID resume
+SSE_EVENT_BYTES = int(os.getenv("SSE_EVENT_BYTES", 4096))  # largest event shared between worker processes
+# Streams a threaded server (Flask dev server, gunicorn gthread) holds per process:
+# each one keeps a request thread busy for as long as it is open, so keep this well
+# below the thread count. The ASGI server holds streams as coroutines instead.
+SSE_THREAD_STREAMS = int(os.getenv("SSE_THREAD_STREAMS", max(2, int(os.getenv("WEB_THREADS", 8)) // 4)))
+SUBSCRIBER_BACKLOG = 256                                 # undelivered events kept per subscriber
+
+# Shared by every worker forked from one loaded app (e.g. `gunicorn --preload`):
+# a ring of the last SSE_REPLAY events and the id of the newest one. Any worker
+# publishes into it and every worker delivers from it, so ids are global and a
+# client can resume with Last-Event-ID on whichever worker it reconnects to.
+_SLOTS = max(SSE_REPLAY, 1)
+_slot_ids = multiprocessing.RawArray("q", _SLOTS)
+_slot_sizes = multiprocessing.RawArray("i", _SLOTS)
+_slot_data = multiprocessing.RawArray("c", _SLOTS * SSE_EVENT_BYTES)
+_last_id = multiprocessing.RawValue("q", 0)
+_streams = multiprocessing.RawValue("q", 0)              # open streams, all processes
+_published = multiprocessing.Condition()
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+class SubscriptionDenied(Exception):
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+# Slots hold "kind\ntopic,topic\npayload"; both are called with _published held
+def _write_slot(event_id, topics, kind, payload):
+    header = f"{kind}\n{','.join(sorted(topics))}\n"
+    body = (header + payload).encode("utf-8")
+    if len(body) > SSE_EVENT_BYTES:
+        # Too big to share: send the event without its data, clients refetch
+        body = (header + "{}").encode("utf-8")
+    slot = event_id % _SLOTS
+    start = slot * SSE_EVENT_BYTES
+    _slot_data[start:start + len(body)] = body
+    _slot_sizes[slot] = len(body)
+    _slot_ids[slot] = event_id
+
+
+def _read_slot(event_id):
+    slot = event_id % _SLOTS
+    if _slot_ids[slot] != event_id:
+        return None     # already overwritten by a newer event
+    start = slot * SSE_EVENT_BYTES
+    kind, topics, payload = _slot_data[start:start + _slot_sizes[slot]].decode("utf-8").split("\n", 2)
+    return (event_id, frozenset(topics.split(",")), kind, payload)
+
+
+def _read_since(after, last):
+    return [e for e in map(_read_slot, range(max(after, last - _SLOTS) + 1, last + 1)) if e]
+
+
+class Subscription:
+    """One client's mailbox. Publishing only appends to it and pokes its waiters,
+    so an idle subscriber costs a deque and a few small objects; no thread is
+    created for it. Blocking readers use wait(); async servers register a wake-up
+    callback with add_listener()."""
+
+    def __init__(self, topics):
+        self.topics = frozenset(topics)
+        self.events = deque(maxlen=SUBSCRIBER_BACKLOG)
+        self._ready = threading.Event()
+        self._listeners = []
+        self.closed = False
+        self.last_id = 0
+        self.holds_thread = False
+
+    def push(self, event):
+        # Replay on subscribe may already have delivered it
+        if event[0] <= self.last_id:
+            return
+        self.last_id = event[0]
+        self.events.append(event)
+        self.wake()
+
+    def add_listener(self, callback):
+        self._listeners.append(callback)
+
+    def wake(self):
+        self._ready.set()
+        for listener in self._listeners:
+            listener()
+
+    def drain(self):
+        self._ready.clear()
+        drained = []
+        while self.events:
+            drained.append(self.events.popleft())
+        return drained
+
+    def wait(self, timeout):
+        if not self.events:
+            self._ready.wait(timeout)
+        return self.drain()
+
+
+class Broker:
+    """Pub/sub across worker processes. publish() adds the event to the shared
+    ring and wakes every process; in each process a dispatcher thread hands new
+    events to that process's subscriptions (topic -> subscriptions)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._topics = {}
+        self._count = 0
+        self._thread_streams = 0
+        self._pid = None
+        self._seen = 0
+
+    # Started lazily in each process (pre-fork servers fork before first use);
+    # called with self._lock held
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with _published:
+            self._seen = _last_id.value
+        self._pid = os.getpid()
+        threading.Thread(target=self._dispatch, name="sse-dispatch", daemon=True).start()
+
+    # holds_thread: the stream is served by a blocking thread (see SSE_THREAD_STREAMS)
+    def subscribe(self, topics, last_event_id=None, holds_thread=False):
+        subscription = Subscription(topics)
+        with self._lock:
+            if self._count >= SSE_MAX_SUBSCRIBERS:
+                raise TooManySubscribers("Too many live event subscribers")
+            if holds_thread and self._thread_streams >= SSE_THREAD_STREAMS:
+                raise TooManySubscribers("Too many live event streams for this server's request threads")
+            self._ensure_started()
+            with _published:
+                # Resume: replay what the client missed while reconnecting
+                if last_event_id is not None:
+                    for event in _read_since(last_event_id, _last_id.value):
+                        if event[1] & subscription.topics:
+                            subscription.events.append(event)
+                subscription.last_id = _last_id.value
+                _streams.value += 1
+            self._count += 1
+            if holds_thread:
+                subscription.holds_thread = True
+                self._thread_streams += 1
+            for topic in subscription.topics:
+                self._topics.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            if subscription.closed:
+                return
+            subscription.closed = True
+            self._count -= 1
+            if subscription.holds_thread:
+                self._thread_streams -= 1
+            with _published:
+                _streams.value -= 1
+            for topic in subscription.topics:
+                subscribers = self._topics.get(topic)
+                if subscribers:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._topics[topic]
+
+    # ✅ Server shutdown: end every open stream so draining workers can exit
+    def close_all(self):
+        with self._lock:
+            subscriptions = set().union(*self._topics.values()) if self._topics else set()
+        for subscription in subscriptions:
+            self.unsubscribe(subscription)
+            subscription.wake()
+
+    # Any process: callers skip building events nobody would receive
+    def has_subscribers(self):
+        return _streams.value > 0
+
+    # ✅ Deliver one event to every subscriber of any of its topics (once each),
+    # in every worker process
+    def publish(self, topics, kind, data):
+        payload = json.dumps(data, default=_json_default)
+        with _published:
+            _last_id.value += 1
+            _write_slot(_last_id.value, topics, kind, payload)
+            _published.notify_all()
+
+    def _dispatch(self):
+        while True:
+            try:
+                with _published:
+                    if _last_id.value == self._seen:
+                        _published.wait(SSE_KEEPALIVE)
+                    last = _last_id.value
+                    # A dispatcher more than SSE_REPLAY events behind loses the oldest
+                    events = _read_since(self._seen, last)
+                self._seen = last
+                with self._lock:
+                    deliveries = []
+                    for event in events:
+                        targets = set()
+                        for topic in event[1]:
+                            targets.update(self._topics.get(topic, ()))
+                        deliveries.append((event, targets))
+                for event, targets in deliveries:
+                    for subscription in targets:
+                        subscription.push(event)
+            except Exception as e:
+                print("Error in event dispatcher:", e)
+                time.sleep(1)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "subscribers": self._count, "thread_streams": self._thread_streams,
+                "topics": len(self._topics), "last_event_id": _last_id.value
+            }
+
+
+broker = Broker()
+
+
+# ✅ Live streams never finish on their own: end them when the process is asked
+# to stop, so a graceful drain does not wait for its timeout. The handler already
+# installed still runs afterwards. Main thread only (a signal module rule).
+def close_streams_on(*signums):
+    for signum in signums:
+        previous = signal.getsignal(signum)
+
+        def handler(sig, frame, previous=previous):
+            broker.close_all()
+            if callable(previous):
+                previous(sig, frame)
+            elif previous == signal.SIG_DFL:
+                signal.signal(sig, signal.SIG_DFL)
+                signal.raise_signal(sig)
+
+        signal.signal(signum, handler)
+
+
+def format_event(event):
+    event_id, _, kind, payload = event
+    return f"id: {event_id}\nevent: {kind}\ndata: {payload}\n\n"
+
+
+# ✅ Which topics a client may follow. Everyone gets inventory deltas; request
+# changes need a session: admins get every request (or one hospital's with
+# hospital_id), a hospital only ever gets its own.
+def subscription_topics(principal, hospital_id=None):
+    topics = {"inventory"}
+    role = principal["role"] if principal else None
+    if role == "admin":
+        topics.add(f"hospital:{hospital_id}" if hospital_id else "requests")
+    elif role == "hospital":
+        if hospital_id and hospital_id != principal["id"]:
+            raise SubscriptionDenied("You can only follow your own hospital's requests", 403)
+        topics.add(f"hospital:{principal['id']}")
+    elif hospital_id:
+        if not principal:
+            raise SubscriptionDenied("Sign in to follow hospital requests", 401)
+        raise SubscriptionDenied("You can only follow inventory updates", 403)
+    return topics
+
+
+# ✅ Helpers used by the write routes (called after commit)
+def publish_inventory(deltas):
+    if deltas:
+        broker.publish({"inventory"}, "inventory", {"deltas": deltas})
+
+
+def publish_request(request_row):
+    topics = {"requests"}
+    if request_row.get("hospital_id") is not None:
+        topics.add(f"hospital:{request_row['hospital_id']}")
+    broker.publish(topics, "request", request_row)
+
+
+# ✅ Blocking SSE body for the threaded WSGI server. The caller unsubscribes when
+# the response is closed (client gone), whether or not streaming ever started.
+def sse_stream(subscription):
+    yield "retry: 3000\n\n"
+    while not subscription.closed:
+        events = subscription.wait(SSE_KEEPALIVE)
+        if events:
+            yield "".join(format_event(e) for e in events)
+        elif not subscription.closed:
+            yield ": keep-alive\n\n"
@@ -0,0 +1,224 @@
+"""Geocoding of free-text locations and radius search over donors and hospitals.
+
+Locations are looked up once, when they are written, in a local gazetteer
+(GAZETTEER_FILE, a CSV of name,lat,lon; default data/gazetteer.csv) and stored
+as lat / lon plus a geohash. A radius search turns the circle's bounding box
+into a handful of geohash prefixes, range-scans the geohash index for them and
+sorts the candidates by exact distance. Rows written before geocoding existed:
+
+    python geo.py backfill     # geocode every users / donors row from its location
+    python geo.py unknown      # locations the gazetteer does not know, most common first
+"""
+import argparse
+import csv
+import math
+import os
+import threading
+
+DEFAULT_GAZETTEER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "gazetteer.csv")
+GAZETTEER_FILE = os.getenv("GAZETTEER_FILE", DEFAULT_GAZETTEER)
+GEOHASH_PRECISION = 7      # stored hashes: cells of about 150 x 150 m
+MAX_CELLS = 16             # prefixes one search may scan
+MAX_RADIUS_KM = 500
+EARTH_KM_PER_DEGREE = 111.32
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+_places = None
+_places_lock = threading.Lock()
+
+
+def _normalize(name):
+    return " ".join(name.lower().split())
+
+
+def _gazetteer():
+    global _places
+    if _places is None:
+        with _places_lock:
+            if _places is None:
+                places = {}
+                with open(GAZETTEER_FILE, newline="", encoding="utf-8") as f:
+                    for row in csv.DictReader(f):
+                        places[_normalize(row["name"])] = (float(row["lat"]), float(row["lon"]))
+                _places = places
+    return _places
+
+
+# ✅ (lat, lon) for a place name, or None. "Palghat, Kerala" falls back to "Palghat".
+def geocode(location):
+    if not location or not isinstance(location, str):
+        return None
+    places = _gazetteer()
+    name = _normalize(location)
+    return places.get(name) or places.get(name.split(",")[0].strip())
+
+
+def encode(lat, lon, precision=GEOHASH_PRECISION):
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, value, bits, even = [], 0, 0, True
+    while len(chars) < precision:
+        target, bounds = (lon, lon_range) if even else (lat, lat_range)
+        mid = (bounds[0] + bounds[1]) / 2
+        if target >= mid:
+            value = value * 2 + 1
+            bounds[0] = mid
+        else:
+            value *= 2
+            bounds[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            value, bits = 0, 0
+    return "".join(chars)
+
+
+# ✅ Values for the lat / lon / geohash columns of a location (all None if unknown)
+def point(location):
+    coordinates = geocode(location)
+    if coordinates is None:
+        return None, None, None
+    lat, lon = coordinates
+    return lat, lon, encode(lat, lon)
+
+
+def _cell_size(precision):
+    # Longitude takes the odd bit when 5 * precision is odd
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+# ✅ Geohash prefixes whose cells cover the circle's bounding box: the finest
+# precision that needs at most MAX_CELLS of them
+def cover(lat, lon, radius_km):
+    dlat = radius_km / EARTH_KM_PER_DEGREE
+    dlon = radius_km / (EARTH_KM_PER_DEGREE * max(math.cos(math.radians(lat)), 0.01))
+    south, north = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+    west, east = lon - min(dlon, 180.0), lon + min(dlon, 180.0)
+
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = _cell_size(precision)
+        rows = math.ceil((north - south) / height) + 1
+        cols = math.ceil((east - west) / width) + 1
+        if rows * cols <= MAX_CELLS:
+            break
+    # Samples at most one cell apart, edges included, hit every cell the box touches
+    cells = set()
+    for i in range(rows):
+        y = min(south + i * height, north)
+        for j in range(cols):
+            x = min(west + j * width, east)
+            cells.add(encode(y, (x + 180.0) % 360.0 - 180.0, precision))
+    return sorted(cells)
+
+
+# ✅ Radius search, nearest first. kind is "donors" or "hospitals"; donors can be
+# narrowed to one blood group. Each prefix is a range on idx_donors_geo /
+# idx_users_role_geo; only rows in those cells get an exact distance.
+NEARBY = {
+    "donors": """
+        SELECT d.id AS donor_id, d.user_id, u.name, u.email, d.blood_group,
+               COALESCE(d.location, u.location) AS location, d.last_donation_date,
+               d.lat, d.lon,
+               ST_Distance_Sphere(POINT(d.lon, d.lat), POINT(%s, %s)) / 1000 AS distance_km
+        FROM donors d
+        JOIN users u ON u.id = d.user_id
+        WHERE ({cells}) {extra}
+    """,
+    "hospitals": """
+        SELECT u.id AS hospital_id, u.name, u.email, u.location, u.lat, u.lon,
+               ST_Distance_Sphere(POINT(u.lon, u.lat), POINT(%s, %s)) / 1000 AS distance_km
+        FROM users u
+        WHERE u.role = 'hospital' AND ({cells}) {extra}
+    """,
+}
+
+
+def nearby_query(kind, lat, lon, radius_km, limit, blood_group=None):
+    alias = "d" if kind == "donors" else "u"
+    prefixes = cover(lat, lon, radius_km)
+    cells = " OR ".join([f"{alias}.geohash LIKE %s"] * len(prefixes))
+    params = [lon, lat, *(prefix + "%" for prefix in prefixes)]
+    extra = ""
+    if blood_group and kind == "donors":
+        extra = "AND d.blood_group = %s"
+        params.append(blood_group)
+    sql = NEARBY[kind].format(cells=cells, extra=extra) + " HAVING distance_km <= %s ORDER BY distance_km LIMIT %s"
+    return sql, params + [radius_km, limit]
+
+
+def find_nearby(cur, kind, lat, lon, radius_km, limit, blood_group=None):
+    cur.execute(*nearby_query(kind, lat, lon, radius_km, limit, blood_group))
+    rows = cur.fetchall()
+    for row in rows:
+        row["distance_km"] = round(float(row["distance_km"]), 2)
+    return rows
+
+
+# ✅ Backfill: one pass per table. The known locations go into a temporary table
+# and every row is set from it with a single UPDATE ... JOIN.
+def backfill(conn):
+    cur = conn.cursor()
+    cur.execute("SELECT DISTINCT location FROM users WHERE location IS NOT NULL")
+    names = {row[0] for row in cur.fetchall()}
+    cur.execute("SELECT DISTINCT location FROM donors WHERE location IS NOT NULL")
+    names |= {row[0] for row in cur.fetchall()}
+    known = [(name, *point(name)) for name in names if geocode(name)]
+
+    cur.execute("""
+        CREATE TEMPORARY TABLE geo_places (
+          name VARCHAR(100) PRIMARY KEY, lat DOUBLE, lon DOUBLE, geohash CHAR(7)
+        )
+    """)
+    try:
+        if known:
+            cur.executemany("INSERT IGNORE INTO geo_places VALUES (%s, %s, %s, %s)", known)
+        cur.execute("""
+            UPDATE users u LEFT JOIN geo_places g ON g.name = u.location
+            SET u.lat = g.lat, u.lon = g.lon, u.geohash = g.geohash
+        """)
+        users = cur.rowcount
+        # A donor's own location wins; donors without one are placed at their user's
+        cur.execute("""
+            UPDATE donors d
+            LEFT JOIN users u ON u.id = d.user_id
+            LEFT JOIN geo_places g ON g.name = COALESCE(d.location, u.location)
+            SET d.lat = g.lat, d.lon = g.lon, d.geohash = g.geohash
+        """)
+        donors = cur.rowcount
+    finally:
+        cur.execute("DROP TEMPORARY TABLE geo_places")
+    return {"locations": len(names), "geocoded": len(known), "users": users, "donors": donors}
+
+
+def unknown(conn, limit=50):
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT location, COUNT(*) AS n FROM users
+        WHERE location IS NOT NULL AND location <> ''
+        GROUP BY location ORDER BY n DESC
+    """)
+    return [(name, n) for name, n in cur.fetchall() if not geocode(name)][:limit]
+
+
+def main():
+    from db import db_connection
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=["backfill", "unknown"])
+    args = parser.parse_args()
+
+    with db_connection() as conn:
+        if args.command == "unknown":
+            for name, n in unknown(conn):
+                print(f"{n:>8}  {name}")
+            return
+        counts = backfill(conn)
+    print(f"✅ {counts['geocoded']} of {counts['locations']} locations found in {GAZETTEER_FILE}; "
+          f"updated {counts['users']} users and {counts['donors']} donors rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+import mysql.connector
+
+from allocation import URGENCIES
+from blood_units import issue_units
+from rollups import record_today
+
+
+class ApprovalError(Exception):
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+# ✅ Approve a request and take its units out of inventory in ONE statement.
+# The inventory row is only decremented when it still holds enough units, so two
+# approvals racing for the same blood group can never overdraw it, while approvals
+# for different blood groups touch different rows and never wait on each other.
+# The earliest-expiring tracked units are then issued to the request; run it in
+# a transaction so the aggregate and the unit rows move together.
+def approve_request(cur, rid):
+    cur.execute("""
+        UPDATE requests r
+        JOIN inventory i ON i.blood_group = r.blood_group
+        SET i.units = i.units - r.quantity,
+            r.status = 'approved',
+            r.fulfilled_group = i.blood_group
+        WHERE r.id = %s
+          AND r.status <> 'approved'
+          AND i.units >= r.quantity
+    """, (rid,))
+    if cur.rowcount > 0:
+        cur.execute("SELECT blood_group, quantity FROM requests WHERE id=%s", (rid,))
+        blood_group, quantity = cur.fetchone()
+        issue_units(cur, rid, blood_group, quantity)
+        record_today(cur, "issued", {blood_group: quantity})
+        return
+
+    # Nothing changed: work out why (only on the failure path)
+    cur.execute("SELECT blood_group, quantity, status FROM requests WHERE id=%s", (rid,))
+    request_data = cur.fetchone()
+    if not request_data:
+        raise ApprovalError("❌ Request not found", 404)
+    blood_group, quantity, status = request_data
+    if status == 'approved':
+        raise ApprovalError("❌ Request is already approved", 409)
+
+    cur.execute("SELECT units FROM inventory WHERE blood_group=%s", (blood_group,))
+    inventory = cur.fetchone()
+    if not inventory:
+        raise ApprovalError(f"❌ No inventory available for blood group {blood_group}")
+    raise ApprovalError(
+        f"❌ Insufficient inventory. Available: {inventory[0]} units, Requested: {quantity} units"
+    )
+
+
+# ✅ Non-approving status changes (rejected / pending) never touch inventory
+def set_request_status(cur, rid, new_status):
+    cur.execute("UPDATE requests SET status=%s WHERE id=%s", (new_status, rid))
+    if cur.rowcount > 0:
+        return
+    cur.execute("SELECT id FROM requests WHERE id=%s", (rid,))
+    if not cur.fetchone():
+        raise ApprovalError("❌ Request not found", 404)
+
+
+DEADLOCK_ERRNOS = (1213, 1205)  # deadlock found / lock wait timeout
+BULK_RETRIES = 3
+
+
+# ✅ Bulk status change: approvals are grouped by blood group and each group is
+# settled in one short transaction (lock inventory row, lock its requests in
+# FIFO order, hand out units, two set-based UPDATEs). Returns one outcome
+# per request id, in the order the ids were given.
+def bulk_update_status(conn, updates):
+    cur = conn.cursor()
+    ids = list(updates)
+    outcomes = {}
+
+    placeholders = ", ".join(["%s"] * len(ids))
+    cur.execute(
+        f"SELECT id, blood_group, hospital_id FROM requests WHERE id IN ({placeholders})", ids
+    )
+    found = {}
+    hospitals = {}
+    for rid, blood_group, hospital_id in cur.fetchall():
+        found[rid] = blood_group
+        hospitals[rid] = hospital_id
+    for rid in ids:
+        if rid not in found:
+            outcomes[rid] = {"id": rid, "ok": False, "error": "❌ Request not found"}
+
+    # Rejections / resets: one UPDATE per target status
+    by_status = {}
+    for rid, status in updates.items():
+        if rid in found and status != 'approved':
+            by_status.setdefault(status, []).append(rid)
+    for status, rids in by_status.items():
+        placeholders = ", ".join(["%s"] * len(rids))
+        cur.execute(
+            f"UPDATE requests SET status=%s WHERE id IN ({placeholders})", [status, *rids]
+        )
+        for rid in rids:
+            outcomes[rid] = {"id": rid, "ok": True, "status": status, "blood_group": found[rid]}
+
+    # Approvals: one transaction per blood group, groups in a fixed order.
+    # A request without a blood group has no stock to draw from.
+    by_group = {}
+    for rid, status in updates.items():
+        if rid not in found or status != 'approved':
+            continue
+        if found[rid] is None:
+            outcomes[rid] = {"id": rid, "ok": False, "error": "❌ Request has no blood group"}
+        else:
+            by_group.setdefault(found[rid], []).append(rid)
+    for blood_group in sorted(by_group):
+        for attempt in range(BULK_RETRIES):
+            try:
+                outcomes.update(_approve_group(conn, cur, blood_group, by_group[blood_group]))
+                break
+            except mysql.connector.DatabaseError as e:
+                conn.rollback()
+                if e.errno not in DEADLOCK_ERRNOS or attempt == BULK_RETRIES - 1:
+                    raise
+
+    for rid, outcome in outcomes.items():
+        if outcome["ok"]:
+            outcome["hospital_id"] = hospitals[rid]
+    return [outcomes[rid] for rid in ids]
+
+
+def _approve_group(conn, cur, blood_group, rids):
+    outcomes = {}
+    conn.start_transaction()
+
+    cur.execute("SELECT units FROM inventory WHERE blood_group=%s FOR UPDATE", (blood_group,))
+    row = cur.fetchone()
+    available = row[0] if row else 0
+
+    # Same priority as the allocator (allocation.make_entry): most urgent first,
+    # then oldest, then smallest
+    placeholders = ", ".join(["%s"] * len(rids))
+    urgencies = ", ".join(["%s"] * len(URGENCIES))
+    cur.execute(f"""
+        SELECT id, quantity, status FROM requests
+        WHERE id IN ({placeholders})
+        ORDER BY FIELD(urgency, {urgencies}) DESC, created_at, quantity, id
+        FOR UPDATE
+    """, [*rids, *URGENCIES])
+
+    approved = []
+    for rid, quantity, status in cur.fetchall():
+        if status == 'approved':
+            outcomes[rid] = {"id": rid, "ok": False, "error": "❌ Request is already approved"}
+        elif quantity > available:
+            outcomes[rid] = {
+                "id": rid, "ok": False,
+                "error": f"❌ Insufficient inventory. Available: {available} units, Requested: {quantity} units"
+            }
+        else:
+            available -= quantity
+            approved.append((rid, quantity))
+            outcomes[rid] = {
+                "id": rid, "ok": True, "status": "approved",
+                "blood_group": blood_group, "quantity": quantity
+            }
+
+    if approved:
+        placeholders = ", ".join(["%s"] * len(approved))
+        cur.execute(
+            f"UPDATE requests SET status='approved', fulfilled_group=blood_group WHERE id IN ({placeholders})",
+            [rid for rid, _ in approved]
+        )
+        cur.execute(
+            "UPDATE inventory SET units = units - %s WHERE blood_group = %s",
+            (sum(q for _, q in approved), blood_group)
+        )
+        for rid, quantity in approved:
+            issue_units(cur, rid, blood_group, quantity)
+        record_today(cur, "issued", {blood_group: sum(q for _, q in approved)})
+    conn.commit()
+    return outcomes
@@ -0,0 +1,322 @@
+import base64
+import json
+from collections import namedtuple
+from datetime import date, datetime
+
+from fastjson import dumps, dumps_rows
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+
+class ListError(Exception):
+    """Bad query-string input for a list endpoint (reported as HTTP 400)."""
+
+
+# ✅ Description of one list endpoint: where the rows come from, which columns may
+# be projected / filtered, and the keyset (ordering) used for cursors.
+class ListSpec:
+    def __init__(self, from_sql, where_sql, fields, filters, key, descending=False):
+        self.from_sql = from_sql        # "FROM ... JOIN ..."
+        self.where_sql = where_sql      # always-on condition, or None
+        self.fields = fields            # public name -> SQL expression
+        self.filters = filters          # query arg -> (SQL condition with %s, value parser)
+        self.key = key                  # public names of the keyset columns, e.g. ("created_at", "id")
+        self.descending = descending
+
+
+REQUEST_LIST = ListSpec(
+    from_sql="FROM requests r LEFT JOIN users u ON r.hospital_id = u.id",
+    where_sql=None,
+    fields={
+        "id": "r.id",
+        "hospital_id": "r.hospital_id",
+        "blood_group": "r.blood_group",
+        "quantity": "r.quantity",
+        "status": "r.status",
+        "urgency": "r.urgency",
+        "fulfilled_group": "r.fulfilled_group",
+        "created_at": "r.created_at",
+        "hospital_name": "u.name",
+    },
+    filters={
+        "hospital_id": ("r.hospital_id = %s", int),
+        "status": ("r.status = %s", str),
+        "urgency": ("r.urgency = %s", str),
+        "blood_group": ("r.blood_group = %s", str),
+        "location": ("u.location = %s", str),
+        "from": ("r.created_at >= %s", lambda v: _parse_datetime(v, end=False)),
+        "to": ("r.created_at <= %s", lambda v: _parse_datetime(v, end=True)),
+    },
+    key=("created_at", "id"),
+    descending=True,
+)
+
+DONOR_LIST = ListSpec(
+    from_sql="FROM users u LEFT JOIN donors d ON u.id = d.user_id",
+    where_sql="u.role = 'donor'",
+    fields={
+        "user_id": "u.id",
+        "name": "u.name",
+        "email": "u.email",
+        "blood_group": "COALESCE(d.blood_group, u.blood_group)",
+        "location": "COALESCE(d.location, u.location)",
+        "donor_id": "d.id",
+        "last_donation_date": "d.last_donation_date",
+    },
+    filters={
+        "blood_group": ("COALESCE(d.blood_group, u.blood_group) = %s", str),
+        "location": ("COALESCE(d.location, u.location) = %s", str),
+        "from": ("d.last_donation_date >= %s", lambda v: _parse_date(v)),
+        "to": ("d.last_donation_date <= %s", lambda v: _parse_date(v)),
+    },
+    key=("name", "user_id"),
+)
+
+# Donation history from the donations ledger
+DONATION_LIST = ListSpec(
+    from_sql="FROM donations dn LEFT JOIN users u ON dn.donor_id = u.id",
+    where_sql=None,
+    fields={
+        "id": "dn.id",
+        "donor_id": "dn.donor_id",
+        "name": "u.name",
+        "blood_group": "dn.blood_group",
+        "quantity": "dn.quantity",
+        "donation_date": "dn.donation_date",
+        "batch_id": "dn.batch_id",
+    },
+    filters={
+        "donor_id": ("dn.donor_id = %s", int),
+        "blood_group": ("dn.blood_group = %s", str),
+        "location": ("u.location = %s", str),
+        "from": ("dn.donation_date >= %s", lambda v: _parse_date(v)),
+        "to": ("dn.donation_date <= %s", lambda v: _parse_date(v)),
+    },
+    key=("donation_date", "id"),
+    descending=True,
+)
+
+
+# Individual blood units, soonest to expire first
+UNIT_LIST = ListSpec(
+    from_sql="FROM blood_units bu",
+    where_sql=None,
+    fields={
+        "id": "bu.id",
+        "donation_id": "bu.donation_id",
+        "blood_group": "bu.blood_group",
+        "component": "bu.component",
+        "collected_on": "bu.collected_on",
+        "expires_on": "bu.expires_on",
+        "status": "bu.status",
+        "request_id": "bu.request_id",
+    },
+    filters={
+        "blood_group": ("bu.blood_group = %s", str),
+        "status": ("bu.status = %s", str),
+        "component": ("bu.component = %s", str),
+        "request_id": ("bu.request_id = %s", int),
+        "expires_before": ("bu.expires_on <= %s", lambda v: _parse_date(v)),
+    },
+    key=("expires_on", "id"),
+)
+
+
+# ✅ Fixed statements of the unpaged read routes (shared with asgi.py and migrate.py check)
+REQUEST_DETAIL = """
+    SELECT r.*, u.name as hospital_name
+    FROM requests r
+    LEFT JOIN users u ON r.hospital_id = u.id
+    WHERE r.id = %s
+"""
+HOSPITAL_LIST = """
+    SELECT id, name, email, location
+    FROM users WHERE role='hospital'
+"""
+DASHBOARD_STATS = """
+    SELECT
+        (SELECT COUNT(*) FROM users WHERE role = 'donor') AS total_donors,
+        (SELECT COUNT(*) FROM users WHERE role = 'hospital') AS total_hospitals,
+        (SELECT COALESCE(SUM(units), 0) FROM inventory) AS total_units,
+        (SELECT COUNT(*) FROM requests WHERE status = 'pending') AS pending_requests
+"""
+
+
+def _parse_date(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ListError(f"❌ Invalid date '{value}', expected YYYY-MM-DD")
+
+
+def _parse_datetime(value, end):
+    try:
+        if len(value) == 10:
+            # A bare date covers the whole day
+            return datetime.fromisoformat(value + (" 23:59:59" if end else " 00:00:00"))
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ListError(f"❌ Invalid date '{value}', expected YYYY-MM-DD[ HH:MM:SS]")
+
+
+def encode_cursor(values):
+    raw = json.dumps([
+        v.isoformat(sep=" ") if isinstance(v, datetime) else v.isoformat() if isinstance(v, date) else v
+        for v in values
+    ])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except ValueError:
+        raise ListError("❌ Invalid cursor")
+    if not isinstance(values, list) or len(values) != 2:
+        raise ListError("❌ Invalid cursor")
+    return values
+
+
+def parse_fields(spec, args):
+    raw = args.get("fields")
+    if not raw:
+        return list(spec.fields)
+    fields = [f.strip() for f in raw.split(",") if f.strip()]
+    unknown = [f for f in fields if f not in spec.fields]
+    if unknown:
+        raise ListError(f"❌ Unknown field(s): {', '.join(unknown)}. Allowed: {', '.join(spec.fields)}")
+    return fields
+
+
+def parse_limit(args):
+    try:
+        limit = int(args.get("limit", DEFAULT_LIMIT))
+    except ValueError:
+        raise ListError("❌ 'limit' must be an integer")
+    return max(1, min(limit, MAX_LIMIT))
+
+
+# ✅ WHERE clause + params for the filters present in the query string
+def build_filters(spec, args):
+    conditions = [spec.where_sql] if spec.where_sql else []
+    params = []
+    for arg, (condition, parse) in spec.filters.items():
+        value = args.get(arg)
+        if value in (None, ""):
+            continue
+        try:
+            params.append(parse(value))
+        except ValueError:
+            raise ListError(f"❌ Invalid value for '{arg}'")
+        conditions.append(condition)
+    return conditions, params
+
+
+# ✅ Keyset condition: rows strictly after the cursor in (key1, key2) order.
+# Written as an OR of range predicates so MySQL can use the (key1, key2) index.
+def _after_cursor(spec, cursor_values):
+    first, second = (spec.fields[k] for k in spec.key)
+    op = "<" if spec.descending else ">"
+    first_value, second_value = cursor_values
+    if first_value is None:
+        # NULLs sort first ascending / last descending
+        if spec.descending:
+            return f"({first} IS NULL AND {second} {op} %s)", [second_value]
+        return f"(({first} IS NULL AND {second} {op} %s) OR {first} IS NOT NULL)", [second_value]
+    return (
+        f"({first} {op} %s OR ({first} = %s AND {second} {op} %s))",
+        [first_value, first_value, second_value],
+    )
+
+
+# Keyset columns are always fetched (after the requested fields) so the next
+# cursor can be built
+def select_columns(spec, fields):
+    return list(dict.fromkeys([*fields, *spec.key]))
+
+
+def build_select(spec, fields, conditions, params, cursor=None, limit=None):
+    columns = select_columns(spec, fields)
+    select = ", ".join(f"{spec.fields[c]} AS {c}" for c in columns)
+
+    conditions = list(conditions)
+    params = list(params)
+    if cursor is not None:
+        condition, cursor_params = _after_cursor(spec, decode_cursor(cursor))
+        conditions.append(condition)
+        params.extend(cursor_params)
+
+    direction = "DESC" if spec.descending else "ASC"
+    order = ", ".join(f"{spec.fields[k]} {direction}" for k in spec.key)
+
+    sql = f"SELECT {select} {spec.from_sql}"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += f" ORDER BY {order}"
+    if limit is not None:
+        sql += " LIMIT %s"
+        params.append(limit)
+    return sql, params
+
+
+def build_count(spec, conditions, params):
+    sql = f"SELECT COUNT(*) AS total {spec.from_sql}"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    return sql, list(params)
+
+
+# ✅ Everything a list call needs, parsed from the query string (no I/O), so the
+# sync and async servers share it: select/count are (sql, params), count may be None.
+# Rows are plain tuples in select_columns() order; key_index is where the keyset
+# columns sit in them.
+ListPlan = namedtuple("ListPlan", "fields key_index limit select count")
+
+
+def plan_list(spec, args):
+    fields = parse_fields(spec, args)
+    conditions, params = build_filters(spec, args)
+    columns = select_columns(spec, fields)
+    key_index = tuple(columns.index(k) for k in spec.key)
+
+    paged = "limit" in args or "cursor" in args
+    if not paged:
+        return ListPlan(fields, key_index, None, build_select(spec, fields, conditions, params), None)
+
+    limit = parse_limit(args)
+    select = build_select(spec, fields, conditions, params, args.get("cursor"), limit + 1)
+    count = None
+    if args.get("count", "1") not in ("0", "false", "no"):
+        count = build_count(spec, conditions, params)
+    return ListPlan(fields, key_index, limit, select, count)
+
+
+# ✅ The JSON body for tuple rows, as bytes: the legacy bare list when no paging
+# args were given, otherwise {"items", "next_cursor", "total"} (total is skipped
+# with count=0).
+def render_list(spec, plan, rows, total=None):
+    if plan.limit is None:
+        return dumps_rows(plan.fields, rows)
+
+    next_cursor = None
+    if len(rows) > plan.limit:
+        rows = rows[:plan.limit]
+        next_cursor = encode_cursor([rows[-1][i] for i in plan.key_index])
+
+    page = {"next_cursor": next_cursor}
+    if plan.count is not None:
+        page["total"] = total
+    # "items" sorts first, so it is spliced in front of the other keys
+    return b'{"items":' + dumps_rows(plan.fields, rows) + b"," + dumps(page)[1:]
+
+
+# ✅ Run one page of a list endpoint on a pooled connection (prepared statements)
+def fetch_list(conn, spec, args):
+    plan = plan_list(spec, args)
+    rows = conn.query(*plan.select)
+    total = None
+    if plan.count is not None:
+        total = conn.query(*plan.count)[0][0]
+    return render_list(spec, plan, rows, total)
@@ -0,0 +1,84 @@
+import os
+from datetime import date, timedelta
+
+from blood_groups import COMPATIBLE_DONORS
+
+# Minimum days between whole-blood donations
+DEFERRAL_DAYS = int(os.getenv("DONOR_DEFERRAL_DAYS", 56))
+
+URGENCY_LIMITS = {"routine": 25, "urgent": 50, "critical": 200}
+MAX_MATCHES = 500
+
+
+# ✅ Find eligible donors for a recipient in one round trip.
+#
+# Every (donor group, location pass) pair becomes its own small
+# "ORDER BY last_donation_date LIMIT n" subquery, which MySQL answers straight
+# from idx_donors_match (blood_group, location, last_donation_date) or
+# idx_donors_group_last (blood_group, last_donation_date) without sorting the
+# whole donor table. The UNION ALL is then ranked by:
+#   1. same location before elsewhere (elsewhere is only searched for critical
+#      requests or when no location is given)
+#   2. identical group before merely compatible groups
+#   3. longest rested first (never donated counts as longest)
+def match_query(recipient_group, location=None, urgency="routine", limit=None, today=None):
+    groups = COMPATIBLE_DONORS[recipient_group]
+    limit = URGENCY_LIMITS[urgency] if limit is None else min(limit, MAX_MATCHES)
+    cutoff = (today or date.today()) - timedelta(days=DEFERRAL_DAYS)
+
+    passes = []
+    if location:
+        passes.append(("d.location = %s", location, 0))
+    if not location or urgency == "critical":
+        passes.append(("d.location <> %s", location, 1) if location else (None, None, 1))
+
+    parts, params = [], []
+    for location_sql, location_value, location_rank in passes:
+        for group_rank, group in enumerate(groups):
+            conditions = ["d.blood_group = %s"]
+            part_params = [group]
+            if location_sql:
+                conditions.append(location_sql)
+                part_params.append(location_value)
+            conditions.append("(d.last_donation_date IS NULL OR d.last_donation_date <= %s)")
+            part_params.append(cutoff)
+
+            parts.append(f"""
+                (SELECT d.id AS donor_id, d.user_id, u.name, u.email,
+                        d.blood_group, d.location, d.last_donation_date,
+                        {location_rank} AS location_rank, {group_rank} AS group_rank
+                 FROM donors d
+                 JOIN users u ON u.id = d.user_id
+                 WHERE {' AND '.join(conditions)}
+                 ORDER BY d.last_donation_date
+                 LIMIT %s)
+            """)
+            params.extend(part_params + [limit])
+
+    return (
+        " UNION ALL ".join(parts)
+        + " ORDER BY location_rank, group_rank, last_donation_date LIMIT %s",
+        params + [limit]
+    )
+
+
+def match_donors(cur, recipient_group, location=None, urgency="routine", limit=None, today=None):
+    today = today or date.today()
+    cur.execute(*match_query(recipient_group, location, urgency, limit, today))
+
+    matches = []
+    for row in cur.fetchall():
+        last = row["last_donation_date"]
+        matches.append({
+            "donor_id": row["donor_id"],
+            "user_id": row["user_id"],
+            "name": row["name"],
+            "email": row["email"],
+            "blood_group": row["blood_group"],
+            "location": row["location"],
+            "last_donation_date": last,
+            "days_since_donation": (today - last).days if last else None,
+            "exact_match": row["group_rank"] == 0,
+            "same_location": bool(location) and row["location_rank"] == 0,
+        })
+    return matches
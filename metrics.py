@@ -0,0 +1,293 @@
+import multiprocessing
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+
+from flask import Response, g, jsonify, request
+
+# ✅ Metrics settings (all overridable from the environment)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", 200))    # log statements slower than this
+SLOW_QUERY_KEEP = int(os.getenv("SLOW_QUERY_KEEP", 100))  # recent slow queries kept per process
+
+# Histogram upper bounds in seconds (the last bucket is +Inf)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATUS_CLASSES = ("1xx", "2xx", "3xx", "4xx", "5xx")
+DB_OPS = ("connect", "execute", "fetch")
+UNMATCHED = "<unmatched>"
+
+# Shared-memory layout, one block per series: bucket counts (len(BUCKETS) + 1)
+# then extra integer counters; plus a block of float sums per series
+_N_BUCKETS = len(BUCKETS) + 1
+_ROUTE_INTS = _N_BUCKETS + 2        # + response bytes, rows fetched
+_ROUTE_FLOATS = 2                   # duration, time spent in MySQL
+_DB_INTS = _N_BUCKETS + 1           # + rows (fetch) / slow statements (execute)
+
+
+class _Histograms:
+    """Fixed set of series in shared memory, so every worker forked from the
+    loaded app adds to the same numbers and any of them can answer a scrape."""
+
+    def __init__(self, n_series, ints, floats):
+        self.ints = ints
+        self.floats = floats
+        self._counts = multiprocessing.RawArray("q", n_series * ints)
+        self._sums = multiprocessing.RawArray("d", n_series * floats)
+
+    def observe(self, series, seconds, extra_ints=(), extra_floats=()):
+        base = series * self.ints
+        self._counts[base + bisect_left(BUCKETS, seconds)] += 1
+        for i, value in enumerate(extra_ints):
+            self._counts[base + _N_BUCKETS + i] += value
+        fbase = series * self.floats
+        self._sums[fbase] += seconds
+        for i, value in enumerate(extra_floats, 1):
+            self._sums[fbase + i] += value
+
+    def add(self, series, slot, value):
+        self._counts[series * self.ints + _N_BUCKETS + slot] += value
+
+    def read(self, series):
+        base, fbase = series * self.ints, series * self.floats
+        return list(self._counts[base:base + self.ints]), list(self._sums[fbase:fbase + self.floats])
+
+
+_lock = multiprocessing.Lock()
+_db = _Histograms(len(DB_OPS), _DB_INTS, 1)
+_routes = None          # _Histograms, sized once the app's routes are known
+_series = {}            # (rule, method) -> first series index (one per status class)
+_local = threading.local()
+slow_queries = deque(maxlen=SLOW_QUERY_KEEP)
+
+
+# ✅ DB timing, fed by db.py (pool connects, cursor execute / fetch)
+def observe_db(op, seconds, rows=0):
+    with _lock:
+        _db.observe(DB_OPS.index(op), seconds, (rows,) if rows else ())
+    # Per-request totals, reported with the route
+    _local.db_seconds = getattr(_local, "db_seconds", 0.0) + seconds
+    if rows:
+        _local.rows = getattr(_local, "rows", 0) + rows
+
+
+def _param_shape(params):
+    if params is None:
+        return "()"
+    if isinstance(params, dict):
+        return "{" + ", ".join(f"{k}: {type(v).__name__}" for k, v in params.items()) + "}"
+    params = list(params)
+    if params and isinstance(params[0], (list, tuple)):
+        # executemany: one shape for the whole batch
+        return f"{len(params)} x {_param_shape(params[0])}"
+    return "(" + ", ".join(type(v).__name__ for v in params) + ")"
+
+
+# Statement text and parameter types only: values may be personal data
+def slow_query(sql, params, seconds):
+    with _lock:
+        _db.add(DB_OPS.index("execute"), 0, 1)
+    entry = {
+        "ms": round(seconds * 1000, 1),
+        "route": getattr(_local, "route", None),
+        "sql": " ".join(sql.split()),
+        "params": _param_shape(params),
+        "at": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    slow_queries.append(entry)
+    print(f"⚠️ Slow query {entry['ms']} ms [{entry['route'] or '-'}] {entry['sql']} params={entry['params']}")
+
+
+class TimedCursor:
+    """Cursor proxy that times execute / fetch calls (see db.PooledConnection)."""
+
+    def __init__(self, raw):
+        self._raw = raw
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def _run(self, method, sql, params):
+        started = time.perf_counter()
+        try:
+            return method(sql, params)
+        finally:
+            elapsed = time.perf_counter() - started
+            observe_db("execute", elapsed)
+            if elapsed * 1000 >= SLOW_QUERY_MS:
+                slow_query(sql, params, elapsed)
+
+    def execute(self, sql, params=None):
+        return self._run(self._raw.execute, sql, params)
+
+    def executemany(self, sql, seq_params):
+        return self._run(self._raw.executemany, sql, seq_params)
+
+    def _fetch(self, method, *args):
+        started = time.perf_counter()
+        result = method(*args)
+        if result is None:
+            rows = 0
+        elif isinstance(result, list):
+            rows = len(result)
+        else:
+            rows = 1
+        observe_db("fetch", time.perf_counter() - started, rows)
+        return result
+
+    def fetchone(self):
+        return self._fetch(self._raw.fetchone)
+
+    def fetchall(self):
+        return self._fetch(self._raw.fetchall)
+
+    def fetchmany(self, size=1):
+        return self._fetch(self._raw.fetchmany, size)
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+
+# ✅ Request timing: one series per (route, method, status class)
+def _before():
+    _local.db_seconds = 0.0
+    _local.rows = 0
+    _local.route = request.url_rule.rule if request.url_rule else UNMATCHED
+    g.metrics_started = time.perf_counter()
+
+
+def _after(response):
+    started = g.pop("metrics_started", None)
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    base = _series.get((_local.route, request.method))
+    if base is None:
+        base = _series[(UNMATCHED, "*")]
+    status = min(max(response.status_code // 100, 1), 5) - 1
+    with _lock:
+        _routes.observe(
+            base + status, elapsed,
+            (response.content_length or 0, _local.rows),
+            (_local.db_seconds,),
+        )
+    return response
+
+
+def install(app):
+    """Instrument every route registered so far and add GET /metrics.
+    Call after the routes are defined and before the server forks."""
+    global _routes
+    if not METRICS_ENABLED:
+        return
+
+    app.add_url_rule("/metrics", "metrics", render_metrics)
+    app.add_url_rule("/api/metrics/slow-queries", "slow_queries", recent_slow_queries)
+    keys = sorted({
+        (rule.rule, method)
+        for rule in app.url_map.iter_rules()
+        for method in rule.methods - {"HEAD", "OPTIONS"}
+    })
+    keys.append((UNMATCHED, "*"))
+    for i, key in enumerate(keys):
+        _series[key] = i * len(STATUS_CLASSES)
+    _routes = _Histograms(len(keys) * len(STATUS_CLASSES), _ROUTE_INTS, _ROUTE_FLOATS)
+    # First in line, so the clock also covers the other before_request hooks
+    app.before_request_funcs.setdefault(None, []).insert(0, _before)
+    app.after_request(_after)
+
+
+def recent_slow_queries():
+    return jsonify(list(slow_queries)), 200
+
+
+# ✅ Prometheus text exposition
+def _labels(**labels):
+    return ",".join(f'{k}="{v}"' for k, v in labels.items())
+
+
+def _histogram_lines(name, labels, counts, total_seconds):
+    lines, running = [], 0
+    for bound, count in zip((*BUCKETS, "+Inf"), counts[:_N_BUCKETS]):
+        running += count
+        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {running}')
+    lines.append(f"{name}_sum{{{labels}}} {total_seconds:.6f}")
+    lines.append(f"{name}_count{{{labels}}} {running}")
+    return lines
+
+
+def render_metrics():
+    from db import pool, replicas
+
+    request_lines, db_time, size, rows = [], [], [], []
+    for (rule, method), base in sorted(_series.items()):
+        for status_index, status in enumerate(STATUS_CLASSES):
+            counts, sums = _routes.read(base + status_index)
+            if not any(counts[:_N_BUCKETS]):
+                continue
+            labels = _labels(route=rule, method=method, status=status)
+            request_lines += _histogram_lines("bloodbank_http_request_duration_seconds", labels, counts, sums[0])
+            db_time.append(f"bloodbank_http_request_db_seconds_total{{{labels}}} {sums[1]:.6f}")
+            size.append(f"bloodbank_http_response_bytes_total{{{labels}}} {counts[_N_BUCKETS]}")
+            rows.append(f"bloodbank_http_rows_fetched_total{{{labels}}} {counts[_N_BUCKETS + 1]}")
+
+    db_lines = []
+    for index, op in enumerate(DB_OPS):
+        counts, sums = _db.read(index)
+        db_lines += _histogram_lines("bloodbank_db_duration_seconds", _labels(op=op), counts, sums[0])
+    fetch_counts, _ = _db.read(DB_OPS.index("fetch"))
+    execute_counts, _ = _db.read(DB_OPS.index("execute"))
+
+    stats = pool.stats()
+    routing = replicas.stats()
+    up, lag, reads = [], [], [f'bloodbank_db_reads_total{{target="primary"}} {routing["primary_reads"]}']
+    for replica in routing["replicas"]:
+        labels = _labels(replica=replica["name"])
+        up.append(f"bloodbank_db_replica_up{{{labels}}} {int(replica['healthy'])}")
+        if replica["lag"] is not None:
+            lag.append(f"bloodbank_db_replica_lag_seconds{{{labels}}} {replica['lag']}")
+        reads.append(f'bloodbank_db_reads_total{{target="replica",{labels}}} {replica["reads"]}')
+    out = [
+        "# HELP bloodbank_http_request_duration_seconds Request latency by route, method and status class.",
+        "# TYPE bloodbank_http_request_duration_seconds histogram",
+        *request_lines,
+        "# HELP bloodbank_http_request_db_seconds_total Time spent in MySQL calls while serving the route.",
+        "# TYPE bloodbank_http_request_db_seconds_total counter",
+        *db_time,
+        "# HELP bloodbank_http_response_bytes_total Response body bytes (streamed bodies are not counted).",
+        "# TYPE bloodbank_http_response_bytes_total counter",
+        *size,
+        "# HELP bloodbank_http_rows_fetched_total Rows read from MySQL while serving the route.",
+        "# TYPE bloodbank_http_rows_fetched_total counter",
+        *rows,
+        "# HELP bloodbank_db_duration_seconds MySQL time by phase: connect, execute, fetch.",
+        "# TYPE bloodbank_db_duration_seconds histogram",
+        *db_lines,
+        "# HELP bloodbank_db_rows_fetched_total Rows fetched from MySQL.",
+        "# TYPE bloodbank_db_rows_fetched_total counter",
+        f"bloodbank_db_rows_fetched_total {fetch_counts[_N_BUCKETS]}",
+        f"# HELP bloodbank_db_slow_queries_total Statements slower than {SLOW_QUERY_MS:g} ms.",
+        "# TYPE bloodbank_db_slow_queries_total counter",
+        f"bloodbank_db_slow_queries_total {execute_counts[_N_BUCKETS]}",
+        "# HELP bloodbank_db_pool_connections Connections in this worker's pool.",
+        "# TYPE bloodbank_db_pool_connections gauge",
+        f'bloodbank_db_pool_connections{{state="in_use"}} {stats["in_use"]}',
+        f'bloodbank_db_pool_connections{{state="idle"}} {stats["idle"]}',
+        "# HELP bloodbank_db_pool_timeouts_total Pool acquires that gave up waiting (this worker).",
+        "# TYPE bloodbank_db_pool_timeouts_total counter",
+        f"bloodbank_db_pool_timeouts_total {stats['timeouts']}",
+    ]
+    if routing["replicas"]:
+        out += [
+            "# HELP bloodbank_db_replica_up 1 if the replica passed its last health check.",
+            "# TYPE bloodbank_db_replica_up gauge",
+            *up,
+            "# HELP bloodbank_db_replica_lag_seconds Replication lag at the last health check.",
+            "# TYPE bloodbank_db_replica_lag_seconds gauge",
+            *lag,
+            "# HELP bloodbank_db_reads_total Reads that could use a replica, by where they were served (this worker).",
+            "# TYPE bloodbank_db_reads_total counter",
+            *reads,
+        ]
+    return Response("\n".join(out) + "\n", content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,213 @@
+"""Versioned schema migrations for the MySQL database.
+
+Migrations are the numbered files in mysql/migrations (NNNN_description.sql),
+applied in order and recorded in the schema_migrations table:
+
+    python migrate.py              # apply everything not applied yet
+    python migrate.py status       # applied / pending, and files edited after applying
+    python migrate.py check        # EXPLAIN the routes' queries; exit 1 on a full table scan
+
+Databases created from an older mysql/schema.sql already hold some of these
+tables, columns and indexes. A statement that fails only because its object
+already exists is skipped, so such a database can simply run `python migrate.py`.
+Uses the usual DB_HOST / DB_USER / DB_PASS / DB_NAME settings and creates the
+database if needed.
+"""
+import argparse
+import glob
+import hashlib
+import os
+import re
+import sys
+from datetime import date, timedelta
+
+import mysql.connector
+
+from db import DB_CONFIG
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mysql", "migrations")
+LOCK_NAME = "bloodbank-migrate"
+ALREADY_EXISTS = {
+    1050: "table already exists",
+    1060: "column already exists",
+    1061: "index already exists",
+}
+# A full scan is only reported on tables at least this big; on small tables
+# MySQL rightly prefers scanning to an index
+CHECK_MIN_ROWS = int(os.getenv("MIGRATE_CHECK_MIN_ROWS", 1000))
+
+
+def connect():
+    config = {key: value for key, value in DB_CONFIG.items() if key != "database"}
+    conn = mysql.connector.connect(**config)
+    cur = conn.cursor()
+    cur.execute(f"CREATE DATABASE IF NOT EXISTS `{DB_CONFIG['database']}`")
+    cur.execute(f"USE `{DB_CONFIG['database']}`")
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+          version INT PRIMARY KEY,
+          name VARCHAR(200) NOT NULL,
+          checksum CHAR(64) NOT NULL,
+          applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    return conn
+
+
+# ✅ Migration files: [(version, name, path)] in order
+def discover():
+    migrations = []
+    for path in sorted(glob.glob(os.path.join(MIGRATIONS_DIR, "*.sql"))):
+        match = re.match(r"(\d+)_(.+)\.sql$", os.path.basename(path))
+        if not match:
+            sys.exit(f"❌ Bad migration file name: {path} (expected NNNN_description.sql)")
+        migrations.append((int(match.group(1)), match.group(2), path))
+    versions = [version for version, _, _ in migrations]
+    if len(set(versions)) != len(versions):
+        sys.exit("❌ Two migration files share a version number")
+    return migrations
+
+
+def read_migration(path):
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    checksum = hashlib.sha256(text.encode()).hexdigest()
+    # Full-line comments only; statements end with ';' at the end of a line
+    lines = [line for line in text.splitlines() if not line.lstrip().startswith("--")]
+    statements = [s.strip() for s in re.split(r";\s*$", "\n".join(lines), flags=re.M)]
+    return [s for s in statements if s], checksum
+
+
+def applied(cur):
+    cur.execute("SELECT version, name, checksum, applied_at FROM schema_migrations ORDER BY version")
+    return {row[0]: row[1:] for row in cur.fetchall()}
+
+
+# ✅ Apply pending migrations, one cluster-wide runner at a time
+def migrate():
+    conn = connect()
+    cur = conn.cursor()
+    cur.execute("SELECT GET_LOCK(%s, 60)", (LOCK_NAME,))
+    if cur.fetchone()[0] != 1:
+        sys.exit("❌ Another migration run holds the lock")
+    try:
+        done = applied(cur)
+        pending = [m for m in discover() if m[0] not in done]
+        if not pending:
+            print("✅ Schema is up to date")
+            return
+        for version, name, path in pending:
+            statements, checksum = read_migration(path)
+            print(f"→ {version:04d} {name}")
+            for statement in statements:
+                try:
+                    cur.execute(statement)
+                except mysql.connector.Error as e:
+                    if e.errno not in ALREADY_EXISTS:
+                        print(f"❌ {version:04d} {name} failed: {e}\n{statement}")
+                        raise SystemExit(1)
+                    print(f"   skipped ({ALREADY_EXISTS[e.errno]}): {statement.splitlines()[0]}")
+            # DDL commits implicitly in MySQL, so a migration is recorded once all
+            # its statements went through; a failed one is simply re-run
+            cur.execute(
+                "INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+                (version, name, checksum),
+            )
+        print(f"✅ Applied {len(pending)} migration(s)")
+    finally:
+        cur.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+        cur.fetchall()
+        conn.close()
+
+
+def status():
+    conn = connect()
+    cur = conn.cursor()
+    done = applied(cur)
+    conn.close()
+    for version, name, path in discover():
+        _, checksum = read_migration(path)
+        if version not in done:
+            print(f"  pending  {version:04d} {name}")
+        elif done[version][1] != checksum:
+            print(f"  CHANGED  {version:04d} {name} (file edited after it was applied)")
+        else:
+            print(f"  applied  {version:04d} {name}  {done[version][2]}")
+
+
+# ✅ Query plan check: the statements behind the routes, as the app builds them
+def route_queries():
+    from allocation import PENDING_QUEUE
+    from blood_units import ISSUE_UNITS
+    from entities import DONOR_OWNER_QUERY, PERSON_QUERY, USER_BY_EMAIL
+    from geo import nearby_query
+    from listing import DASHBOARD_STATS, HOSPITAL_LIST, REQUEST_DETAIL
+    from listing import DONATION_LIST, DONOR_LIST, REQUEST_LIST, UNIT_LIST, plan_list
+    from matching import match_query
+    from rollups import HISTORY_QUERY
+
+    def page(spec, **args):
+        return plan_list(spec, {"limit": "50", **args}).select
+
+    today = date.today()
+    return [
+        ("login", (USER_BY_EMAIL, ["admin@bloodbank.com"])),
+        ("hospitals", (HOSPITAL_LIST, [])),
+        ("stats", (DASHBOARD_STATS, [])),
+        ("request by id", (REQUEST_DETAIL, [1])),
+        ("person by user", (PERSON_QUERY, [1])),
+        ("donor owner", (DONOR_OWNER_QUERY, [1])),
+        ("requests page", page(REQUEST_LIST)),
+        ("requests by hospital", page(REQUEST_LIST, hospital_id="2")),
+        ("requests by status", page(REQUEST_LIST, status="pending")),
+        ("requests by group", page(REQUEST_LIST, blood_group="A+")),
+        ("donors page", page(DONOR_LIST)),
+        ("donations by donor", page(DONATION_LIST, donor_id="1")),
+        ("units by group", page(UNIT_LIST, blood_group="O-", status="available")),
+        ("pending queue", (PENDING_QUEUE, [])),
+        ("issue units", (ISSUE_UNITS, [0, "A+", today, 2])),
+        ("forecast history", (HISTORY_QUERY, [today - timedelta(days=28), today])),
+        ("nearby donors", nearby_query("donors", 10.7867, 76.6548, 20, 50, "A+")),
+        ("nearby hospitals", nearby_query("hospitals", 10.7867, 76.6548, 20, 50)),
+        ("donor match", match_query("A+", "Palghat", "critical", today=today)),
+    ]
+
+
+def check(min_rows):
+    from db import db_connection
+
+    failures = 0
+    with db_connection() as conn:
+        cur = conn.cursor(dictionary=True)
+        for name, (sql, params) in route_queries():
+            cur.execute("EXPLAIN " + sql, params)
+            for row in cur.fetchall():
+                if row["table"] is None:
+                    continue  # constant or optimized-away part of the plan
+                scan = row["type"] == "ALL" and (row["rows"] or 0) >= min_rows
+                failures += scan
+                print(f"{'FULL SCAN' if scan else 'ok':<10} {name:<22} table={row['table']} "
+                      f"type={row['type']} key={row['key']} rows={row['rows']}")
+    if failures:
+        print(f"❌ {failures} full table scan(s) on tables of {min_rows}+ rows")
+        sys.exit(1)
+    print("✅ No route query scans a whole table")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", nargs="?", default="up", choices=["up", "status", "check"])
+    parser.add_argument("--min-rows", type=int, default=CHECK_MIN_ROWS,
+                        help="only report full scans of tables at least this big (check)")
+    args = parser.parse_args()
+
+    if args.command == "status":
+        status()
+    elif args.command == "check":
+        check(args.min_rows)
+    else:
+        migrate()
+
+
+if __name__ == "__main__":
+    main()
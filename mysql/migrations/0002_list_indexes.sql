@@ -0,0 +1,10 @@
+-- Keyset pagination and filters of /api/request and /api/donors, hospitals by role, stats counters
+ALTER TABLE users ADD INDEX idx_users_role_name (role, name, id);
+
+ALTER TABLE requests ADD INDEX idx_requests_created (created_at, id);
+
+ALTER TABLE requests ADD INDEX idx_requests_status_created (status, created_at, id);
+
+ALTER TABLE requests ADD INDEX idx_requests_hospital_created (hospital_id, created_at, id);
+
+ALTER TABLE requests ADD INDEX idx_requests_group_created (blood_group, created_at, id);
@@ -0,0 +1,14 @@
+-- One row per recorded donation (single and bulk)
+CREATE TABLE IF NOT EXISTS donations (
+  id INT PRIMARY KEY AUTO_INCREMENT,
+  donor_id INT NOT NULL,
+  blood_group VARCHAR(5) NOT NULL,
+  quantity INT NOT NULL DEFAULT 1,
+  donation_date DATE NOT NULL,
+  batch_id CHAR(32),
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  INDEX idx_donations_donor_date (donor_id, donation_date),
+  INDEX idx_donations_date (donation_date, id),
+  INDEX idx_donations_batch (batch_id),
+  FOREIGN KEY (donor_id) REFERENCES users(id) ON DELETE CASCADE
+);
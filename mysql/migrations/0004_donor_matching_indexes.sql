@@ -0,0 +1,4 @@
+-- /api/donors/match: compatible group + location, ordered by last donation
+ALTER TABLE donors ADD INDEX idx_donors_match (blood_group, location, last_donation_date);
+
+ALTER TABLE donors ADD INDEX idx_donors_group_last (blood_group, last_donation_date);
@@ -0,0 +1,6 @@
+-- Priority allocation: request urgency and the group the units came from
+ALTER TABLE requests
+  ADD COLUMN urgency ENUM('routine','urgent','critical') NOT NULL DEFAULT 'routine' AFTER status;
+
+ALTER TABLE requests
+  ADD COLUMN fulfilled_group VARCHAR(5) AFTER urgency;
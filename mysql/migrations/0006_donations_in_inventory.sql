@@ -0,0 +1,3 @@
+-- Write-behind inventory: whether a donation's units are in `inventory` yet.
+-- Journal replay is keyed by donation and flips this in the same transaction.
+ALTER TABLE donations ADD COLUMN in_inventory TINYINT(1) NOT NULL DEFAULT 1;
@@ -0,0 +1,17 @@
+-- One row per donated bag; inventory.units stays the per-group count of usable units
+CREATE TABLE IF NOT EXISTS blood_units (
+  id BIGINT PRIMARY KEY AUTO_INCREMENT,
+  donation_id INT NOT NULL,
+  blood_group VARCHAR(5) NOT NULL,
+  component ENUM('whole_blood','red_cells','plasma','platelets') NOT NULL DEFAULT 'whole_blood',
+  collected_on DATE NOT NULL,
+  expires_on DATE NOT NULL,
+  status ENUM('available','issued','expired','discarded') NOT NULL DEFAULT 'available',
+  request_id INT,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  INDEX idx_units_fifo (blood_group, status, expires_on, id),
+  INDEX idx_units_expiry (expires_on, id),
+  INDEX idx_units_request (request_id),
+  INDEX idx_units_donation (donation_id),
+  FOREIGN KEY (donation_id) REFERENCES donations(id) ON DELETE CASCADE
+);
@@ -0,0 +1,18 @@
+-- One donors row per user. Older code could insert a second row for the same
+-- user; keep the oldest (its id is what clients know), carry over the latest
+-- donation date, drop the rest, then enforce it. The unique key also serves
+-- every donors-by-user_id lookup and the users/donors join.
+UPDATE donors keep
+JOIN (
+  SELECT user_id, MIN(id) AS id, MAX(last_donation_date) AS last_date
+  FROM donors
+  WHERE user_id IS NOT NULL
+  GROUP BY user_id
+  HAVING COUNT(*) > 1
+) dup ON dup.id = keep.id
+SET keep.last_donation_date = dup.last_date;
+
+DELETE d FROM donors d
+JOIN donors keep ON keep.user_id = d.user_id AND keep.id < d.id;
+
+ALTER TABLE donors ADD UNIQUE INDEX uq_donors_user (user_id);
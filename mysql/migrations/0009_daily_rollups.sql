@@ -0,0 +1,11 @@
+-- Per day x blood group unit counts, kept up to date by the write paths (see rollups.py).
+-- Fill it from existing data with `python rollups.py backfill`.
+CREATE TABLE IF NOT EXISTS daily_rollups (
+  day DATE NOT NULL,
+  blood_group VARCHAR(5) NOT NULL,
+  requested INT NOT NULL DEFAULT 0,
+  issued INT NOT NULL DEFAULT 0,
+  donated INT NOT NULL DEFAULT 0,
+  expired INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (day, blood_group)
+);
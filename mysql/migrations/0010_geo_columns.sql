@@ -0,0 +1,10 @@
+-- Geocoded locations for radius search (GET /api/nearby). Fill existing rows
+-- with `python geo.py backfill`.
+ALTER TABLE users ADD COLUMN lat DOUBLE;
+ALTER TABLE users ADD COLUMN lon DOUBLE;
+ALTER TABLE users ADD COLUMN geohash CHAR(7);
+ALTER TABLE users ADD INDEX idx_users_role_geo (role, geohash);
+ALTER TABLE donors ADD COLUMN lat DOUBLE;
+ALTER TABLE donors ADD COLUMN lon DOUBLE;
+ALTER TABLE donors ADD COLUMN geohash CHAR(7);
+ALTER TABLE donors ADD INDEX idx_donors_geo (geohash);
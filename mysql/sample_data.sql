@@ -8,5 +8,5 @@ INSERT INTO users (name, email, password, role) VALUES
 INSERT INTO donors (user_id, blood_group, location, last_donation_date) VALUES
 (1, 'A+', 'Palghat', '2025-08-01');
 
-INSERT INTO inventory (blood_group, units_available) VALUES
+INSERT INTO inventory (blood_group, units) VALUES
 ('A+', 10), ('B+', 5), ('O-', 2);
@@ -1,3 +1,5 @@
+-- Current schema in one file for a fresh install. Existing databases are
+-- upgraded with `python migrate.py` (mysql/migrations); keep both in step.
 CREATE DATABASE IF NOT EXISTS bloodbank;
 USE bloodbank;
 
@@ -8,7 +10,12 @@ CREATE TABLE IF NOT EXISTS users (
   password VARCHAR(255),
   role ENUM('admin','donor','hospital') DEFAULT 'donor',
   blood_group VARCHAR(5),
-  location VARCHAR(100)
+  location VARCHAR(100),
+  lat DOUBLE,            -- geocoded from location (geo.py)
+  lon DOUBLE,
+  geohash CHAR(7),
+  INDEX idx_users_role_name (role, name, id),
+  INDEX idx_users_role_geo (role, geohash)
 );
 
 CREATE TABLE IF NOT EXISTS donors (
@@ -17,7 +24,14 @@ CREATE TABLE IF NOT EXISTS donors (
   blood_group VARCHAR(5),
   location VARCHAR(100),
   last_donation_date DATE,
-  FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE SET NULL
+  lat DOUBLE,            -- geocoded from location, else the user's (geo.py)
+  lon DOUBLE,
+  geohash CHAR(7),
+  FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE SET NULL,
+  UNIQUE INDEX uq_donors_user (user_id),
+  INDEX idx_donors_match (blood_group, location, last_donation_date),
+  INDEX idx_donors_group_last (blood_group, last_donation_date),
+  INDEX idx_donors_geo (geohash)
 );
 
 CREATE TABLE IF NOT EXISTS inventory (
@@ -31,5 +45,55 @@ CREATE TABLE IF NOT EXISTS requests (
   blood_group VARCHAR(5),
   quantity INT,
   status ENUM('pending','approved','rejected') DEFAULT 'pending',
-  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+  urgency ENUM('routine','urgent','critical') NOT NULL DEFAULT 'routine',
+  fulfilled_group VARCHAR(5),  -- inventory group the units came from (compatible allocation)
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  INDEX idx_requests_created (created_at, id),
+  INDEX idx_requests_status_created (status, created_at, id),
+  INDEX idx_requests_hospital_created (hospital_id, created_at, id),
+  INDEX idx_requests_group_created (blood_group, created_at, id)
+);
+
+CREATE TABLE IF NOT EXISTS donations (
+  id INT PRIMARY KEY AUTO_INCREMENT,
+  donor_id INT NOT NULL,
+  blood_group VARCHAR(5) NOT NULL,
+  quantity INT NOT NULL DEFAULT 1,
+  donation_date DATE NOT NULL,
+  batch_id CHAR(32),
+  in_inventory TINYINT(1) NOT NULL DEFAULT 1,  -- 0 until write-behind adds its units to inventory
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  INDEX idx_donations_donor_date (donor_id, donation_date),
+  INDEX idx_donations_date (donation_date, id),
+  INDEX idx_donations_batch (batch_id),
+  FOREIGN KEY (donor_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+-- One row per donated bag; inventory.units stays the per-group count of usable units
+CREATE TABLE IF NOT EXISTS blood_units (
+  id BIGINT PRIMARY KEY AUTO_INCREMENT,
+  donation_id INT NOT NULL,
+  blood_group VARCHAR(5) NOT NULL,
+  component ENUM('whole_blood','red_cells','plasma','platelets') NOT NULL DEFAULT 'whole_blood',
+  collected_on DATE NOT NULL,
+  expires_on DATE NOT NULL,
+  status ENUM('available','issued','expired','discarded') NOT NULL DEFAULT 'available',
+  request_id INT,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  INDEX idx_units_fifo (blood_group, status, expires_on, id),
+  INDEX idx_units_expiry (expires_on, id),
+  INDEX idx_units_request (request_id),
+  INDEX idx_units_donation (donation_id),
+  FOREIGN KEY (donation_id) REFERENCES donations(id) ON DELETE CASCADE
+);
+
+-- Per day x blood group unit counts, kept up to date by the write paths (see rollups.py)
+CREATE TABLE IF NOT EXISTS daily_rollups (
+  day DATE NOT NULL,
+  blood_group VARCHAR(5) NOT NULL,
+  requested INT NOT NULL DEFAULT 0,
+  issued INT NOT NULL DEFAULT 0,
+  donated INT NOT NULL DEFAULT 0,
+  expired INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (day, blood_group)
 );
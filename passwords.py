@@ -0,0 +1,71 @@
+import hmac
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import bcrypt
+
+# ✅ Password hashing settings (all overridable from the environment)
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))              # cost factor: each +1 doubles the work
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", os.cpu_count() or 2))
+PASSWORD_MAX_PENDING = int(os.getenv("PASSWORD_MAX_PENDING", 64))  # queued + running hash jobs
+PASSWORD_WAIT_TIMEOUT = float(os.getenv("PASSWORD_WAIT_TIMEOUT", 10))
+
+
+class PasswordPoolBusy(Exception):
+    """Raised when too many hash jobs are already queued (reported as HTTP 503)."""
+
+
+# bcrypt releases the GIL while hashing, so a small thread pool spreads the work
+# over all cores without blocking the request threads' Python code; the
+# semaphore bounds how much work can pile up during a login storm.
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_WORKERS, thread_name_prefix="bcrypt")
+_pending = threading.BoundedSemaphore(PASSWORD_MAX_PENDING)
+
+
+def _run(fn, *args):
+    if not _pending.acquire(timeout=PASSWORD_WAIT_TIMEOUT):
+        raise PasswordPoolBusy("Too many password checks in progress, try again shortly")
+    try:
+        return _executor.submit(fn, *args).result()
+    finally:
+        _pending.release()
+
+
+def _secret(password):
+    # bcrypt only looks at the first 72 bytes
+    return password.encode("utf-8")[:72]
+
+
+def is_hashed(stored):
+    return bool(stored) and stored.startswith(("$2a$", "$2b$", "$2y$"))
+
+
+def hash_password(password, rounds=None):
+    salt = bcrypt.gensalt(rounds or BCRYPT_ROUNDS)
+    return _run(bcrypt.hashpw, _secret(password), salt).decode("ascii")
+
+
+# Used for unknown emails so a miss costs as much as a wrong password
+@lru_cache(maxsize=1)
+def _dummy_hash():
+    return bcrypt.hashpw(b"dummy-password", bcrypt.gensalt(BCRYPT_ROUNDS))
+
+
+# ✅ Check a password against what is stored.
+# Returns (ok, needs_rehash): legacy plaintext rows and hashes made with a
+# different cost factor are flagged so login can upgrade them transparently.
+def verify_password(password, stored):
+    if password is None:
+        return False, False
+    if stored is None:
+        _run(bcrypt.checkpw, _secret(password), _dummy_hash())
+        return False, False
+
+    if not is_hashed(stored):
+        return hmac.compare_digest(password.encode("utf-8"), stored.encode("utf-8")), True
+
+    ok = _run(bcrypt.checkpw, _secret(password), stored.encode("ascii"))
+    rounds = int(stored.split("$")[2])
+    return ok, ok and rounds != BCRYPT_ROUNDS
@@ -0,0 +1,212 @@
+"""Daily demand / supply rollups and the shortage forecast built on them.
+
+daily_rollups holds one row per day x blood group with the units requested,
+issued, donated and expired that day. The write paths add to it in the same
+transaction as the change itself, so reading it never needs a GROUP BY over
+requests or donations. For data written before the table existed:
+
+    python rollups.py backfill                     # rebuild everything
+    python rollups.py backfill --since 2024-01-01  # rebuild from a day on
+
+The forecast is computed with numpy (in requirements.txt); without it a plain
+Python fallback gives the same numbers, more slowly.
+"""
+import argparse
+import os
+from collections import defaultdict
+from datetime import date, timedelta
+
+from blood_groups import BLOOD_GROUPS
+
+try:
+    import numpy as np
+except ImportError:  # the forecast falls back to plain Python
+    np = None
+
+COLUMNS = ("requested", "issued", "donated", "expired")
+
+# ✅ Forecast defaults (all overridable from the environment and per call)
+FORECAST_DAYS = int(os.getenv("FORECAST_DAYS", 28))         # days of history looked at
+FORECAST_WINDOW = int(os.getenv("FORECAST_WINDOW", 7))      # moving-average window, in days
+FORECAST_ALPHA = float(os.getenv("FORECAST_ALPHA", 0.3))    # exponential smoothing weight of the latest day
+MAX_FORECAST_DAYS = 365
+
+
+# ✅ Add units to one rollup column. `entries` is an iterable of
+# (day, blood_group, units); repeats are summed into one upsert row each.
+# upsert() only builds the statement, for callers with their own driver (asgi.py).
+def upsert(column, entries):
+    if column not in COLUMNS:
+        raise ValueError(f"Unknown rollup column {column}")
+    totals = defaultdict(int)
+    for day, blood_group, units in entries:
+        totals[(day, blood_group)] += int(units)
+    rows = [(day, blood_group, units) for (day, blood_group), units in totals.items() if units]
+    if not rows:
+        return None
+    return f"""
+        INSERT INTO daily_rollups (day, blood_group, {column})
+        VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE {column} = {column} + VALUES({column})
+    """, rows
+
+
+def record(cur, column, entries):
+    statement = upsert(column, entries)
+    if statement:
+        cur.executemany(*statement)
+
+
+def record_today(cur, column, deltas):
+    today = date.today()
+    record(cur, column, ((today, blood_group, units) for blood_group, units in deltas.items()))
+
+
+# Units about to be marked expired, counted on the day each one expired.
+# Run in the expiring transaction, before the UPDATE.
+def record_expiring(cur, today):
+    cur.execute("""
+        INSERT INTO daily_rollups (day, blood_group, expired)
+        SELECT expires_on, blood_group, COUNT(*) FROM blood_units
+        WHERE status = 'available' AND expires_on < %s
+        GROUP BY expires_on, blood_group
+        ON DUPLICATE KEY UPDATE expired = expired + VALUES(expired)
+    """, (today,))
+
+
+# ✅ Backfill: recompute the rollups from the source tables in one transaction.
+# The approval day is not stored, so backfilled `issued` counts approved requests
+# on the day they were created; live approvals are counted on the day they happen.
+BACKFILL = {
+    "requested": """
+        SELECT DATE(created_at), blood_group, SUM(quantity) FROM requests
+        WHERE created_at >= %s GROUP BY DATE(created_at), blood_group
+    """,
+    "issued": """
+        SELECT DATE(created_at), COALESCE(fulfilled_group, blood_group), SUM(quantity) FROM requests
+        WHERE status = 'approved' AND created_at >= %s
+        GROUP BY DATE(created_at), COALESCE(fulfilled_group, blood_group)
+    """,
+    "donated": """
+        SELECT donation_date, blood_group, SUM(quantity) FROM donations
+        WHERE donation_date >= %s GROUP BY donation_date, blood_group
+    """,
+    "expired": """
+        SELECT expires_on, blood_group, COUNT(*) FROM blood_units
+        WHERE status = 'expired' AND expires_on >= %s GROUP BY expires_on, blood_group
+    """,
+}
+
+
+def backfill(conn, since=None):
+    since = since or date.min
+    cur = conn.cursor()
+    conn.start_transaction()
+    cur.execute("DELETE FROM daily_rollups WHERE day >= %s", (since,))
+    counts = {}
+    for column, sql in BACKFILL.items():
+        cur.execute(f"""
+            INSERT INTO daily_rollups (day, blood_group, {column})
+            {sql}
+            ON DUPLICATE KEY UPDATE {column} = VALUES({column})
+        """, (since,))
+        counts[column] = cur.rowcount
+    conn.commit()
+    return counts
+
+
+HISTORY_QUERY = """
+    SELECT day, blood_group, requested, issued, donated, expired
+    FROM daily_rollups
+    WHERE day >= %s AND day < %s
+"""
+
+
+# ✅ Forecast. Per group, over the last `days` complete days:
+#   outflow = requested + expired, inflow = donated
+# each smoothed (simple exponential smoothing, latest day weighted `alpha`) and
+# averaged over the last `window` days; days_to_stockout = stock / net outflow.
+def load_history(cur, days, today):
+    start = today - timedelta(days=days)
+    cur.execute(HISTORY_QUERY, (start, today))
+    index = {blood_group: i for i, blood_group in enumerate(BLOOD_GROUPS)}
+    series = {column: [[0] * days for _ in BLOOD_GROUPS] for column in COLUMNS}
+    for day, blood_group, *values in cur.fetchall():
+        if blood_group not in index:
+            continue
+        for column, value in zip(COLUMNS, values):
+            series[column][index[blood_group]][(day - start).days] = value
+    return series
+
+
+# Weights of simple exponential smoothing over n days, seeded with the first day:
+# level = (1-a)^(n-1) x0 + sum_k a (1-a)^(n-1-k) xk  (they sum to 1)
+def _smoothing_weights(n, alpha):
+    weights = [alpha * (1 - alpha) ** (n - 1 - k) for k in range(n)]
+    weights[0] = (1 - alpha) ** (n - 1)
+    return weights
+
+
+def _estimates(series, alpha, window):
+    """(smoothed, moving average) per group for a groups x days matrix."""
+    weights = _smoothing_weights(len(series[0]), alpha)
+    if np is not None:
+        matrix = np.asarray(series, dtype=float)
+        return (matrix @ np.asarray(weights)).tolist(), matrix[:, -window:].mean(axis=1).tolist()
+    smoothed = [sum(w * x for w, x in zip(weights, row)) for row in series]
+    averages = [sum(row[-window:]) / window for row in series]
+    return smoothed, averages
+
+
+def forecast(stock, series, today, alpha=FORECAST_ALPHA, window=FORECAST_WINDOW):
+    n = len(BLOOD_GROUPS)
+    outflow = [
+        [r + e for r, e in zip(requested, expired)]
+        for requested, expired in zip(series["requested"], series["expired"])
+    ]
+    # One (4 x groups) x days matrix, so every estimate comes out of a single pass
+    smoothed, averages = _estimates(
+        series["requested"] + series["donated"] + series["expired"] + outflow, alpha, window
+    )
+    requested, donated, expired, out = (smoothed[k * n:(k + 1) * n] for k in range(4))
+    donated_avg, out_avg = averages[n:2 * n], averages[3 * n:]
+
+    groups = []
+    for i, blood_group in enumerate(BLOOD_GROUPS):
+        units = stock.get(blood_group, 0)
+        net = out[i] - donated[i]
+        if units <= 0:
+            days_left = 0.0
+        elif net > 0:
+            days_left = units / net
+        else:
+            days_left = None  # supply keeps up: no stockout in sight
+        groups.append({
+            "blood_group": blood_group,
+            "units": units,
+            "requested_per_day": round(requested[i], 2),
+            "donated_per_day": round(donated[i], 2),
+            "expired_per_day": round(expired[i], 2),
+            "net_per_day": round(net, 2),
+            "net_per_day_avg": round(out_avg[i] - donated_avg[i], 2),
+            "days_to_stockout": None if days_left is None else round(days_left, 1),
+            "stockout_date": None if days_left is None else (today + timedelta(days=int(days_left))).isoformat(),
+        })
+    return groups
+
+
+def main():
+    from db import db_connection
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=["backfill"])
+    parser.add_argument("--since", type=date.fromisoformat, help="only rebuild days from this one on (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    with db_connection() as conn:
+        counts = backfill(conn, args.since)
+    print("✅ Rollups rebuilt " + ", ".join(f"{column}: {n} row(s)" for column, n in counts.items()))
+
+
+if __name__ == "__main__":
+    main()
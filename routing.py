@@ -0,0 +1,65 @@
+"""Read/write splitting for the Flask app.
+
+With DB_REPLICAS set, GET / HEAD requests read from a replica, except for a
+client that wrote within the last READ_YOUR_WRITES seconds: its reads stay on
+the primary, so it always sees its own writes. Anything else (POST / PUT /
+DELETE ...) and all background work uses the primary.
+
+A client is its address plus, when it sends one, its Authorization header.
+Recent writers are kept in a fixed table in shared memory, seen by every
+worker process: a write stamps the slots its keys hash to, a read checks them.
+Two clients sharing a slot only means extra primary reads, never a stale one.
+"""
+import multiprocessing
+import os
+import time
+import zlib
+
+from flask import g, request
+
+from db import READ_YOUR_WRITES, end_route, replicas, route_reads
+
+WRITER_SLOTS = int(os.getenv("DB_WRITER_SLOTS", 4096))
+READ_METHODS = ("GET", "HEAD")
+
+_written_at = multiprocessing.RawArray("d", WRITER_SLOTS)
+
+
+def _slots(address, authorization):
+    keys = [address or ""]
+    if authorization:
+        keys.append(authorization)
+    return [zlib.crc32(key.encode("utf-8")) % WRITER_SLOTS for key in keys]
+
+
+# ✅ Call when a client's write has committed (asgi.py does for its own routes)
+def note_write(address, authorization=None):
+    now = time.time()
+    for slot in _slots(address, authorization):
+        _written_at[slot] = now
+
+
+def wrote_recently(address, authorization=None):
+    since = time.time() - READ_YOUR_WRITES
+    return any(_written_at[slot] > since for slot in _slots(address, authorization))
+
+
+def install(app):
+    if not replicas:
+        return
+
+    @app.before_request
+    def _route_reads():
+        if request.method in READ_METHODS:
+            fresh = wrote_recently(request.remote_addr, request.headers.get("Authorization"))
+            g.db_route = route_reads(not fresh)
+
+    # Runs before the response reaches the client, so its next read already
+    # sees the stamp. Failed writes are stamped too: harmless, and simpler.
+    @app.teardown_request
+    def _end_route(exc):
+        token = g.pop("db_route", None)
+        if token is not None:
+            end_route(token)
+        elif request.method not in READ_METHODS and request.method != "OPTIONS":
+            note_write(request.remote_addr, request.headers.get("Authorization"))
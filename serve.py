@@ -0,0 +1,155 @@
+"""Production entry point for the API.
+
+Runs the app under gunicorn with pre-forked worker processes. By default each
+worker is a uvicorn worker serving asgi.py: the hot read routes and the live
+event streams (/api/events) are coroutines, so an open stream holds no thread,
+and every other route goes to the Flask app through asgi.py's thread pool
+(ASGI_WSGI_THREADS). WEB_SERVER=wsgi serves the Flask app alone from
+WEB_THREADS threads per worker (gunicorn gthread); there every open stream holds
+a thread, so only SSE_THREAD_STREAMS are accepted per worker. Without the ASGI
+packages (requirements-asgi.txt) serve.py falls back to that mode.
+
+    python serve.py
+    WEB_WORKERS=8 BIND=0.0.0.0:8080 python serve.py
+    WEB_SERVER=wsgi WEB_THREADS=16 python serve.py
+
+The app is loaded once in the master and then forked, so imports, the bcrypt
+dummy hash and the shared write-version counters are set up once and shared
+copy-on-write. That includes the live-event ring (events.py): an event published
+by any worker reaches the /api/events streams open on every worker, with one
+global id sequence, so Last-Event-ID resumes on whichever worker a browser
+reconnects to. Each worker then starts its own MySQL pool (connections are
+never shared across processes) and opens a few connections before it takes
+traffic. SIGTERM drains: workers stop accepting, finish in-flight requests and
+close live event streams, within WEB_GRACEFUL_TIMEOUT seconds.
+
+Database settings are the usual DB_HOST / DB_USER / DB_PASS / DB_NAME /
+DB_POOL_* variables. gunicorn does not run on Windows; there the app is served
+by the Flask app on waitress (one process, WEB_THREADS threads) when it is installed.
+"""
+import os
+import signal
+
+from db import pool, replicas
+
+# ✅ Server settings (all overridable from the environment)
+BIND = os.getenv("BIND", "0.0.0.0:5000")
+WEB_SERVER = os.getenv("WEB_SERVER", "asgi")                    # "asgi" (uvicorn workers) or "wsgi" (threads)
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", (os.cpu_count() or 1) + 1))
+WEB_THREADS = int(os.getenv("WEB_THREADS", 8))                  # request threads per worker
+WEB_TIMEOUT = int(os.getenv("WEB_TIMEOUT", 60))                 # kill a worker stuck this long
+WEB_GRACEFUL_TIMEOUT = int(os.getenv("WEB_GRACEFUL_TIMEOUT", 30))
+WEB_KEEPALIVE = int(os.getenv("WEB_KEEPALIVE", 5))
+WEB_MAX_REQUESTS = int(os.getenv("WEB_MAX_REQUESTS", 0))        # recycle workers after N requests (0 = never)
+DB_POOL_WARM = int(os.getenv("DB_POOL_WARM", 2))                # connections opened per worker at start
+
+
+def warm_master():
+    """Work done once before forking; children inherit the results."""
+    from passwords import _dummy_hash
+
+    _dummy_hash()
+    # Fail fast on bad DB settings instead of in every worker
+    try:
+        pool.warm(1)
+    except Exception as e:
+        print("⚠️ Database not reachable at startup:", e)
+    pool.close_idle()
+
+
+def post_fork(server, worker):
+    pool.after_fork()
+    replicas.after_fork()
+
+
+def post_worker_init(worker):
+    from events import close_streams_on
+
+    try:
+        pool.warm(min(DB_POOL_WARM, WEB_THREADS))
+    except Exception as e:
+        worker.log.warning("Could not pre-open DB connections: %s", e)
+
+    # uvicorn installs its own signal handlers when it starts; asgi.py's
+    # lifespan closes the streams there
+    if worker.cfg.worker_class_str == "gthread":
+        close_streams_on(signal.SIGTERM)
+
+
+def worker_exit(server, worker):
+    from app import inventory_buffer
+
+    # Flush write-behind inventory so a clean shutdown leaves no journal to replay
+    try:
+        inventory_buffer.close()
+    except Exception as e:
+        worker.log.warning("Inventory journal not flushed, it will be replayed on start: %s", e)
+    pool.close_idle()
+    replicas.close_idle()
+
+
+def run_gunicorn(app, worker_class):
+    from gunicorn.app.base import BaseApplication
+
+    class Server(BaseApplication):
+        def load_config(self):
+            settings = {
+                "bind": BIND,
+                "workers": WEB_WORKERS,
+                "threads": WEB_THREADS,
+                "worker_class": worker_class,
+                "timeout": WEB_TIMEOUT,
+                "graceful_timeout": WEB_GRACEFUL_TIMEOUT,
+                "keepalive": WEB_KEEPALIVE,
+                "max_requests": WEB_MAX_REQUESTS,
+                "max_requests_jitter": WEB_MAX_REQUESTS // 10,
+                "preload_app": True,
+                "post_fork": post_fork,
+                "post_worker_init": post_worker_init,
+                "worker_exit": worker_exit,
+                "accesslog": os.getenv("WEB_ACCESS_LOG") or None,
+            }
+            for key, value in settings.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return app
+
+    Server().run()
+
+
+def run_waitress(app):
+    from waitress import serve
+
+    host, _, port = BIND.rpartition(":")
+    print(f"✅ Serving on {BIND} with waitress ({WEB_THREADS} threads)")
+    serve(app, host=host or "0.0.0.0", port=int(port), threads=WEB_THREADS)
+
+
+# The ASGI app and its worker class, or None when its packages are missing
+def load_asgi():
+    try:
+        import uvicorn.workers  # noqa: F401
+        from asgi import app
+    except ImportError as e:
+        print("⚠️ ASGI server unavailable (pip install -r requirements-asgi.txt), serving Flask on threads:", e)
+        return None
+    return app
+
+
+def main():
+    from app import app
+
+    warm_master()
+    if os.name == "nt":
+        run_waitress(app)
+        return
+    asgi_app = load_asgi() if WEB_SERVER == "asgi" else None
+    if asgi_app is not None:
+        run_gunicorn(asgi_app, "uvicorn.workers.UvicornWorker")
+    else:
+        run_gunicorn(app, "gthread")
+
+
+if __name__ == "__main__":
+    main()
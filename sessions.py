@@ -0,0 +1,79 @@
+import os
+import secrets
+from functools import wraps
+
+from flask import g, jsonify, request
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+
+from db import db_connection
+from entities import EntityCache
+
+# ✅ Session settings (all overridable from the environment)
+# SECRET_KEY must be set (and shared) when running more than one process,
+# otherwise each process signs with its own random key.
+SECRET_KEY = os.getenv("SECRET_KEY") or secrets.token_hex(32)
+SESSION_MAX_AGE = int(os.getenv("SESSION_MAX_AGE", 12 * 3600))  # token lifetime in seconds
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", 10000))
+SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", 300))
+
+_serializer = URLSafeTimedSerializer(SECRET_KEY, salt="bloodbank-session")
+
+# user id -> principal; checked on every authenticated call instead of MySQL.
+# Same backends as the entity caches: invalidating in one worker reaches every
+# worker forked from the loaded app (or every host, with REDIS_URL).
+principal_cache = EntityCache("principal", SESSION_CACHE_SIZE, SESSION_CACHE_TTL)
+
+
+def issue_token(user_id):
+    return _serializer.dumps({"uid": user_id})
+
+
+def _load_principal_from_db(user_id):
+    with db_connection(replica=False) as conn:
+        cur = conn.cursor(dictionary=True)
+        cur.execute("""
+            SELECT id, name, email, role, blood_group, location
+            FROM users WHERE id=%s
+        """, (user_id,))
+        return cur.fetchone()
+
+
+# ✅ Token -> principal. The signature check is pure CPU; the user row comes from
+# the LRU cache, so only the first call after login or an invalidation hits MySQL.
+def resolve_token(token):
+    try:
+        payload = _serializer.loads(token, max_age=SESSION_MAX_AGE)
+    except (BadSignature, SignatureExpired):
+        return None
+    user_id = payload.get("uid")
+    if not isinstance(user_id, int):
+        return None
+    return principal_cache.get_or_load(user_id, lambda: _load_principal_from_db(user_id))
+
+
+def invalidate_principal(user_id):
+    principal_cache.invalidate(user_id)
+
+
+def current_principal():
+    if "principal" not in g:
+        header = request.headers.get("Authorization", "")
+        token = header[7:] if header.startswith("Bearer ") else None
+        g.principal = resolve_token(token) if token else None
+    return g.principal
+
+
+# ✅ Route guard: @login_required() for any signed-in user, or
+# @login_required('admin', 'hospital') to restrict by role
+def login_required(*roles):
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            principal = current_principal()
+            if not principal:
+                return jsonify({"error": "❌ Login required"}), 401
+            if roles and principal["role"] not in roles:
+                return jsonify({"error": "❌ Not allowed for your role"}), 403
+            return view(*args, **kwargs)
+        return wrapped
+    return decorator
@@ -5,6 +5,8 @@ import RequestForm from "./RequestForm";
 import axios from "axios";
 import UserProfile from "./UserProfile";
 
+const REQUESTS_PAGE_SIZE = 100;
+
 function AdminDashboard() {
   const user = JSON.parse(localStorage.getItem("user"));
   const [stats, setStats] = useState({
@@ -17,71 +19,92 @@ function AdminDashboard() {
   const [hospitals, setHospitals] = useState([]);
   const [loading, setLoading] = useState(true);
   const [activeTab, setActiveTab] = useState("overview");
+  const [selectedIds, setSelectedIds] = useState([]);
 
   const handleLogout = () => {
     localStorage.removeItem("user");
     window.location.href = "/login";
   };
 
+  const [requestsCursor, setRequestsCursor] = useState(null);
+
+  // ✅ All counters come from one aggregated (server-cached) endpoint
   const fetchStats = async () => {
     try {
-      const [donorsRes, hospitalsRes, inventoryRes, requestsRes] = await Promise.all([
-        axios.get("http://localhost:5000/api/donors"),
-        axios.get("http://localhost:5000/api/hospitals"),
-        axios.get("http://localhost:5000/api/inventory"),
-        axios.get("http://localhost:5000/api/request"),
-      ]);
-
-      const totalUnits = inventoryRes.data.reduce((sum, item) => sum + (item.units || 0), 0);
-      const pending = requestsRes.data.filter((r) => r.status === "pending").length;
-
+      const res = await axios.get("http://localhost:5000/api/stats");
       setStats({
-        totalDonors: donorsRes.data.length,
-        totalHospitals: hospitalsRes.data.length,
-        totalUnits,
-        pendingRequests: pending,
+        totalDonors: res.data.total_donors,
+        totalHospitals: res.data.total_hospitals,
+        totalUnits: res.data.total_units,
+        pendingRequests: res.data.pending_requests,
       });
-
-      setRequests(requestsRes.data);
-      setHospitals(hospitalsRes.data);
     } catch (err) {
       console.error("Error fetching stats:", err);
+    }
+  };
+
+  const fetchRequests = async () => {
+    try {
+      const res = await axios.get(
+        `http://localhost:5000/api/request?limit=${REQUESTS_PAGE_SIZE}&count=0`
+      );
+      setRequests(res.data.items);
+      setRequestsCursor(res.data.next_cursor);
+    } catch (err) {
+      console.error("Error fetching requests:", err);
+    } finally {
+      setLoading(false);
+    }
+  };
+
+  const fetchHospitals = async () => {
+    try {
+      const res = await axios.get("http://localhost:5000/api/hospitals");
+      setHospitals(res.data);
+    } catch (err) {
+      console.error("Error fetching hospitals:", err);
     } finally {
       setLoading(false);
     }
   };
 
+  const loadMoreRequests = async () => {
+    if (!requestsCursor) return;
+    try {
+      const res = await axios.get(
+        `http://localhost:5000/api/request?limit=${REQUESTS_PAGE_SIZE}&count=0&cursor=${requestsCursor}`
+      );
+      setRequests((prev) => [...prev, ...res.data.items]);
+      setRequestsCursor(res.data.next_cursor);
+    } catch (err) {
+      console.error("Error loading more requests:", err);
+    }
+  };
+
   useEffect(() => {
     fetchStats();
   }, []);
 
-  const handleRequestUpdate = async (requestId, newStatus) => {
-    if (newStatus === "approved") {
-      // Find the request to check quantity
-      const request = requests.find(r => r.id === requestId);
-      if (request) {
-        // Check if enough inventory
-        try {
-          const inventoryRes = await axios.get("http://localhost:5000/api/inventory");
-          const bloodGroupInventory = inventoryRes.data.find(
-            inv => inv.blood_group === request.blood_group
-          );
-          
-          if (!bloodGroupInventory || bloodGroupInventory.units < request.quantity) {
-            const available = bloodGroupInventory ? bloodGroupInventory.units : 0;
-            alert(
-              `❌ Insufficient inventory!\n` +
-              `Available: ${available} units\n` +
-              `Requested: ${request.quantity} units`
-            );
-            return;
-          }
-        } catch (err) {
-          console.error("Error checking inventory:", err);
-        }
-      }
-    }
+  // Keep the overview counters live instead of polling
+  useEffect(() => {
+    if (!user?.token) return;
+    // EventSource cannot send an Authorization header, so pass the session token
+    const source = new EventSource(
+      `http://localhost:5000/api/events?token=${encodeURIComponent(user.token)}`
+    );
+    source.addEventListener("request", fetchStats);
+    source.addEventListener("inventory", fetchStats);
+    return () => source.close();
+  }, [user?.token]);
 
+  // Lists are only loaded when their tab is opened
+  useEffect(() => {
+    if (activeTab === "requests") fetchRequests();
+    if (activeTab === "hospitals") fetchHospitals();
+  }, [activeTab]);
+
+  // The server checks inventory atomically and reports shortfalls in its error
+  const handleRequestUpdate = async (requestId, newStatus) => {
     try {
       const res = await axios.put(`http://localhost:5000/api/request/${requestId}`, {
         status: newStatus,
@@ -92,6 +115,7 @@ function AdminDashboard() {
       }
       
       fetchStats(); // Refresh data
+      fetchRequests();
     } catch (err) {
       console.error("Error updating request:", err);
       const errorMsg = err.response?.data?.error || "Failed to update request";
@@ -99,6 +123,49 @@ function AdminDashboard() {
     }
   };
 
+  const toggleSelected = (requestId) => {
+    setSelectedIds((prev) =>
+      prev.includes(requestId) ? prev.filter((id) => id !== requestId) : [...prev, requestId]
+    );
+  };
+
+  const pendingIds = requests.filter((r) => r.status === "pending").map((r) => r.id);
+  const allPendingSelected =
+    pendingIds.length > 0 && pendingIds.every((id) => selectedIds.includes(id));
+
+  const toggleSelectAll = () => {
+    setSelectedIds(allPendingSelected ? [] : pendingIds);
+  };
+
+  // ✅ Approve/reject all selected requests in one call
+  const handleBulkUpdate = async (newStatus) => {
+    if (selectedIds.length === 0) return;
+
+    try {
+      const res = await axios.post("http://localhost:5000/api/request/bulk-status", {
+        ids: selectedIds,
+        status: newStatus,
+      });
+
+      const failures = res.data.results.filter((r) => !r.ok);
+      alert(
+        `✅ ${res.data.succeeded} request(s) ${newStatus}` +
+          (failures.length
+            ? `\n❌ ${failures.length} failed:\n` +
+              failures.map((f) => `#${f.id}: ${f.error}`).join("\n")
+            : "")
+      );
+
+      setSelectedIds([]);
+      fetchStats(); // Refresh data
+      fetchRequests();
+    } catch (err) {
+      console.error("Error updating requests:", err);
+      const errorMsg = err.response?.data?.error || "Failed to update requests";
+      alert(errorMsg);
+    }
+  };
+
   const getStatusBadge = (status) => {
     const badges = {
       pending: "warning",
@@ -109,7 +176,7 @@ function AdminDashboard() {
   };
 
   const handleDonationRecorded = () => {
-    fetchStats(); // This will refresh all stats including inventory
+    fetchStats(); // Counters only; the inventory view refreshes itself
   };
 
   const handleProfileUpdate = () => {
@@ -264,7 +331,25 @@ function AdminDashboard() {
 
       {activeTab === "requests" && (
         <div className="mb-4">
-          <h5 className="fw-bold text-danger mb-3">📦 Blood Requests Management</h5>
+          <div className="d-flex justify-content-between align-items-center mb-3">
+            <h5 className="fw-bold text-danger mb-0">📦 Blood Requests Management</h5>
+            <div className="btn-group btn-group-sm">
+              <button
+                className="btn btn-success btn-sm"
+                disabled={selectedIds.length === 0}
+                onClick={() => handleBulkUpdate("approved")}
+              >
+                ✓ Approve selected ({selectedIds.length})
+              </button>
+              <button
+                className="btn btn-danger btn-sm"
+                disabled={selectedIds.length === 0}
+                onClick={() => handleBulkUpdate("rejected")}
+              >
+                ✗ Reject selected
+              </button>
+            </div>
+          </div>
           {loading ? (
             <p className="text-muted">Loading requests...</p>
           ) : requests.length === 0 ? (
@@ -274,6 +359,14 @@ function AdminDashboard() {
               <table className="table table-striped table-hover table-bordered">
                 <thead className="table-danger">
                   <tr>
+                    <th>
+                      <input
+                        type="checkbox"
+                        className="form-check-input"
+                        checked={allPendingSelected}
+                        onChange={toggleSelectAll}
+                      />
+                    </th>
                     <th>ID</th>
                     <th>Hospital</th>
                     <th>Blood Group</th>
@@ -286,6 +379,16 @@ function AdminDashboard() {
                 <tbody>
                   {requests.map((req) => (
                     <tr key={req.id}>
+                      <td>
+                        {req.status === "pending" && (
+                          <input
+                            type="checkbox"
+                            className="form-check-input"
+                            checked={selectedIds.includes(req.id)}
+                            onChange={() => toggleSelected(req.id)}
+                          />
+                        )}
+                      </td>
                       <td>{req.id}</td>
                       <td>{req.hospital_name || `Hospital #${req.hospital_id}`}</td>
                       <td>{req.blood_group}</td>
@@ -325,6 +428,13 @@ function AdminDashboard() {
                   ))}
                 </tbody>
               </table>
+              {requestsCursor && (
+                <div className="text-center">
+                  <button className="btn btn-outline-danger btn-sm" onClick={loadMoreRequests}>
+                    Load more
+                  </button>
+                </div>
+              )}
             </div>
           )}
         </div>
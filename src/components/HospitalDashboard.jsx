@@ -29,6 +29,17 @@ function HospitalDashboard() {
     fetchMyRequests();
   }, [user?.id]);
 
+  // Refresh when one of this hospital's requests changes (e.g. gets approved)
+  useEffect(() => {
+    if (!user?.token) return;
+    // EventSource cannot send an Authorization header, so pass the session token
+    const source = new EventSource(
+      `http://localhost:5000/api/events?token=${encodeURIComponent(user.token)}`
+    );
+    source.addEventListener("request", fetchMyRequests);
+    return () => source.close();
+  }, [user?.token]);
+
   const getStatusBadge = (status) => {
     const badges = {
       pending: "warning",
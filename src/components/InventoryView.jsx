@@ -23,6 +23,26 @@ function InventoryView({ onRefresh }) {
     fetchInventory();
   }, []);
 
+  // Live updates: apply pushed unit deltas instead of polling
+  useEffect(() => {
+    const source = new EventSource("http://localhost:5000/api/events");
+    source.addEventListener("inventory", (e) => {
+      const { deltas } = JSON.parse(e.data);
+      setInventory((prev) => {
+        const next = prev.map((item) =>
+          item.blood_group in deltas
+            ? { ...item, units: item.units + deltas[item.blood_group] }
+            : item
+        );
+        Object.keys(deltas)
+          .filter((group) => !prev.some((item) => item.blood_group === group))
+          .forEach((group) => next.push({ blood_group: group, units: deltas[group] }));
+        return next;
+      });
+    });
+    return () => source.close();
+  }, []);
+
   return (
     <div>
       <div className="d-flex justify-content-between align-items-center mb-3">
@@ -7,6 +7,7 @@ function RequestForm({ onRequestSubmit }) {
     hospital_id: user?.id || "",
     blood_group: "A+",
     quantity: "",
+    urgency: "routine",
   });
 
   const [message, setMessage] = useState("");
@@ -26,7 +27,7 @@ function RequestForm({ onRequestSubmit }) {
     try {
       await axios.post("http://localhost:5000/api/request", form);
       setMessage("✅ Request submitted successfully!");
-      setForm({ ...form, blood_group: "A+", quantity: "" });
+      setForm({ ...form, blood_group: "A+", quantity: "", urgency: "routine" });
       if (onRequestSubmit) onRequestSubmit();
     } catch (err) {
       setMessage("❌ Failed to submit request. Try again.");
@@ -73,6 +74,20 @@ function RequestForm({ onRequestSubmit }) {
         />
       </div>
 
+      <div className="mb-3">
+        <label className="form-label fw-semibold">Urgency</label>
+        <select
+          className="form-select"
+          name="urgency"
+          value={form.urgency}
+          onChange={handleChange}
+        >
+          <option value="routine">Routine</option>
+          <option value="urgent">Urgent</option>
+          <option value="critical">Critical</option>
+        </select>
+      </div>
+
       <input type="hidden" name="hospital_id" value={form.hospital_id} />
 
       <button type="submit" className="btn btn-danger w-100">
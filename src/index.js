@@ -2,6 +2,16 @@ import 'bootstrap/dist/css/bootstrap.min.css';  // ✅ Add this line
 import React from 'react';
 import { createRoot } from 'react-dom/client';
 import App from './App';
+import axios from 'axios';
+
+// ✅ Send the session token from /api/login with every API call
+axios.interceptors.request.use((config) => {
+  const user = JSON.parse(localStorage.getItem('user'));
+  if (user?.token) {
+    config.headers.Authorization = `Bearer ${user.token}`;
+  }
+  return config;
+});
 
 const container = document.getElementById('root');
 const root = createRoot(container);
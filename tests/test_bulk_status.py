@@ -0,0 +1,48 @@
+"""inventory.bulk_update_status with requests that have no blood group."""
+import inventory
+
+
+class ScriptedCursor:
+    """Answers the request lookup with fixed rows and records every statement."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.log = []
+        self.rowcount = 0
+
+    def execute(self, sql, params=None):
+        self.log.append(" ".join(sql.split()))
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+
+class ScriptedConnection:
+    def __init__(self, rows):
+        self.cur = ScriptedCursor(rows)
+
+    def cursor(self, **kwargs):
+        return self.cur
+
+
+def test_null_blood_group_is_a_per_request_error(monkeypatch):
+    approved_groups = []
+    monkeypatch.setattr(inventory, "_approve_group", lambda conn, cur, group, rids: (
+        approved_groups.append(group) or {rid: {"id": rid, "ok": True, "status": "approved"} for rid in rids}
+    ))
+    conn = ScriptedConnection([(1, None, 10), (2, "B+", 10), (3, "A+", 11)])
+
+    results = inventory.bulk_update_status(conn, {1: "approved", 2: "approved", 3: "approved"})
+
+    assert results[0] == {"id": 1, "ok": False, "error": "❌ Request has no blood group"}
+    assert [r["ok"] for r in results[1:]] == [True, True]
+    assert approved_groups == ["A+", "B+"]
+
+
+def test_null_blood_group_can_still_be_rejected():
+    conn = ScriptedConnection([(1, None, 10)])
+
+    results = inventory.bulk_update_status(conn, {1: "rejected"})
+
+    assert results == [{"id": 1, "ok": True, "status": "rejected", "blood_group": None, "hospital_id": 10}]
@@ -0,0 +1,81 @@
+"""POST /api/request input handling, with the database replaced by a recorder."""
+from contextlib import contextmanager
+
+import pytest
+
+import app as app_module
+
+
+class RecordingCursor:
+    lastrowid = 1
+
+    def __init__(self, log):
+        self.log = log
+
+    def execute(self, sql, params=None):
+        self.log.append((" ".join(sql.split()), params))
+
+    def executemany(self, sql, rows):
+        self.log.append((" ".join(sql.split()), list(rows)))
+
+
+class RecordingConnection:
+    def __init__(self):
+        self.log = []
+
+    def cursor(self, **kwargs):
+        return RecordingCursor(self.log)
+
+    def start_transaction(self, **kwargs):
+        pass
+
+    def commit(self):
+        self.log.append(("COMMIT", None))
+
+
+@pytest.fixture
+def db(monkeypatch):
+    conn = RecordingConnection()
+
+    @contextmanager
+    def db_connection(*args, **kwargs):
+        yield conn
+
+    monkeypatch.setattr(app_module, "db_connection", db_connection)
+    monkeypatch.setattr(app_module.allocator, "notify", lambda groups: None)
+    return conn
+
+
+@pytest.fixture
+def client():
+    return app_module.app.test_client()
+
+
+def post_request(client, quantity):
+    return client.post("/api/request", json={
+        "hospital_id": 2, "blood_group": "A+", "quantity": quantity, "urgency": "urgent"
+    })
+
+
+# The request form posts the input's value, which is a string
+def test_string_quantity_is_accepted(client, db):
+    response = post_request(client, "3")
+    assert response.status_code == 201
+    insert = next(params for sql, params in db.log if sql.startswith("INSERT INTO requests"))
+    assert insert == (2, "A+", 3, "urgent")
+    assert ("COMMIT", None) in db.log
+
+
+@pytest.mark.parametrize("quantity", [None, "", "abc", [3], 0, "-1"])
+def test_bad_quantity_is_rejected(client, db, quantity):
+    response = post_request(client, quantity)
+    assert response.status_code == 400
+    assert "quantity" in response.get_json()["error"]
+    assert db.log == []
+
+
+@pytest.mark.parametrize("body", ["{bad", "[1]"])
+def test_malformed_body_is_rejected(client, db, body):
+    response = client.post("/api/request", data=body, content_type="application/json")
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "❌ Request body must be a JSON object"}
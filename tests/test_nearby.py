@@ -0,0 +1,28 @@
+"""GET /api/nearby query-string validation (rejected before any database access)."""
+import pytest
+
+import app as app_module
+
+
+@pytest.fixture
+def client():
+    return app_module.app.test_client()
+
+
+@pytest.mark.parametrize("query, name", [
+    ("lat=abc&lon=76.2", "lat"),
+    ("lat=10.5&lon=76,2", "lon"),
+    ("user_id=five", "user_id"),
+    ("location=Palghat&radius_km=far", "radius_km"),
+    ("location=Palghat&limit=1.5", "limit"),
+])
+def test_malformed_number_names_the_parameter(client, query, name):
+    response = client.get(f"/api/nearby?{query}")
+    assert response.status_code == 400
+    assert f"'{name}'" in response.get_json()["error"]
+
+
+def test_lat_without_lon_is_rejected(client):
+    response = client.get("/api/nearby?lat=10.5&location=Palghat")
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "❌ 'lat' and 'lon' must be given together"
@@ -0,0 +1,78 @@
+import multiprocessing
+import secrets
+import time
+import zlib
+from functools import wraps
+
+from flask import make_response, request
+
+from db import READ_YOUR_WRITES, replica_served
+
+# ✅ Per-table write versions for ETag / If-None-Match
+# Every write route bumps the tables it changed (after commit); read routes build
+# their ETag from the versions of the tables they read, so a matching
+# If-None-Match is answered with 304 before any database work.
+TABLES = ("users", "donors", "requests", "inventory", "donations", "blood_units")
+_INDEX = {name: i for i, name in enumerate(TABLES)}
+
+# The counters live in shared memory created at import time, so server worker
+# processes forked after the app is loaded (gunicorn --preload, serve.py) all see
+# every bump. The epoch changes on each restart so old ETags never match new data.
+_versions = multiprocessing.RawArray("q", len(TABLES))
+_bumped_at = multiprocessing.RawArray("d", len(TABLES))
+_lock = multiprocessing.Lock()
+EPOCH = secrets.token_hex(4)
+
+
+def bump(*tables):
+    now = time.time()
+    with _lock:
+        for table in tables:
+            _versions[_INDEX[table]] += 1
+            _bumped_at[_INDEX[table]] = now
+
+
+# True when none of the tables changed in the last `seconds`
+def settled(tables, seconds):
+    since = time.time() - seconds
+    return all(_bumped_at[_INDEX[table]] <= since for table in tables)
+
+
+def current(*tables):
+    return tuple(_versions[_INDEX[table]] for table in tables)
+
+
+def etag_for(tables, path):
+    versions = "-".join(str(v) for v in current(*tables))
+    # The query string is folded in so each filtered/paged view gets its own tag
+    return f"{EPOCH}-{versions}-{zlib.crc32(path.encode('utf-8')):08x}"
+
+
+def stats():
+    return {"epoch": EPOCH, **{table: _versions[i] for i, table in enumerate(TABLES)}}
+
+
+# ✅ @conditional('inventory') on a GET route: 304 when the client's copy is
+# still current, otherwise run the view and tag its 200 response.
+def conditional(*tables):
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            # Read the versions before the view queries, so a write that lands
+            # meanwhile can only make the tag older than the body, never newer
+            etag = etag_for(tables, request.full_path)
+            if etag in request.if_none_match:
+                response = make_response("", 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            # A replica may not have the latest writes yet: a body it served is
+            # only tagged once those writes are older than the lag it is allowed
+            if response.status_code == 304 or not replica_served() or settled(tables, READ_YOUR_WRITES):
+                response.set_etag(etag)
+            # Let browsers keep the body but revalidate on every poll
+            response.headers["Cache-Control"] = "no-cache"
+            return response
+        return wrapped
+    return decorator
@@ -0,0 +1,338 @@
+import glob
+import multiprocessing
+import os
+import secrets
+import threading
+import time
+
+import rollups
+from blood_groups import BLOOD_GROUPS
+from db import db_connection
+
+try:
+    import fcntl
+except ImportError:  # Windows: single process (waitress), no cross-process journal locks
+    fcntl = None
+
+# ✅ Write-behind settings (all overridable from the environment)
+WRITE_BEHIND = os.getenv("INVENTORY_WRITE_BEHIND", "0") == "1"
+FLUSH_INTERVAL = float(os.getenv("INVENTORY_FLUSH_INTERVAL", 1))   # seconds between flushes
+FLUSH_SIZE = int(os.getenv("INVENTORY_FLUSH_SIZE", 500))           # flush early after this many deltas
+JOURNAL_DIR = os.getenv("INVENTORY_JOURNAL_DIR", "journal")
+JOURNAL_FSYNC = os.getenv("INVENTORY_JOURNAL_FSYNC", "1") == "1"   # fsync every journal append
+JOURNAL_ROTATE_BYTES = 1 << 20
+
+_INDEX = {group: i for i, group in enumerate(BLOOD_GROUPS)}
+
+# Unflushed units per group, in shared memory so every worker forked from the
+# loaded app sees the others' pending deltas. `_generation` / `_flushing` let
+# readers detect a flush that committed while they were reading (see read()).
+_pending = multiprocessing.RawArray("q", len(BLOOD_GROUPS))
+_generation = multiprocessing.RawValue("q", 0)
+_flushing = multiprocessing.RawValue("q", 0)
+_shared_lock = multiprocessing.Lock()
+# Journals named with this id were written by a sibling worker of the same
+# server run, so their unflushed units are still counted in _pending
+BOOT_ID = secrets.token_hex(4)
+
+
+def pending_deltas():
+    return {group: _pending[i] for group, i in _INDEX.items() if _pending[i]}
+
+
+# ✅ Consistent reads: take a marker, read MySQL and pending_deltas(), then check
+# read_settled(marker). If a flush committed in between, read again; otherwise a
+# delta could be counted both in MySQL and in memory (or in neither).
+def read_marker():
+    return _generation.value, _flushing.value
+
+
+def read_settled(marker):
+    generation, busy = marker
+    return not busy and _generation.value == generation
+
+
+def read_consistent(load, attempts=20):
+    for _ in range(attempts):
+        marker = read_marker()
+        result = load()
+        pending = pending_deltas()
+        if read_settled(marker):
+            break
+        time.sleep(0.001)
+    return result, pending
+
+
+# Inventory rows (dicts with blood_group / units) plus unflushed deltas
+def merge_pending(rows, pending):
+    by_group = {row["blood_group"]: row for row in rows}
+    for group, units in pending.items():
+        if group in by_group:
+            by_group[group]["units"] = (by_group[group]["units"] or 0) + units
+        else:
+            rows.append({"blood_group": group, "units": units})
+    return rows
+
+
+def _flush_started():
+    with _shared_lock:
+        _flushing.value += 1
+        _generation.value += 1
+
+
+def _flush_finished(deltas):
+    with _shared_lock:
+        for group, units in deltas.items():
+            _pending[_INDEX[group]] -= units
+        _flushing.value -= 1
+        _generation.value += 1
+
+
+# ✅ Commit, and take the committed units out of the shared pending counters in
+# the same reader-visible step
+def _commit_and_release(conn, units):
+    _flush_started()
+    try:
+        conn.commit()
+    except Exception:
+        units = {}
+        raise
+    finally:
+        _flush_finished(units)
+
+
+# ✅ Apply journal entries [(donation_id, group, units)] to inventory exactly once.
+# Journal lines are keyed by donation: a donation is added to inventory only if
+# its ledger row exists (it committed) and still has in_inventory = 0, and the
+# flag is flipped in the same transaction. A replay after a crash, or a second
+# process recovering the same file, therefore skips what already made it.
+# release_pending(conn, units) is called instead of a plain commit by the
+# process whose shared pending counters hold these entries (see _pending_units).
+def _apply(entries, release_pending=None):
+    ids = [donation_id for donation_id, _, _ in entries]
+    with db_connection() as conn:
+        cur = conn.cursor()
+        conn.start_transaction()
+        # Waits for a donation whose transaction is still committing
+        cur.execute(
+            f"SELECT id, blood_group, quantity, donation_date, in_inventory FROM donations "
+            f"WHERE id IN ({', '.join(['%s'] * len(ids))}) FOR UPDATE",
+            ids,
+        )
+        rows = cur.fetchall()
+        todo = [(donation_id, group, units, day) for donation_id, group, units, day, done in rows if not done]
+        deltas = {}
+        for _, group, units, _ in todo:
+            deltas[group] = deltas.get(group, 0) + units
+        if todo:
+            cur.execute(
+                f"UPDATE donations SET in_inventory = 1 WHERE id IN ({', '.join(['%s'] * len(todo))})",
+                [donation_id for donation_id, _, _, _ in todo],
+            )
+            # One upsert for all groups instead of one row lock per donation
+            cur.execute(
+                "INSERT INTO inventory (blood_group, units) VALUES "
+                + ", ".join(["(%s, %s)"] * len(deltas))
+                + " ON DUPLICATE KEY UPDATE units = units + VALUES(units)",
+                [value for item in deltas.items() for value in item],
+            )
+            # The donated rollup goes with the units, after inventory (the lock order of every path)
+            rollups.record(cur, "donated", [(day, group, units) for _, group, units, day in todo])
+        if release_pending is None:
+            conn.commit()
+        else:
+            applied_before = {donation_id for donation_id, _, _, _, done in rows if done}
+            release_pending(conn, _pending_units(entries, applied_before))
+    return deltas
+
+
+# Units the shared counters hold for these entries: every journaled donation
+# counts there from add() until a flush applies it or discard() takes it back,
+# including one that never committed (a crash before the commit)
+def _pending_units(entries, applied_before):
+    units = {}
+    for donation_id, group, quantity in entries:
+        if donation_id not in applied_before:
+            units[group] = units.get(group, 0) + quantity
+    return units
+
+
+# Journal lines: "<donation id> <group> <units>", and "x <donation id>" for a
+# donation whose transaction failed after it was journaled
+def _read_journal(path):
+    entries, discarded = [], set()
+    with open(path, encoding="ascii") as f:
+        for line in f:
+            parts = line.split()
+            if not line.endswith("\n"):
+                break  # torn last write from a crash: it was never acknowledged
+            if len(parts) == 2 and parts[0] == "x":
+                discarded.add(int(parts[1]))
+            elif len(parts) == 3:
+                entries.append((int(parts[0]), parts[1], int(parts[2])))
+            else:
+                break
+    return [entry for entry in entries if entry[0] not in discarded]
+
+
+class InventoryBuffer:
+    """Write-behind inventory counter.
+
+    add() appends the donation to this process's journal file (fsynced) and to
+    the shared pending counters, before the donation's transaction commits; a
+    background thread flushes the accumulated donations every FLUSH_INTERVAL
+    seconds (or after FLUSH_SIZE of them) as one upsert. Journals left behind
+    by a crashed process are replayed the next time any process starts the
+    buffer."""
+
+    def __init__(self, on_flush=None):
+        self.on_flush = on_flush
+        self._lock = threading.Lock()        # journal file + entry list
+        self._flush_lock = threading.Lock()
+        self._entries = []
+        self._file = None
+        self._name = None
+        self._pid = None
+        self._wake = threading.Event()
+        self.flushes = 0
+        self.recovered = 0
+
+    def _journal_path(self, name):
+        return os.path.join(JOURNAL_DIR, name)
+
+    def _open_journal(self):
+        self._name = f"donations-{BOOT_ID}-{os.getpid()}-{time.time_ns()}.journal"
+        self._file = open(self._journal_path(self._name), "a", encoding="ascii")
+        if fcntl is not None:
+            # Held for the life of the process: tells recover() this journal is live
+            fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    # Started lazily in each process (pre-fork servers fork before first use)
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            os.makedirs(JOURNAL_DIR, exist_ok=True)
+            try:
+                self.recover()
+            except Exception as e:
+                # Left on disk; the next process start retries it
+                print("Error recovering inventory journals:", e)
+            self._entries = []
+            self._open_journal()
+            self._pid = os.getpid()
+            threading.Thread(target=self._loop, name="inventory-flush", daemon=True).start()
+
+    # ✅ Replay journals whose process is gone
+    def recover(self):
+        for path in glob.glob(self._journal_path("inventory-*.journal")):
+            print(f"⚠️ {path} was written by an older version and is not replayed; "
+                  "shut down cleanly before upgrading so no journal is left behind")
+        for path in sorted(glob.glob(self._journal_path("donations-*.journal"))):
+            name = os.path.basename(path)
+            if name == self._name:
+                continue
+            with open(path, "a", encoding="ascii") as f:
+                if fcntl is not None:
+                    try:
+                        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except OSError:
+                        continue  # owner is still running and will flush it itself
+                entries = _read_journal(path)
+                sibling = name.startswith(f"donations-{BOOT_ID}-")
+                deltas = {}
+                for start in range(0, len(entries), FLUSH_SIZE):
+                    chunk = _apply(entries[start:start + FLUSH_SIZE], _commit_and_release if sibling else None)
+                    for group, units in chunk.items():
+                        deltas[group] = deltas.get(group, 0) + units
+                os.remove(path)
+            self.recovered += sum(deltas.values())
+            if deltas and self.on_flush:
+                self.on_flush(deltas)
+
+    # ✅ Call inside the donation's transaction, after its ledger INSERT and
+    # before the commit; call discard() if the commit fails
+    def add(self, donation_id, blood_group, units):
+        self._ensure_started()
+        with self._lock:
+            self._file.write(f"{donation_id} {blood_group} {units}\n")
+            self._file.flush()
+            if JOURNAL_FSYNC:
+                os.fsync(self._file.fileno())
+            self._entries.append((donation_id, blood_group, units))
+            with _shared_lock:
+                _pending[_INDEX[blood_group]] += units
+            full = len(self._entries) >= FLUSH_SIZE
+        if full:
+            self._wake.set()
+
+    def discard(self, donation_id):
+        with self._lock:
+            self._file.write(f"x {donation_id}\n")
+            self._file.flush()
+            if JOURNAL_FSYNC:
+                os.fsync(self._file.fileno())
+            for i, (entry_id, blood_group, units) in enumerate(self._entries):
+                if entry_id == donation_id:
+                    del self._entries[i]
+                    with _shared_lock:
+                        _pending[_INDEX[blood_group]] -= units
+                    break
+            # Otherwise a flush already took it, found no ledger row and released it
+
+    def flush(self):
+        if self._pid != os.getpid():
+            return {}
+        with self._flush_lock:
+            with self._lock:
+                entries, self._entries = self._entries, []
+            if not entries:
+                return {}
+
+            try:
+                deltas = _apply(entries, _commit_and_release)
+            except Exception:
+                with self._lock:
+                    self._entries[:0] = entries  # retried on the next flush
+                raise
+
+            self.flushes += 1
+            self._rotate_if_large()
+        if deltas and self.on_flush:
+            self.on_flush(deltas)
+        return deltas
+
+    def _rotate_if_large(self):
+        with self._lock:
+            if self._entries or self._file.tell() < JOURNAL_ROTATE_BYTES:
+                return
+            old_file, old_name = self._file, self._name
+            self._open_journal()
+        old_file.close()
+        try:
+            os.remove(self._journal_path(old_name))
+        except FileNotFoundError:
+            pass  # already picked up (and found fully applied) by another process
+
+    # ✅ Clean shutdown: flush and drop the journal so nothing needs replaying
+    def close(self):
+        if self._pid != os.getpid():
+            return
+        self.flush()
+        with self._lock:
+            if self._entries:
+                return
+            self._file.close()
+            os.remove(self._journal_path(self._name))
+            self._pid = None
+
+    def _loop(self):
+        while True:
+            self._wake.wait(FLUSH_INTERVAL)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print("Error flushing inventory journal:", e)